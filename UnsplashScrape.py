@@ -46,291 +46,925 @@ Additional Resources:
 """
 
 # necessary imports
+import os
 import time
+import queue
+import socket
+import datetime
+import threading
+from contextlib import contextmanager
 from selenium import webdriver
-from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, TimeoutException
+from selenium.common.exceptions import StaleElementReferenceException, TimeoutException, WebDriverException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as ec
-from selenium.webdriver.common.action_chains import ActionChains
-import pandas as pd
-
+import UnsplashScrapeExtract
+import UnsplashScrapeEngine
+import UnsplashScrapeStore
+import UnsplashScrapeMetrics
+import UnsplashScrapeIndex
+import UnsplashScrapeFilter
+
+
+# how often waits check if the page is ready, in seconds
+# WebDriverWait's default of half a second would add up to half a second to every wait
+POLL = 0.05
+
+# selectors of every field, in the form EXTRACT_JS takes them
+FIELD_SELECTORS = [[field.name, field.selectors] for field in UnsplashScrapeExtract.FIELDS]
+
+# collects every raw string of a photo page inside the browser and returns them all at once
+# arguments[0] holds [field name, selectors] for every field, the selectors of a field are tried in order and
+# the first element that matches gives its value, once a field has a value nothing else is looked at for it
+# fields that needed a fallback selector are listed under fallbacks
+EXTRACT_JS = """
+var text = function (el) {
+    return el.innerText.replace(/\\s+/g, ' ').trim();
+};
+var read = function (el, how) {
+    if (!how || how === 'text') {
+        return text(el);
+    }
+    var val = el[how] !== undefined ? el[how] : el.getAttribute(how);
+    return val === null || val === undefined ? null : String(val);
+};
+var matches = function (selector) {
+    if (selector.css) {
+        return Array.prototype.slice.call(document.querySelectorAll(selector.css));
+    }
+    var found = document.evaluate(selector.xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    var nodes = [];
+    for (var i = 0; i < found.snapshotLength; i++) {
+        nodes.push(found.snapshotItem(i));
+    }
+    return nodes;
+};
+var take = function (selector) {
+    var nodes = matches(selector);
+    for (var i = 0; i < nodes.length; i++) {
+        if (selector.skip_text && selector.skip_text.indexOf(text(nodes[i])) !== -1) {
+            continue;
+        }
+        var val = read(nodes[i], selector.read);
+        if (val === null || (selector.skip && selector.skip.indexOf(val) !== -1)) {
+            continue;
+        }
+        if (selector.skip_containing && selector.skip_containing.some(function (part) {
+                return val.indexOf(part) !== -1;
+            })) {
+            continue;
+        }
+        return val;
+    }
+    return null;
+};
+
+var raw = {fallbacks: []};
+arguments[0].forEach(function (field) {
+    raw[field[0]] = null;
+    for (var i = 0; i < field[1].length && raw[field[0]] === null; i++) {
+        try {
+            raw[field[0]] = take(field[1][i]);
+        } catch (e) {
+            // a selector the browser cant evaluate counts as no match
+        }
+        if (raw[field[0]] !== null && i > 0) {
+            raw.fallbacks.push(field[0]);
+        }
+    }
+});
+return raw;
+"""
 
-# main class that contains the logic for crawling unsplash
-class UnsplashScrape:
-    base = ""  # main page
-    crawl_amount = 0  # total pages to be crawled
-    driver = ""  # initialize driver variable
-    main_window = 0  # value that will hold the window value of the main page
-    MAX_PAGES = 1000  # max number of pages allowed to be crawled
 
-    # initialization function of the UnsplashScrape class
-    # handles user input, sets values to class wide variables, sets Firefox profile,
-    # and makes call to main data collection function
-    def __init__(self, main_site, crawl_pages):
-        self.base = main_site
-
-        # empty lists to hold all data
-        self.img_page = []
-        self.img_hvr_txt = []
-        self.photographer = []
-        self.img_url = []
-        self.location = []
-        self.summary = []
-        self.views = []
-        self.downloads = []
-        self.camera_make = []
-        self.camera_model = []
-        self.focal_len = []
-        self.aperture = []
-        self.shutter_speed = []
-        self.iso = []
-        self.img_resolution = []
-        self.count = []
-
-        # get and validate user input
-        self.check_input = True
-        while True:
-            if int(crawl_pages) > self.MAX_PAGES or int(crawl_pages) < 1:
-                print("Requested Crawl Amount Too Large (Limit is " + str(self.MAX_PAGES) + ")")
-                self.check_input = False
-                break
+# waits for the info button to be clickable, clicks it and waits for the stuff under it to be shown
+# every wait returns as soon as the page is ready
+def open_info(driver):
+    info_button = WebDriverWait(driver, 10, poll_frequency=POLL).until(
+        ec.element_to_be_clickable((By.XPATH, '//*[text()="Info"]/..')))
+    driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", info_button)
+    info_button.click()
+    WebDriverWait(driver, 10, poll_frequency=POLL).until(
+        ec.visibility_of_element_located((By.CSS_SELECTOR, "dd")))
+
+
+# collects the raw strings of an open photo page in one round trip, the info dialog has to be open already
+def collect_raw(driver):
+    return driver.execute_script(EXTRACT_JS, FIELD_SELECTORS)
+
+
+# collects the raw strings of an open photo page one element at a time, the way get_info used to
+# every lookup is a separate round trip to the browser, kept to compare against collect_raw in the benchmarks
+# the info dialog has to be open already
+def collect_raw_elements(driver):
+    raw = {"fallbacks": []}
+    for field in UnsplashScrapeExtract.FIELDS:
+        raw[field.name] = None
+        for i, selector in enumerate(field.selectors):
+            if "css" in selector:
+                elements = driver.find_elements_by_css_selector(selector["css"])
             else:
-                print("Okay gathering " + str(crawl_pages) + " item(s) from " + self.base + ".")
-                self.crawl_amount = int(crawl_pages)
-
-                # initialize selenium with custom profile
-                profile = webdriver.FirefoxProfile()
-                profile.set_preference("dom.disable_open_during_load", False)
-                self.driver = webdriver.Firefox(firefox_profile=profile)
-                self.driver.set_page_load_timeout(30)
-                self.driver.get(self.base)
-                self.main_window = self.driver.current_window_handle
-
-                # call to main data collection function
-                self.get_attrs()
-
-                # create a dictionary that can be converted to a DataFrame
-                self.data = {
-                    "img_page": self.img_page,
-                    "img_hvr_txt": self.img_hvr_txt,
-                    "photographer": self.photographer,
-                    "img_url": self.img_url,
-                    "location": self.location,
-                    "summary": self.summary,
-                    "views": self.views,
-                    "downloads": self.downloads,
-                    "camera_make": self.camera_make,
-                    "camera_model": self.camera_model,
-                    "focal_len": self.focal_len,
-                    "aperture": self.aperture,
-                    "shutter_speed": self.shutter_speed,
-                    "iso": self.iso,
-                    "img_resolution": self.img_resolution,
-                    "count": self.count
-                }
-
-                # convert to dataframe
-                self.df = pd.DataFrame.from_dict(self.data)
-
-                # save dataframe as csv
-                self.df.to_csv("data/data.csv", index=False)
+                elements = driver.find_elements_by_xpath(selector["xpath"])
+            for element in elements:
+                try:
+                    if " ".join(element.text.split()) in selector.get("skip_text", []):
+                        continue
+                    if selector.get("read", "text") == "text":
+                        val = " ".join(element.text.split())
+                    else:
+                        val = element.get_attribute(selector["read"])
+                except StaleElementReferenceException:
+                    # sometimes the element is replaced while it is being read, it then counts as no match
+                    continue
+                if val is None or val in selector.get("skip", []) or \
+                        any(part in val for part in selector.get("skip_containing", [])):
+                    continue
+                raw[field.name] = val
                 break
-
-    # main data collection function
-    def get_attrs(self):
-        # this will scroll down the starting page loading elements until the desired
-        # amount of items are loaded
-        while True:
-            # scroll to bottom of page
-            self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-
-            # gives time for new elements to load
-            WebDriverWait(self.driver, 30).until(
-                ec.presence_of_all_elements_located((By.XPATH, "//*[@itemprop='contentUrl']")))
-            time.sleep(1)
-
-            # gets all loaded elements and checks to see if the user defined crawl amount has been reached
-            figures = self.driver.find_elements_by_xpath("//*[@itemprop='contentUrl']")
-            if len(figures) >= self.crawl_amount:
+            if raw[field.name] is not None:
+                if i > 0:
+                    raw["fallbacks"].append(field.name)
                 break
+    return raw
+
+
+# firefox preferences that keep a session lean, nothing the scraper reads needs them
+# image src attributes are still in the DOM with images turned off so img_url is unaffected
+LEAN_PREFS = {
+    "permissions.default.image": 2,  # dont load images
+    "browser.display.use_document_fonts": 0,  # dont download web fonts
+    "media.autoplay.default": 5,  # block autoplaying audio and video
+    "media.preload.default": 0,  # dont preload media
+    "browser.cache.memory.capacity": 65536,  # cap the in memory cache at 64MB
+    "browser.sessionhistory.max_entries": 2,  # the worker tab never goes back
+    "toolkit.telemetry.enabled": False,
+    "datareporting.healthreport.uploadEnabled": False,
+    "app.update.enabled": False
+}
+
+
+# creates a new Firefox session with the custom profile
+# used for the landing page driver as well as every session in the pool
+# lean turns off images, fonts and other resources the scraper never reads
+# pages count as loaded once the DOM is ready, the readiness waits take care of the rest
+def new_driver(lean=True):
+    profile = webdriver.FirefoxProfile()
+    if lean:
+        for key, val in LEAN_PREFS.items():
+            profile.set_preference(key, val)
+    capabilities = webdriver.DesiredCapabilities.FIREFOX.copy()
+    capabilities["pageLoadStrategy"] = "eager"
+    driver = webdriver.Firefox(firefox_profile=profile, desired_capabilities=capabilities)
+    driver.set_page_load_timeout(30)
+    return driver
+
+
+# a browser session with a single tab that every page is loaded into
+class Session:
+    def __init__(self, lean=True):
+        self.driver = new_driver(lean)
+        self.pages = 0  # pages loaded since the browser was started
+
+    # loads url into the session's one tab
+    def visit(self, url):
+        self.driver.get(url)
+        self.pages += 1
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except WebDriverException:
+            # the browser is already gone, nothing left to clean up
+            pass
+
+
+# keeps warm browser sessions around so browser startup is only paid once instead of for every crawl
+# sessions are checked out with acquire and handed back with release, a session that has loaded
+# recycle_after pages is quit on release and replaced the next time one is needed, this keeps the
+# memory of long crawls from growing without limit
+# at most `size` idle sessions are kept, a pool can be shared by many crawls and is closed by its owner
+class SessionPool:
+    def __init__(self, size=1, recycle_after=200, lean=True, timer=None):
+        self.size = size
+        self.recycle_after = recycle_after
+        self.lean = lean
+        self.timer = timer if timer is not None else UnsplashScrapeMetrics.StepTimer()
+        self.idle = []
+        self.lock = threading.Lock()
+
+    # hands out a warm session, a new browser is only started if none are idle
+    def acquire(self):
+        with self.lock:
+            if self.idle:
+                return self.idle.pop()
+        with self.timer.time("startup"):
+            return Session(self.lean)
+
+    # returns a session to the pool, or quits it if it is due to be recycled or the pool is full
+    # broken sessions (e.g. after the browser crashed) should be released with broken=True
+    def release(self, session, broken=False):
+        with self.lock:
+            if not broken and session.pages < self.recycle_after and len(self.idle) < self.size:
+                self.idle.append(session)
+                return
+        session.quit()
+
+    # with pool.session() as session: ... checks a session out for the block
+    # a session whose block raised is not trusted again and is quit
+    @contextmanager
+    def session(self):
+        session = self.acquire()
+        try:
+            yield session
+        except BaseException:
+            self.release(session, broken=True)
+            raise
+        self.release(session)
+
+    # quits every idle session
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for session in idle:
+            session.quit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# gathers the raw strings of a single photo page with a browser session
+# limiter paces the page loads, the steps are timed in timer and a page that doesnt load properly is
+# tried up to attempts times. the strings are parsed by UnsplashScrapeExtract.parse_info once the session
+# is back in its pool, so a browser never waits on parsing
+def get_page(url, session, limiter, timer, attempts=3):
+    driver = session.driver
+
+    def load():
+        # waits for its turn so the site is not overloaded
+        with timer.time("rate-wait"):
+            limiter.wait()
+
+        with timer.time("open"):
+            session.visit(url)
+
+        # click the info button as soon as it can be clicked
+        with timer.time("wait-info"):
+            open_info(driver)
+
+    # the whole page is timed as a page step, sometimes the dialog doesnt open or the site answers with an
+    # error page so the page is loaded again with a short growing delay
+    with timer.page(url):
+        UnsplashScrapeEngine.retry(load, attempts, backoff=0.5, exceptions=(TimeoutException,),
+                                   on_retry=lambda e, attempt: timer.retried(url, e, attempt))
+
+        # every field is collected in a single call to the browser
+        with timer.time("extract"):
+            return collect_raw(driver)
+
+
+# injected into the landing page once, records every photo link as it is added to the page
+# links already on the page are taken straight away, after that a MutationObserver only looks at the
+# nodes that were just appended so finding new photos costs the same no matter how long the page gets
+# each link is recorded once by its href along with its title (the hover text)
+DISCOVERY_JS = """
+if (!window.unsplashScrapeSeen) {
+    window.unsplashScrapeSeen = new Set();
+    window.unsplashScrapeFound = [];
+    var take = function (el) {
+        var href = el.getAttribute('href');
+        if (href && !window.unsplashScrapeSeen.has(href)) {
+            window.unsplashScrapeSeen.add(href);
+            // the card of the photo links to its photographer and has an element saying so when it is sponsored,
+            // the text of the whole card runs the names together so every element is looked at on its own
+            var card = el.closest('figure') || el.parentElement;
+            var author = card ? card.querySelector("a[href^='/@']") : null;
+            var account = author ? author.getAttribute('href').slice(2).split(/[/?#]/)[0] : null;
+            var sponsored = card ? Array.prototype.some.call(card.querySelectorAll('*'), function (node) {
+                return /^Sponsored\\b/.test(node.textContent.trim());
+            }) : false;
+            window.unsplashScrapeFound.push([el.href, el.getAttribute('title'), account, sponsored]);
+        }
+    };
+    var scan = function (node) {
+        if (node.nodeType !== 1) {
+            return;
+        }
+        if (node.getAttribute('itemprop') === 'contentUrl') {
+            take(node);
+        }
+        node.querySelectorAll("[itemprop='contentUrl']").forEach(take);
+    };
+    document.querySelectorAll("[itemprop='contentUrl']").forEach(take);
+    new MutationObserver(function (mutations) {
+        mutations.forEach(function (mutation) {
+            mutation.addedNodes.forEach(scan);
+        });
+    }).observe(document.body, {childList: true, subtree: true});
+}
+"""
 
-        # gets urls from loaded elements
-        urls = [fig.get_attribute('href') for fig in figures[0:self.crawl_amount]]
-
-        i = 1
-        for url in urls:
-            print(str(i) + ". Collecting info from: " + url)
-            # initialize page data container
-            # only attribute that does not require you to go to the actual photo page
-            self.img_hvr_txt.append(self.get_image_hover(url))
-
-            # collects all attributes from photo page and merges them with page data container
-            self.img_page.append(url)
-            self.get_info(url)
-            # closes the newly opened window and switches driver back to main window
-            for window in self.driver.window_handles:
-                if window != self.main_window:
-                    self.driver.switch_to.window(window)
-                    self.driver.close()
-                    self.driver.switch_to.window(self.main_window)
-                    break
-            i += 1
+# hands back the links found since the last call and forgets them, one round trip per scroll
+DRAIN_JS = """
+var found = window.unsplashScrapeFound;
+window.unsplashScrapeFound = [];
+return found;
+"""
 
-        # closes the driver
-        self.driver.quit()
 
-    # gets the text that occurs when you hover over and image on the main page
-    def get_image_hover(self, url):
-        element_to_go_to = self.driver.find_element_by_xpath("//*[@href='" + url.replace(self.base, "/") + "']")
-        self.driver.execute_script("arguments[0].scrollIntoView();", element_to_go_to)
-        ActionChains(self.driver).move_to_element(element_to_go_to).perform()
+# scrolls a loaded landing page until amount photo links have been found
+# returns the (position, url, hover text) of each link in page order and how long every scroll took
+# stops early if a scroll doesnt load anything new within timeout seconds
+# every scroll is recorded as a discover step in timer, the wait for the rate limiter as rate-wait
+# links page_filter (an UnsplashScrapeFilter.PageFilter) does not keep are left out and do not count towards amount
+def discover_pages(driver, amount, limiter, timeout=30, timer=None, page_filter=None):
+    if timer is None:
+        timer = UnsplashScrapeMetrics.StepTimer()
+    found = {}
+
+    def take(links):
+        links = [link for link in links if link[0] not in found]
+        if page_filter is not None:
+            links = page_filter.keep(links)
+        for link in links:
+            found.setdefault(link[0], link[1])
+
+    driver.execute_script(DISCOVERY_JS)
+    take(driver.execute_script(DRAIN_JS))
+    scroll_times = []
+
+    # this will scroll down the starting page loading elements until the desired
+    # amount of items are loaded
+    while len(found) < amount:
+        # every scroll fetches more photos so it is rate limited
+        with timer.time("rate-wait"):
+            limiter.wait()
+
+        start = time.perf_counter()
+        # scroll to bottom of page
+        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+
+        # waits for the observer to see new photos
+        try:
+            batch = WebDriverWait(driver, timeout, poll_frequency=POLL).until(
+                lambda d: d.execute_script(DRAIN_JS) or False)
+        except TimeoutException:
+            print("Landing page stopped loading new items after " + str(len(found)) + " item(s).")
+            break
+        take(batch)
+        scroll_times.append(time.perf_counter() - start)
+        timer.observe("discover", scroll_times[-1])
 
-        if element_to_go_to.get_attribute('title') is None or element_to_go_to.get_attribute('title') == "":
-            return None
-        else:
-            return element_to_go_to.get_attribute('title')
+    # an empty title means the image has no hover text
+    pages = [(pos, url, title if title else None) for pos, (url, title) in enumerate(found.items())]
+    return pages[0:amount], scroll_times
 
-    # method that gathers data from the individual photo pages
-    def get_info(self, url):
-        # opens photo page up in new tab
-        self.driver.execute_script('window.open("' + url + '");')
 
-        # switches driver form main window to new window
-        for window in self.driver.window_handles:
-            if window != self.main_window:
-                self.driver.switch_to.window(window)
-                break
+# raised inside a crawl once the code iterating UnsplashScrape.rows() has stopped
+class CrawlStopped(Exception):
+    pass
 
-        # time delay to give elements time to load and to not overload the server
-        time.sleep(1)
-        WebDriverWait(self.driver, 10).until(
-            ec.presence_of_all_elements_located((By.XPATH, '//*[text()="Info"]')))
 
-        # loop to find photographers name
-        # thorough checking to make sure the right thing is gathered
-        for val in self.driver.find_elements_by_css_selector("a[href^='/@']"):
-            if val.text.strip() != "" and val.text.strip() != "Available for hire":
-                self.photographer.append(val.get_attribute("href").replace("https://unsplash.com/@", ""))
-                break
+# main class that contains the logic for crawling unsplash
+class UnsplashScrape:
+    base = ""  # main page
+    crawl_amount = 0  # total pages to be crawled
+    driver = ""  # driver of the session that is scrolling the landing page
+    sessions = None  # pool of warm browser sessions that the landing page and photo pages are loaded in
+    recycle_after = 200  # pages a browser session loads before it is restarted
+    workers = 1  # number of independent driver sessions used to visit photo pages
+    max_concurrent = 1  # global cap on how many photo pages may be loading at the same time
+    output = "data/data.csv"  # where rows are saved, the format is picked by the extension (csv, jsonl, parquet, arrow)
+    append = False  # add the rows to the existing output instead of replacing it
+    sink = None  # output the rows are streamed to
+    writer = None  # puts rows back in landing page order before they reach the sink
+    backend = "browser"  # how photo pages are extracted, "browser" or "http"
+    http = None  # http extraction backend, only created when backend is "http"
+    rate = 1.0  # max photo pages requested per second across the whole crawl, None for no limit
+    attempts = 3  # how many times a failing step is tried before the crawl gives up
+    limiter = None  # token bucket shared by everything that makes a request
+    checkpoint = None  # records the discovered urls and finished pages so an interrupted crawl can resume
+    skip = set()  # urls that are never extracted, e.g. photos already in the dataset
+    seen = None  # sqlite file of the photos earlier crawls scraped (see UnsplashScrapeFilter.SeenSet), None for none
+    exclude = None  # accounts whose photos are skipped before extraction, None for data/excluded.txt
+    skip_sponsored = True  # whether sponsored photos on the landing page are skipped
+    page_filter = None  # drops unwanted landing page links before their pages are opened
+    timer = None  # times every step of the crawl
+    fields = None  # counts the fields that could not be found or parsed
+    raw = None  # .jsonl file the raw strings of every page are kept in, None to not keep them
+    raw_sink = None
+    timings = "data/timings.json"  # where the step timings are written at the end of a run, None to only print them
+    metrics_port = None  # local port the live metrics are served on while the crawl runs, None for no endpoint
+    events = None  # JSONL file every page, failure, retry and skip is logged to, None for no log
+    check_input = True  # whether the settings passed validation, error holds the reason when they did not
+    error = None
+    emit = None  # called with every written row while rows() is being iterated
+    stopped = None  # set once rows() is no longer being iterated
+    MAX_PAGES = 1000  # max number of pages allowed to be crawled
+    MAX_WORKERS = 8  # max number of driver sessions allowed to run at once
+    HTTP_PER_HOST = 4  # requests in flight per host with the http backend when max_concurrent is not given
 
-        # loop to find the image url
-        # thorough checking to make sure the right link is gathered
-        # sometimes the image wont load fast enough so if the element go stale
-        # a.k.a not loaded yet it will wait two seconds and attempt to get it again
+    # initialization function of the UnsplashScrape class
+    # validates the settings and sets values to class wide variables, the crawl itself is started with run
+    # (or iterated with rows), run=True starts it straight away like earlier versions did
+    # workers > 1 extracts photo pages with a pool of drivers, max_concurrent limits how many of them
+    # may hit the site at once (defaults to the number of workers)
+    # backend "http" fetches photo pages without a browser, the browser is then only used for the landing page
+    # and the photo pages are fetched by the async crawl engine, max_concurrent then caps requests per host
+    # (HTTP_PER_HOST by default) whatever the number of workers, which only size the browser pool
+    # rate limits requests per second for every backend, replacing the old fixed delays
+    # output None keeps the rows out of any file, they are then only handed to rows()
+    # raw is a .jsonl file the raw strings of every page are written to before they are parsed, so the rows
+    # can be parsed again later (see UnsplashScrapeNormalize) without crawling the pages again. with output
+    # None and rows() not iterated nothing is parsed during the crawl at all
+    # append adds the rows to an existing csv or jsonl output (and raw) instead of replacing it
+    # checkpoint is the sqlite file used to resume interrupted crawls, None turns resuming off
+    # skip is a collection of photo page urls that are left out of the crawl
+    # seen is the sqlite file (e.g. data/seen.db) of the photos earlier crawls scraped, they are skipped on the
+    # landing page and every photo written is added to it, None crawls photos whether they were seen or not
+    # exclude lists accounts whose photos are skipped on the landing page (None reads data/excluded.txt),
+    # skip_sponsored skips the photos marked as sponsored
+    # timings is where the latency summary of every crawl step is written
+    # metrics_port serves the live counters, gauges and step histograms in the Prometheus text format at
+    # http://127.0.0.1:<metrics_port>/metrics while the crawl runs, events appends every finished page,
+    # failure, retry and skip to a JSONL file (see UnsplashScrapeMetrics)
+    # sessions is a SessionPool to take browsers from, passing the same pool to several crawls keeps the
+    # browsers warm between them, without one a pool is made for every run and closed when it ends
+    # recycle_after is how many pages a browser session of that pool loads before it is restarted
+    def __init__(self, main_site, crawl_pages, workers=1, max_concurrent=None, output="data/data.csv",
+                 backend="browser", rate=1.0, attempts=3, append=False, checkpoint="data/checkpoint.db", skip=(),
+                 seen=None, exclude=None, skip_sponsored=True, timings="data/timings.json", metrics_port=None,
+                 events=None, sessions=None, recycle_after=200, raw=None, run=True):
+        self.base = main_site
+        self.output = output
+        self.raw = raw
+        self.append = append
+        self.skip = set(skip)
+        self.seen = seen
+        self.exclude = exclude
+        self.skip_sponsored = skip_sponsored
+        self.timings = timings
+        self.metrics_port = metrics_port
+        self.events = events
+        self.timer = UnsplashScrapeMetrics.StepTimer()
+        self.fields = UnsplashScrapeExtract.FieldStats()
+        self.rate = rate
+        self.attempts = attempts
+        self.limiter = UnsplashScrapeEngine.TokenBucket(rate)
+        self.sessions = sessions
+        self.recycle_after = recycle_after if sessions is None else sessions.recycle_after
+        self.emit = None
+        self.stopped = threading.Event()
+
+        # validate user input
+        self.error = self.validate(crawl_pages, workers, backend, checkpoint, output, raw)
+        self.check_input = self.error is None
+        if not self.check_input:
+            if run:
+                print(self.error)
+            return
+
+        print("Okay gathering " + str(crawl_pages) + " item(s) from " + self.base + ".")
+        self.crawl_amount = int(crawl_pages)
+        self.workers = int(workers)
+        self.backend = backend
+        if self.backend == "http":
+            self.http = UnsplashScrapeExtract.HttpBackend(timer=self.timer, stats=self.fields)
+
+        # more concurrent pages than workers is not possible, so the limit is clamped to the pool size
+        # requests over http are not tied to a browser, their limit is only kept at one or more
+        if self.backend == "http":
+            self.max_concurrent = max(int(max_concurrent), 1) if max_concurrent is not None else self.HTTP_PER_HOST
+        elif max_concurrent is None:
+            self.max_concurrent = self.workers
+        else:
+            self.max_concurrent = min(max(int(max_concurrent), 1), self.workers)
+
+        # a crawl of the same site into the same output picks up where the last one stopped, a crawl that only
+        # keeps raw strings resumes into its raw file
+        target = output if output is not None else raw
+        if checkpoint is not None and target is not None:
+            self.checkpoint = UnsplashScrapeStore.Checkpoint(checkpoint, self.base, target)
+            if self.checkpoint.done_urls():
+                print("Resuming interrupted crawl, " + str(len(self.checkpoint.done_urls())) +
+                      " item(s) already collected.")
+                self.append = True
+
+        if run:
+            self.run()
+
+    # reason the settings cannot be crawled with, None if they are fine
+    def validate(self, crawl_pages, workers, backend, checkpoint, output, raw=None):
+        if int(crawl_pages) > self.MAX_PAGES or int(crawl_pages) < 1:
+            return "Requested Crawl Amount Too Large (Limit is " + str(self.MAX_PAGES) + ")"
+        elif int(workers) > self.MAX_WORKERS or int(workers) < 1:
+            return "Requested Worker Amount Invalid (Limit is " + str(self.MAX_WORKERS) + ")"
+        elif backend not in ["browser", "http"]:
+            return "Requested Backend Invalid (Options are browser and http)"
+        elif checkpoint is not None and output is not None and not UnsplashScrapeStore.can_append(output):
+            return "Resumable crawls need a csv or jsonl output (pass checkpoint=None to turn resuming off)"
+        elif raw is not None and not raw.lower().endswith(".jsonl"):
+            return "Raw strings are kept in a .jsonl file"
+        return None
+
+    # runs the crawl, every row is written to the output as soon as it and the rows before it are scraped
+    def run(self):
+        if not self.check_input:
+            raise ValueError(self.error)
+
+        self.writer = None
+        self.sink = None
+        self.raw_sink = None
+
+        # browsers are only started once a page actually has to be loaded
+        own_sessions = self.sessions is None
+        if own_sessions:
+            self.sessions = SessionPool(self.workers, self.recycle_after, timer=self.timer)
+
+        # photos that would be thrown away are dropped before their pages are opened
+        seen = UnsplashScrapeFilter.SeenSet(self.seen) if self.seen is not None else None
+        self.page_filter = UnsplashScrapeFilter.PageFilter(seen, self.skip, self.exclude, self.skip_sponsored,
+                                                           timer=self.timer)
+
+        # live telemetry, only while the crawl runs
+        server = None
+        if self.metrics_port is not None:
+            server = UnsplashScrapeMetrics.MetricsServer(self.timer, self.metrics_port).start()
+            print("Serving metrics at " + server.url)
+        log = UnsplashScrapeMetrics.EventLog(self.events, self.timer) if self.events is not None else None
+        self.timer.event("start", site=self.base, amount=self.crawl_amount, backend=self.backend, workers=self.workers)
+
+        # rows are streamed to the output file as they are scraped
+        # the sink is closed even if the crawl fails so every finished row is kept
+        if self.output is not None:
+            self.sink = UnsplashScrapeStore.open_sink(self.output, self.append)
+        if self.raw is not None:
+            self.raw_sink = UnsplashScrapeStore.JsonlSink(self.raw, self.append)
+        try:
+            # call to main data collection function
+            self.get_attrs()
+        finally:
+            if self.writer is not None:
+                self.writer.close(self.checkpoint.keep if self.checkpoint is not None else None)
+            if self.sink is not None:
+                self.sink.close()
+            if self.raw_sink is not None:
+                self.raw_sink.close()
+            if seen is not None:
+                seen.close()
+            self.timer.event("end", **self.timer.snapshot())
+            if log is not None:
+                log.close()
+            if server is not None:
+                server.stop()
+            if own_sessions:
+                self.sessions.close()
+                self.sessions = None
+            self.timer.report(self.timings)
+            self.fields.report()
+            self.page_filter.report()
+
+        # nothing left to resume once the crawl has finished
+        if self.checkpoint is not None:
+            self.checkpoint.clear()
+            self.checkpoint.close()
+            self.checkpoint = None
+
+    # runs the crawl in the background and yields every row (a PhotoRow) in landing page order as soon as it
+    # is written, the rows still go to the output as well unless it is None
+    # stopping the iteration early stops the crawl, the rows written so far are kept
+    def rows(self):
+        rows = queue.Queue()
+        finished = object()
+
+        def crawl():
+            try:
+                self.run()
+            except Exception as e:
+                rows.put(e)
+            finally:
+                rows.put(finished)
+
+        self.emit = rows.put
+        self.stopped.clear()
+        thread = threading.Thread(target=crawl, daemon=True)
+        thread.start()
         try:
-            for val in self.driver.find_elements_by_css_selector("img"):
-                if val.get_attribute('itemprop') != "thumbnailUrl" and "1pixel.gif" not in val.get_attribute("src")\
-                        and val.get_attribute("role") is None:
-                    self.img_url.append(val.get_attribute('src'))
+            while True:
+                row = rows.get()
+                if row is finished:
                     break
-        except StaleElementReferenceException:
-            WebDriverWait(self.driver, 10).until(
-                ec.presence_of_all_elements_located((By.CSS_SELECTOR, 'img')))
-            for val in self.driver.find_elements_by_css_selector("img"):
-                if val.get_attribute('itemprop') != "thumbnailUrl" and "1pixel.gif" not in val.get_attribute("src")\
-                        and val.get_attribute("role") is None:
-                    self.img_url.append(val.get_attribute('src'))
+                if isinstance(row, Exception):
+                    if not isinstance(row, CrawlStopped):
+                        raise row
                     break
+                yield row
+        finally:
+            self.stopped.set()
+            thread.join()
+            self.emit = None
+
+    # called with the raw strings of every page once its turn in landing page order has come
+    # the raw strings are kept first, then parsed into the row that goes to the output and to rows()
+    def on_write(self, raw):
+        if self.raw_sink is not None:
+            self.raw_sink.write(raw)
+        row = None
+        if self.sink is not None or self.emit is not None:
+            with self.timer.time("parse"):
+                values = UnsplashScrapeExtract.parse_info(raw.as_dict(), self.fields)
+            row = UnsplashScrapeStore.PhotoRow(img_page=raw.img_page, img_hvr_txt=raw.img_hvr_txt, **values)
+            if self.sink is not None:
+                self.sink.write(row)
+
+        self.timer.count("rows")
+        if self.checkpoint is not None:
+            self.checkpoint.mark_done(raw)
+        if self.page_filter.seen is not None:
+            self.page_filter.seen.add([raw.img_page])
+        if self.emit is not None:
+            self.emit(row)
 
-        # attempts to get a location if one is provided
-        # have to handle and exception here because there is only one possible element that could match
-        # so we have to handle the exception that is thrown if it is not present
-        try:
-            self.location.append(self.driver.find_element_by_css_selector("a[href^='/s/photos'] > span").text)
-        except NoSuchElementException:
-            self.location.append(None)
-
-        # collect the summary if present
-        # the only other <p> tags are ones leading to related content
-        # so we can check for those
-        # might cause and issue where the word Related is in the summary
-        check_sum = None
-        for val in self.driver.find_elements_by_css_selector("p"):
-            if "Related" not in val.text:
-                check_sum = val.text
-                break
-        self.summary.append(check_sum)
-
-        # click the info button
-        try:
-            info_button = self.driver.find_element_by_xpath('//*[text()="Info"]').find_element_by_xpath("..")
-            self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", info_button)
-            info_button.click()
-            # wait to make sure that the stuff under the info button actually loads
-            WebDriverWait(self.driver, 10).until(
-                ec.presence_of_all_elements_located((By.XPATH, '//*[text()="Views"]/../following-sibling::dd/span[1]')))
-        except TimeoutException:
-            time.sleep(2)
-            info_button = self.driver.find_element_by_xpath('//*[text()="Info"]').find_element_by_xpath("..")
-            self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", info_button)
-            info_button.click()
-            # wait to make sure that the stuff under the info button actually loads
-            WebDriverWait(self.driver, 10).until(
-                ec.presence_of_all_elements_located((By.XPATH, '//*[text()="Views"]/../following-sibling::dd/span[1]')))
-
-        # everything under the info tab is basically formatted the same
-        # it has a title for what it is in the dt tag with some text so we can just
-        # get the second sibling of its parent node
-
-        self.views.append(int((self.driver.find_element_by_xpath('//*[text()="Views"]/../following-sibling::dd/span[1]')
-                          .text.replace(",", ""))))
-
-        self.downloads.append(int(
-            self.driver.find_element_by_xpath('//*[text()="Downloads"]/../following-sibling::dd/span[1]')
-                .text.replace(",", "")))
-
-        check_camera_make = self.driver.find_element_by_xpath('//*[text()="Camera Make"]/following-sibling::dd').text
-        if check_camera_make == "--":
-            self.camera_make.append(None)
-        else:
-            self.camera_make.append(check_camera_make)
-
-        check_camera_model = self.driver.find_element_by_xpath('//*[text()="Camera Model"]/following-sibling::dd').text
-        if check_camera_model == "--":
-            self.camera_model.append(None)
-        else:
-            self.camera_model.append(check_camera_model)
-
-        check_focal_len = self.driver.find_element_by_xpath('//*[text()="Focal Length"]/following-sibling::dd').text
-        if check_focal_len == "--":
-            self.focal_len.append(None)
-        else:
-            self.focal_len.append(float(check_focal_len.replace("mm", "")))
-
-        check_aperture = self.driver.find_element_by_xpath('//*[text()="Aperture"]/following-sibling::dd').text
-        if check_aperture == "--":
-            self.aperture.append(None)
-        else:
-            self.aperture.append(float(check_aperture.replace("\u0192/", "")))
-
-        # create shutter speed as a float instead of fraction in string format
-        check_shutter_speed = self.driver.find_element_by_xpath(
-            '//*[text()="Shutter Speed"]/following-sibling::dd').text
-        if check_shutter_speed == "--":
-            self.shutter_speed.append(None)
-        else:
-            check_shutter_speed = check_shutter_speed.replace("s", "")
-            if len(check_shutter_speed.split("/")) == 2:
-                check_shutter_speed = check_shutter_speed.split('/')
-                check_shutter_speed = float(check_shutter_speed[0]) / float(check_shutter_speed[1])
-            self.shutter_speed.append(float(check_shutter_speed))
-
-        check_iso = self.driver.find_element_by_xpath('//*[text()="ISO"]/following-sibling::dd').text
-        if check_iso == "--":
-            self.iso.append(None)
+    # main data collection function
+    def get_attrs(self):
+        # the landing page only has to be scrolled if no earlier run already found enough urls
+        pages = []
+        if self.checkpoint is not None:
+            pages = self.checkpoint.frontier()
+        if len(pages) >= self.crawl_amount:
+            pages = pages[0:self.crawl_amount]
         else:
-            self.iso.append(int(check_iso))
-
-        check_img_res = self.driver.find_element_by_xpath('//*[text()="Dimensions"]/following-sibling::dd').text
-        if check_img_res == "--":
-            self.img_resolution.append(None)
+            pages = self.discover()
+            if self.checkpoint is not None:
+                self.checkpoint.set_frontier(pages)
+
+        # pages finished by an earlier run or asked to be skipped are left out, the writer is told so it
+        # doesnt wait for them. rows an earlier run finished ahead of a missing one go back to the writer and
+        # are written once the rows before them are
+        done = set(pos for pos, url, hover in pages if url in self.skip)
+        waiting = {}
+        if self.checkpoint is not None:
+            done_urls = self.checkpoint.done_urls()
+            done |= set(pos for pos, url, hover in pages if url in done_urls)
+            waiting = self.checkpoint.waiting()
+        self.writer = UnsplashScrapeStore.OrderedWriter(None, done=done, on_write=self.on_write)
+        for pos, url, hover in pages:
+            if pos not in done and url in waiting:
+                self.writer.put(pos, waiting[url])
+        todo = [page for page in pages if page[0] not in done and page[1] not in waiting]
+
+        if self.backend == "http":
+            self.get_attrs_async(todo)
+            return
+
+        # pages leave the queue as soon as a browser starts on them, the async crawler keeps count on its own
+        self.timer.shift("queue_depth", len(todo))
+        if self.workers > 1:
+            self.get_attrs_pooled(todo)
         else:
-            check_img_res = check_img_res.replace(" × ", ", ")
-            self.img_resolution.append(check_img_res)
-
-        # add 1 to count in order to keep a total of images when combining rows and such later on
-        self.count.append(1)
+            for pos, url, hover in todo:
+                self.timer.shift("queue_depth", -1)
+                print(str(pos + 1) + ". Collecting info from: " + url)
+
+                # collects all attributes from photo page, the same warm session is handed out every time
+                with self.sessions.session() as session:
+                    raw = self.get_raw(url, session)
+                self.add_row(pos, url, hover, raw)
+
+    # scrolls the landing page until enough items are loaded and returns (position, url, hover text)
+    # for each of them, the hover text is the only attribute that does not require you to go to the photo page
+    # the session goes back to the pool afterwards and its tab is reused for the photo pages
+    def discover(self):
+        with self.sessions.session() as session:
+            self.driver = session.driver
+            session.visit(self.base)
+            return discover_pages(self.driver, self.crawl_amount, self.limiter, timer=self.timer,
+                                  page_filter=self.page_filter)[0]
+
+    # extracts the photo pages with a pool of independent browser sessions
+    # each worker pulls (position, url, hover) off a shared queue so the rows can be put back in landing page order
+    def get_attrs_pooled(self, pages):
+        work = queue.Queue()
+        for page in pages:
+            work.put(page)
+
+        errors = []
+        politeness = threading.BoundedSemaphore(self.max_concurrent)
+
+        threads = [threading.Thread(target=self.pool_worker, args=(work, errors, politeness))
+                   for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # a failed page stops the crawl just like it does with a single driver
+        if errors:
+            raise errors[0]
+
+    # extracts the photo pages over http with the async crawl engine
+    # pages are requested concurrently, paced by the shared token bucket, and come back in landing page order
+    def get_attrs_async(self, pages):
+        crawler = UnsplashScrapeEngine.AsyncCrawler(self.limiter, per_host=self.max_concurrent,
+                                                    attempts=self.attempts, timer=self.timer)
+        crawler.crawl([url for pos, url, hover in pages], self.http.get_raw,
+                      emit=lambda i, raw: self.add_row(pages[i][0], pages[i][1], pages[i][2], raw))
+
+    # body of a single pool worker, checks a session out of the pool for every page
+    # the pool holds one session per worker so no browser is started after the first pages
+    def pool_worker(self, work, errors, politeness):
+        while not errors:
+            try:
+                pos, url, hover = work.get_nowait()
+            except queue.Empty:
+                break
+            self.timer.shift("queue_depth", -1)
+            print(str(pos + 1) + ". Collecting info from: " + url)
+            try:
+                with politeness, self.sessions.session() as session:
+                    raw = self.get_raw(url, session)
+                self.add_row(pos, url, hover, raw)
+            except Exception as e:
+                errors.append(e)
+
+    # hands the raw strings of a finished page to the writer, pos is the page's place on the landing page
+    # raises CrawlStopped once whoever is iterating rows() has stopped, which ends the crawl
+    def add_row(self, pos, url, hover, raw):
+        if self.stopped.is_set():
+            raise CrawlStopped()
+        self.writer.put(pos, UnsplashScrapeStore.RawRow(img_page=url, img_hvr_txt=hover, **raw))
+
+    # method that gathers the raw strings of the individual photo pages with the browser
+    # the page is loaded into the session's one tab, no tabs are opened or closed
+    def get_raw(self, url, session):
+        return get_page(url, session, self.limiter, self.timer, self.attempts)
+
+
+# refreshes the views and downloads of every photo already in data without scraping anything else
+# each run appends one row per photo to history with the time of the run, so the metrics build a time series
+# when new_pages is given the landing page is crawled as well and only photos not in data get a full
+# extraction, they are appended to data and their first metrics are taken from the new rows
+# known photos are fetched over plain http so no browser is needed unless new_pages is given, a photo that
+# cannot be fetched (e.g. it was deleted since it was scraped) gets no history row and the rest carry on
+# the analytics index (see UnsplashScrapeIndex) is brought up to date with the new rows afterwards, index=None
+# leaves it alone
+def refresh(main_site, data="data/data.csv", history="data/history.csv", new_pages=0, rate=1.0,
+            max_concurrent=4, attempts=3, index="data/index.db", **options):
+    scraped_at = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+    known = [row["img_page"] for row in UnsplashScrapeStore.iter_rows(data)]
+
+    history_sink = UnsplashScrapeStore.open_sink(history, append=True, columns=UnsplashScrapeStore.HISTORY_COLUMNS)
+    try:
+        if new_pages > 0:
+            UnsplashScrape(main_site, new_pages, output=data, append=True, rate=rate, attempts=attempts,
+                           skip=known, **options)
+            known_set = set(known)
+            for row in UnsplashScrapeStore.iter_rows(data):
+                if row["img_page"] not in known_set:
+                    history_sink.write(UnsplashScrapeStore.MetricRow(img_page=row["img_page"], scraped_at=scraped_at,
+                                                                     views=row["views"], downloads=row["downloads"]))
+
+        print("Refreshing views and downloads of " + str(len(known)) + " known item(s).")
+        failed = []
+        crawler = UnsplashScrapeEngine.AsyncCrawler(UnsplashScrapeEngine.TokenBucket(rate), per_host=max_concurrent,
+                                                    attempts=attempts,
+                                                    on_error=lambda i, url, e: failed.append((url, e)))
+        http = UnsplashScrapeExtract.HttpBackend()
+        crawler.crawl(known, http.get_metrics,
+                      emit=lambda i, metrics: history_sink.write(
+                          UnsplashScrapeStore.MetricRow(img_page=known[i], scraped_at=scraped_at, **metrics)))
+        http.stats.report()
+        if failed:
+            print("Could not refresh " + str(len(failed)) + " item(s):")
+            for url, e in failed:
+                print(" - " + url + ": " + repr(e))
+    finally:
+        history_sink.close()
+
+    if index is not None:
+        with UnsplashScrapeIndex.AnalyticsIndex(index) as analytics:
+            analytics.update(data, history)
+    return len(known)
+
+
+# coordinator of a distributed crawl
+# scrolls the landing page, publishes the photo pages to the shared work queue and waits for the workers
+# (see work) to finish them, the rows are then written to output in landing page order
+# the queue is kept so a coordinator that is restarted picks the crawl back up, remove it to start over
+# lease and attempts are stored in the queue, the workers hand out and give up on pages by them
+# seen, exclude and skip_sponsored decide which landing page photos are published, as for UnsplashScrape
+def coordinate(main_site, crawl_pages, queue="data/queue.db", output="data/data.csv", rate=1.0, lease=120.0,
+               attempts=3, poll=5.0, seen=None, exclude=None, skip_sponsored=True):
+    work_queue = UnsplashScrapeStore.WorkQueue(queue, lease, attempts)
+    seen = UnsplashScrapeFilter.SeenSet(seen) if seen is not None else None
+    try:
+        if work_queue.counts()["done"] == 0 and not work_queue.pending():
+            page_filter = UnsplashScrapeFilter.PageFilter(seen, (), exclude, skip_sponsored)
+            with SessionPool() as sessions, sessions.session() as session:
+                session.visit(main_site)
+                pages = discover_pages(session.driver, int(crawl_pages), UnsplashScrapeEngine.TokenBucket(rate),
+                                       page_filter=page_filter)[0]
+            page_filter.report()
+            work_queue.publish(pages)
+            print("Published " + str(len(pages)) + " item(s) to " + queue + ".")
+
+        while work_queue.pending():
+            counts = work_queue.counts()
+            print(str(counts["done"]) + " done, " + str(counts["leased"]) + " in progress, " + str(counts["todo"]) +
+                  " waiting, " + str(counts["failed"]) + " failed")
+            time.sleep(poll)
+
+        with UnsplashScrapeStore.open_sink(output) as sink:
+            for row in work_queue.rows():
+                sink.write(UnsplashScrapeStore.PhotoRow(**row))
+                if seen is not None:
+                    seen.add([row["img_page"]])
+        counts = work_queue.counts()
+        print("Crawl finished, " + str(counts["done"]) + " item(s) written to " + output + ", " +
+              str(counts["failed"]) + " failed.")
+        return counts
+    finally:
+        work_queue.close()
+        if seen is not None:
+            seen.close()
+
+
+# worker of a distributed crawl, run as many as wanted on any node that can reach the queue
+# claims photo pages batch at a time, extracts them with a warm browser session (or over http) and stores the
+# rows in the queue. a page that fails is handed back for another try, if the worker dies its leases run out
+# and the pages go to the other workers, so a batch should take well under the queue's lease
+# rate is per worker so the whole cluster requests at most rate * workers pages a second
+# the worker exits once every task in the queue is finished, or after waiting `idle` seconds for work
+# metrics_port and events expose the worker's telemetry like they do for UnsplashScrape, queue_depth is then the
+# number of pages in the shared queue that no worker has claimed yet
+def work(queue="data/queue.db", worker=None, backend="browser", rate=1.0, attempts=3, batch=1, recycle_after=200,
+         idle=60.0, poll=1.0, metrics_port=None, events=None):
+    if worker is None:
+        worker = socket.gethostname() + ":" + str(os.getpid())
+    work_queue = UnsplashScrapeStore.WorkQueue(queue)
+    limiter = UnsplashScrapeEngine.TokenBucket(rate)
+    timer = UnsplashScrapeMetrics.StepTimer()
+    server = UnsplashScrapeMetrics.MetricsServer(timer, metrics_port).start() if metrics_port is not None else None
+    log = UnsplashScrapeMetrics.EventLog(events, timer) if events is not None else None
+    stats = UnsplashScrapeExtract.FieldStats()
+    http = UnsplashScrapeExtract.HttpBackend(timer=timer, stats=stats) if backend == "http" else None
+    sessions = SessionPool(recycle_after=recycle_after, timer=timer) if http is None else None
+    finished = 0
+    waited = 0.0
+
+    # over http a page is fetched again if the site has a temporary problem
+    def fetch(url):
+        limiter.wait()
+        return http.get_info(url)
+
+    timer.event("start", worker=worker, queue=queue, backend=backend)
+    try:
+        while True:
+            tasks = work_queue.claim(worker, batch)
+            timer.gauge("queue_depth", work_queue.counts()["todo"])
+            if not tasks:
+                # tasks of the coordinator may not have been published yet
+                if (sum(work_queue.counts().values()) > 0 and not work_queue.pending()) or waited >= idle:
+                    break
+                time.sleep(poll)
+                waited += poll
+                continue
+            waited = 0.0
+
+            for pos, url, hover in tasks:
+                print(str(pos + 1) + ". Collecting info from: " + url)
+                try:
+                    if http is not None:
+                        with timer.page(url):
+                            row = UnsplashScrapeEngine.retry(lambda: fetch(url), attempts,
+                                                             should_retry=UnsplashScrapeEngine.transient_error,
+                                                             on_retry=lambda e, attempt: timer.retried(url, e, attempt))
+                    else:
+                        with sessions.session() as session:
+                            raw = get_page(url, session, limiter, timer, attempts)
+                        with timer.time("parse"):
+                            row = UnsplashScrapeExtract.parse_info(raw, stats)
+                except Exception as e:
+                    print("Failed " + url + ": " + repr(e))
+                    work_queue.fail(worker, pos)
+                    continue
+                work_queue.complete(pos, UnsplashScrapeStore.PhotoRow(img_page=url, img_hvr_txt=hover, **row))
+                finished += 1
+    finally:
+        if sessions is not None:
+            sessions.close()
+        work_queue.close()
+        timer.event("end", **timer.snapshot())
+        if log is not None:
+            log.close()
+        if server is not None:
+            server.stop()
+        timer.report()
+        stats.report()
+    print("Worker " + worker + " finished " + str(finished) + " item(s).")
+    return finished
 
 
 # will run the scraper if this is main file and it is not being imported
@@ -0,0 +1,374 @@
+"""
+UNSPLASH SCRAPE ANALYSIS
+
+Aggregates behind the visualizer. Every total the plots and the perfect camera need (views, downloads and
+photo count by photographer, by camera make and model, and by each camera setting) is computed once by
+aggregate, using pandas' native groupby sums instead of a Python lambda per group, and handed back as a
+single Aggregates object the visualizer reads from.
+
+Grouping on the categorical columns of the typed dataset (see UnsplashScrapeStore.load_dataset) works on
+the category codes, so the cost grows with the number of rows only and stays low on datasets built from
+many crawls.
+
+Datasets too large to load at once are aggregated in chunks (aggregate_chunks). Every chunk is reduced to
+its totals per group, which are merged with the totals of the chunks before it, so memory grows with the
+number of photographers, cameras and settings rather than with the number of photos. The totals are exact
+integer sums, the merged aggregates are identical to the ones aggregate computes from the whole dataset.
+aggregate_file picks the chunked path on its own once the file is larger than IN_MEMORY_BYTES.
+
+AggregateCache sits in front of aggregate for the visualizer menu. Aggregates are cached per dataset
+fingerprint (path, modification time and size of the file) and every rendered chart per content hash of the
+aggregates it was drawn from, so a repeated menu choice returns straight away and a new crawl only
+re-renders the charts whose numbers actually changed. Entries live in memory and in data/cache, the least
+recently used ones are evicted once there are more than max_entries.
+"""
+
+# necessary imports
+import os
+import json
+import pickle
+import shutil
+import hashlib
+from collections import OrderedDict
+import UnsplashScrapeStore
+
+# camera settings that are aggregated, in the order they are plotted
+SETTINGS = ["focal_len", "aperture", "shutter_speed", "iso"]
+
+# columns that are summed for every group
+TOTALS = ["views", "downloads", "count"]
+
+# number of photos whose views and downloads are known, summed along with TOTALS so the averages leave out
+# photos that are missing a metric
+KNOWN = {"views": "views_known", "downloads": "downloads_known"}
+
+# columns of every aggregate table that are not group keys
+VALUES = TOTALS + ["avg_views", "avg_downloads"]
+
+# group keys of every aggregate table
+GROUPINGS = [["photographer"], ["camera_make", "camera_model"]] + [[setting] for setting in SETTINGS]
+
+# datasets up to this size on disk are aggregated in memory, larger ones in chunks
+IN_MEMORY_BYTES = 256 * 1024 ** 2
+
+# accounts left out of photographer rankings, e.g. brands posting sponsored photos
+EXCLUDED_ACCOUNTS = ["ballparkbrand"]
+
+# file that replaces EXCLUDED_ACCOUNTS when it exists, one account per line
+EXCLUDED_FILE = "data/excluded.txt"
+
+
+# accounts left out of photographer rankings, read from path if it exists
+# blank lines and lines starting with # are ignored, accounts are lowercased since unsplash usernames do not
+# depend on case and every ranking matches them that way
+def excluded_accounts(path=EXCLUDED_FILE):
+    if path is None or not os.path.exists(path):
+        return [account.lower() for account in EXCLUDED_ACCOUNTS]
+    with open(path, encoding="utf-8") as file:
+        return [line.strip().lower() for line in file if line.strip() and not line.strip().startswith("#")]
+
+
+# the counts of KNOWN for every row of a dataset, a table of partial totals already has them
+def with_known(df):
+    if KNOWN["views"] in df.columns:
+        return df
+    return df.assign(**{known: df["count"].where(df[metric].notna(), 0) for metric, known in KNOWN.items()})
+
+
+# sums views, downloads and count (and the counts of KNOWN) for every value of keys, missing metrics are
+# left out of the sums
+def sums(df, keys, sort):
+    return with_known(df).groupby(keys, observed=True, sort=sort)[TOTALS + list(KNOWN.values())].sum()
+
+
+# sums views, downloads and count for every value of keys in one pass and adds the averages per photo
+# rows missing any of the keys are left out, count is summed rather than counted so combined rows keep
+# their weight. the averages only count the photos whose metric is known, NaN if none of them is
+def totals(df, keys):
+    import numpy as np
+
+    grouped = sums(df, keys, True)
+    for metric, known in KNOWN.items():
+        grouped[metric] = grouped[metric].astype("int64")
+        grouped["avg_" + metric] = grouped[metric] / grouped[known].astype("float64").replace(0, np.nan)
+    return grouped.drop(columns=list(KNOWN.values())).reset_index()
+
+
+# position of the row with the highest value in a column that may have missing values, the first one on a
+# tie and None if every value is missing
+def argmax(values):
+    values = values.astype("float64")
+    if values.isna().all():
+        return None
+    return int(values.fillna(float("-inf")).to_numpy().argmax())
+
+
+# every aggregate of a dataset, tables are DataFrames with the group keys followed by
+# views, downloads, count, avg_views and avg_downloads
+class Aggregates:
+    def __init__(self, photographers, make_model, settings, most_viewed):
+        self.photographers = photographers  # totals by photographer, most viewed first
+        self.make_model = make_model  # totals by camera make and model
+        self.settings = settings  # setting name -> totals by that setting's value, highest value first
+        self.most_viewed = most_viewed  # page url of the photo with the most views
+        self.digests = {}  # (part, columns) -> content hash, filled in as they are asked for
+
+    # content hash of one part of the aggregates ("photographers", "make_model" or "settings"), a chart
+    # only has to be redrawn when the hash of what it is drawn from changes
+    # columns limits the hash to the group keys and the given value columns, None hashes every column
+    def digest(self, part, columns=None):
+        key = (part, None if columns is None else tuple(columns))
+        if key not in self.digests:
+            if part == "settings":
+                tables = [self.settings[setting] for setting in SETTINGS]
+            else:
+                tables = [getattr(self, part)]
+            if columns is not None:
+                tables = [table[[c for c in table.columns if c not in VALUES or c in columns]] for table in tables]
+            self.digests[key] = hashlib.sha1(b"".join(frame_bytes(table) for table in tables)).hexdigest()[:16]
+        return self.digests[key]
+
+    # the value of column in the row of table with the highest average views
+    # ties go to the first row
+    @staticmethod
+    def best(table, column):
+        pos = argmax(table["avg_views"])
+        return table[column].iloc[pos] if pos is not None else None
+
+    # builds the perfect camera, the make/model and every setting with the highest average views
+    # make and model are picked together as it would be weird to have a model that doesnt match its make
+    def perfect_camera(self):
+        camera = {
+            "camera_make": self.best(self.make_model, "camera_make"),
+            "camera_model": self.best(self.make_model, "camera_model")
+        }
+        for setting in SETTINGS:
+            camera[setting] = self.best(self.settings[setting], setting)
+        return camera
+
+    # the n photographers with the most views, leaving out the excluded accounts (excluded_accounts() by default,
+    # case does not matter)
+    def top_photographers(self, n=10, exclude=None):
+        exclude = excluded_accounts() if exclude is None else [account.lower() for account in exclude]
+        names = self.photographers["photographer"].astype(str).str.lower()
+        return self.photographers[~names.isin(exclude)].head(n)
+
+    # plain python summary of the aggregates that can be written as JSON, the top photographers by views,
+    # the perfect camera and the most viewed photo
+    def summary(self, top=10, exclude=None):
+        return {
+            "photos": int(self.photographers["count"].sum()),
+            "photographers": [{key: plain(value) for key, value in row.items()}
+                              for row in self.top_photographers(top, exclude).to_dict("records")],
+            "perfect_camera": {key: plain(value) for key, value in self.perfect_camera().items()},
+            "most_viewed": self.most_viewed
+        }
+
+
+# numpy and pandas scalars as the python value they hold, missing values as None
+def plain(value):
+    import pandas as pd
+
+    if pd.isna(value):
+        return None
+    return value.item() if hasattr(value, "item") else value
+
+
+# computes every aggregate the visualizer needs from a dataset
+def aggregate(df):
+    pos = argmax(df["views"])
+    most_viewed = df["img_page"].iloc[pos] if pos is not None else None
+    return collect(lambda keys: totals(df, keys), most_viewed)
+
+
+# puts the aggregates together from the totals table of every grouping, table(keys) returns it
+def collect(table, most_viewed):
+    photographers = table(["photographer"]).sort_values("views", ascending=False, kind="stable")
+    make_model = table(["camera_make", "camera_model"])
+    settings = {setting: table([setting]).iloc[::-1].reset_index(drop=True) for setting in SETTINGS}
+    return Aggregates(photographers.reset_index(drop=True), make_model, settings, most_viewed)
+
+
+# sums views, downloads and count (and the counts of KNOWN) for every value of keys in a chunk, categorical keys are turned into their
+# values so the totals of chunks with different categories can be stacked
+def partial_totals(df, keys):
+    import pandas as pd
+
+    grouped = sums(df, keys, False).reset_index()
+    for key in keys:
+        if isinstance(grouped[key].dtype, pd.CategoricalDtype):
+            grouped[key] = grouped[key].astype(object)
+    return grouped
+
+
+# computes the same aggregates as aggregate from a dataset handed over in typed chunks, e.g.
+# UnsplashScrapeStore.iter_chunks. only the totals per group are kept between chunks
+def aggregate_chunks(chunks):
+    import pandas as pd
+
+    partials = {}  # group keys -> totals of the chunks so far
+    categories = {}  # categorical column -> every category seen so far, in the order they were first seen
+    shared = {}  # categorical column -> whether every chunk had the very same categories
+    most_viewed, most_views = None, None
+    for df in chunks:
+        for column in df.columns:
+            if isinstance(df[column].dtype, pd.CategoricalDtype):
+                chunk = list(df[column].cat.categories)
+                shared[column] = shared.get(column, True) and categories.get(column, chunk) == chunk
+                categories[column] = list(dict.fromkeys(categories.get(column, []) + chunk))
+        for keys in GROUPINGS:
+            part = partial_totals(df, keys)
+            if tuple(keys) in partials:
+                part = pd.concat([partials[tuple(keys)], part], ignore_index=True)
+                part = sums(part, keys, False).reset_index()
+            partials[tuple(keys)] = part
+        pos = argmax(df["views"])
+        if pos is not None:
+            # the first photo with the most views wins, as in aggregate
+            if most_views is None or df["views"].iloc[pos] > most_views:
+                most_viewed, most_views = df["img_page"].iloc[pos], df["views"].iloc[pos]
+
+    if not partials:
+        return aggregate(UnsplashScrapeStore.typed_frame(pd.DataFrame(columns=UnsplashScrapeStore.DATASET_COLUMNS)))
+
+    # the merged totals get the dtypes of the whole dataset back and are then grouped exactly like aggregate
+    # groups the rows. chunks of a typed dataset all carry its categories in its own order, which is kept,
+    # chunks converted from text only carry the categories they hold, sorted like converting every row at
+    # once would sort them
+    def table(keys):
+        df = partials[tuple(keys)]
+        for key in keys:
+            if UnsplashScrapeStore.DATASET_DTYPES[key] == "category":
+                order = categories.get(key, [])
+                df[key] = df[key].astype(pd.CategoricalDtype(order if shared.get(key) else sorted(order)))
+            else:
+                df[key] = df[key].astype(UnsplashScrapeStore.DATASET_DTYPES[key])
+        return totals(df, keys)
+
+    return collect(table, most_viewed)
+
+
+# aggregates of the dataset at path, in chunks of chunksize rows (so it never has to fit in memory) or all
+# at once for a chunksize of 0. None aggregates files up to IN_MEMORY_BYTES at once and larger ones in chunks
+# of UnsplashScrapeStore.CHUNK_ROWS
+def aggregate_file(path, chunksize=None):
+    if chunksize is None:
+        chunksize = 0 if os.path.getsize(path) <= IN_MEMORY_BYTES else UnsplashScrapeStore.CHUNK_ROWS
+    if chunksize == 0:
+        return aggregate(UnsplashScrapeStore.load_dataset(path))
+    return aggregate_chunks(UnsplashScrapeStore.iter_chunks(path, chunksize))
+
+
+# bytes that identify the contents of a table, column names included
+def frame_bytes(df):
+    import pandas as pd
+
+    return ",".join(df.columns).encode() + pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes()
+
+
+# content hash of a table
+def frame_digest(df):
+    return hashlib.sha1(frame_bytes(df)).hexdigest()[:16]
+
+
+# fingerprint of a dataset file, changes whenever the file is written to
+def file_fingerprint(path):
+    stat = os.stat(path)
+    key = os.path.abspath(path) + ":" + str(stat.st_mtime_ns) + ":" + str(stat.st_size)
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+# memoizes aggregates and rendered charts for the visualizer
+# aggregates are stored as <fingerprint>.pkl, every chart as <name>-<digest>.json listing the pngs it drew
+# along with copies of them. the least recently used aggregates are evicted from memory and disk once
+# there are more than max_entries, and the least recently used charts once there are more than max_charts
+# (every camera make is a chart of its own)
+class AggregateCache:
+    def __init__(self, folder="data/cache", max_entries=16, max_charts=1024, chunksize=None):
+        self.folder = folder
+        self.chunksize = chunksize  # passed on to aggregate_file
+        self.max_entries = max_entries
+        self.max_charts = max_charts
+        self.memory = OrderedDict()  # fingerprint -> Aggregates, most recently used last
+        self.current = {}  # chart name -> key of the render that is currently in place
+        os.makedirs(folder, exist_ok=True)
+
+    # aggregates of the dataset at path, only computed if the file changed since they were last cached
+    def aggregates(self, path):
+        key = file_fingerprint(path)
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return self.memory[key]
+
+        file = os.path.join(self.folder, key + ".pkl")
+        if os.path.exists(file):
+            with open(file, "rb") as cached:
+                results = pickle.load(cached)
+            os.utime(file)
+        else:
+            results = aggregate_file(path, self.chunksize)
+            with open(file, "wb") as cached:
+                pickle.dump(results, cached)
+
+        self.memory[key] = results
+        self.evict()
+        return results
+
+    # makes sure the pngs of chart name are the ones drawn from aggregates with the given digest
+    # draw() renders the chart and returns the paths it saved, it is only called if no render of the same
+    # numbers is cached. returns the paths of the pngs and whether they came from the cache
+    def chart(self, name, digest, draw):
+        paths = self.restore(name, digest)
+        if paths is not None:
+            return paths, True
+        paths = draw()
+        self.store(name, digest, paths)
+        return paths, False
+
+    # puts the cached render of chart name with the given digest in place and returns its paths
+    # None if there is no such render
+    def restore(self, name, digest):
+        key = name + "-" + digest
+        manifest = os.path.join(self.folder, key + ".json")
+        if not os.path.exists(manifest):
+            return None
+
+        with open(manifest) as file:
+            files = json.load(file)
+        if not all(os.path.exists(cached) for cached, target in files):
+            return None
+        if self.current.get(name) != key or not all(os.path.exists(target) for cached, target in files):
+            for cached, target in files:
+                shutil.copyfile(cached, target)
+        os.utime(manifest)
+        self.current[name] = key
+        return [target for cached, target in files]
+
+    # caches the pngs at paths as the render of chart name with the given digest
+    def store(self, name, digest, paths):
+        key = name + "-" + digest
+        files = []
+        for target in paths:
+            cached = os.path.join(self.folder, key + "-" + os.path.basename(target))
+            shutil.copyfile(target, cached)
+            files.append([cached, target])
+        with open(os.path.join(self.folder, key + ".json"), "w") as file:
+            json.dump(files, file)
+        self.current[name] = key
+        self.evict()
+
+    # drops the least recently used entries beyond max_entries and max_charts
+    def evict(self):
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+        for ext, limit in [(".pkl", self.max_entries), (".json", self.max_charts)]:
+            entries = sorted([os.path.join(self.folder, name) for name in os.listdir(self.folder)
+                              if name.endswith(ext)], key=os.path.getmtime)
+            for entry in entries[0:max(0, len(entries) - limit)]:
+                if ext == ".json":
+                    with open(entry) as file:
+                        for cached, target in json.load(file):
+                            if os.path.exists(cached):
+                                os.remove(cached)
+                os.remove(entry)
@@ -0,0 +1,825 @@
+"""
+UNSPLASH SCRAPE BENCHMARKS
+
+Offline benchmarks for the Unsplash scraper. A small stand-in for unsplash.com is served from a
+background thread on localhost, it serves a landing page of photo links and a photo page for each
+link that is laid out the same way the scraper expects (photographer link, image, location,
+summary and the Info dialog with its dt/dd pairs).
+
+The stand-in can add latency to every request and fail a share of the photo pages with a 503, so crawls
+can be measured under realistic and unreliable conditions. run_suite runs every benchmark and saves the
+results as JSON, compare lists what got slower between two saved runs.
+
+bench_imports holds the analysis and rendering entry points to an import time budget: each is imported in a
+fresh interpreter and must neither take longer than its budget nor load any of the heavy dependencies
+(selenium, matplotlib, numpy, pandas, pyarrow) up front. Running the suite exits with an error when one does.
+
+Nothing in here ever touches the real site.
+"""
+
+# necessary imports
+import os
+import sys
+import json
+import time
+import random
+import platform
+import datetime
+import tempfile
+import subprocess
+import threading
+import UnsplashScrapeStore
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+CAMERAS = [("SONY", "ILCE-7C"), ("Canon", "Canon EOS R"), ("NIKON CORPORATION", "NIKON D750"),
+           ("FUJIFILM", "X-T3"), ("Apple", "iPhone 12 Pro"), (None, None)]
+FOCAL_LENS = ["24.0mm", "35.0mm", "50.0mm", "85.0mm", "--"]
+APERTURES = ["ƒ/1.4", "ƒ/2.8", "ƒ/4.0", "ƒ/8.0", "--"]
+SHUTTER_SPEEDS = ["1/15s", "1/125s", "1/1000s", "2s", "--"]
+ISOS = ["100", "400", "800", "2000", "--"]
+
+# most each entry point may take to import in seconds
+IMPORT_BUDGETS = {"UnsplashScrapeVisualizer": 0.2, "UnsplashScrapeCLI": 0.1, "UnsplashScrapeAnalysis": 0.1}
+
+# dependencies that are only to be imported by the code paths that use them
+HEAVY_MODULES = ["selenium", "matplotlib", "numpy", "pandas", "pyarrow"]
+
+# run in a fresh interpreter, prints how long importing the module took and which heavy modules it loaded
+IMPORT_SCRIPT = """
+import sys, json, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+# builds a deterministic set of fake photos so every run of a benchmark sees the same data
+# the photos at the positions in sponsored are marked as sponsored on the landing page
+def make_photos(amount, seed=0, sponsored=()):
+    rand = random.Random(seed)
+    photos = []
+    for i in range(amount):
+        make, model = rand.choice(CAMERAS)
+        photos.append({
+            "id": "photo" + str(i),
+            "title": "fixture photo number " + str(i),
+            "photographer": "user" + str(rand.randrange(50)),
+            "location": rand.choice([None, "Tokyo, Japan", "Paris, France"]),
+            "summary": rand.choice([None, "A summary for photo " + str(i)]),
+            "views": rand.randrange(1000, 10000000),
+            "downloads": rand.randrange(10, 100000),
+            "camera_make": make if make is not None else "--",
+            "camera_model": model if model is not None else "--",
+            "focal_len": rand.choice(FOCAL_LENS),
+            "aperture": rand.choice(APERTURES),
+            "shutter_speed": rand.choice(SHUTTER_SPEEDS),
+            "iso": rand.choice(ISOS),
+            "dimensions": rand.choice(["6000 × 4000", "4032 × 3024", "--"]),
+            "sponsored": i in sponsored
+        })
+    return photos
+
+
+# number of photos the landing page loads at a time
+PAGE_SIZE = 30
+
+# loads the next page of photos whenever the page is scrolled to the bottom, like unsplash's infinite scroll
+SCROLL_JS = """
+var loading = false;
+var offset = %d;
+window.addEventListener('scroll', function () {
+    if (loading || window.innerHeight + window.scrollY < document.body.scrollHeight - 200) {
+        return;
+    }
+    loading = true;
+    fetch('/feed?offset=' + offset).then(function (response) {
+        return response.text();
+    }).then(function (html) {
+        document.getElementById('grid').insertAdjacentHTML('beforeend', html);
+        offset += %d;
+        loading = false;
+    });
+});
+"""
+
+
+# figures for photos[offset:offset + PAGE_SIZE], each linked through an itemprop='contentUrl' anchor and
+# linking to its photographer
+def feed(photos, offset):
+    figures = ""
+    for photo in photos[offset:offset + PAGE_SIZE]:
+        figures += ('<figure style="height: 200px"><a itemprop="contentUrl" href="/photos/' + photo["id"] +
+                    '" title="' + photo["title"] + '">' + photo["title"] + '</a><a href="/@' + photo["photographer"] +
+                    '">' + photo["photographer"] + '</a>' + ('<span>Sponsored</span>' if photo["sponsored"] else '') +
+                    '</figure>\n')
+    return figures
+
+
+# landing page with the first page of photos, more are added as it is scrolled
+def landing_page(photos):
+    return ("<html><head><title>Unsplash Stand-in</title></head><body>\n<div id=\"grid\">\n" + feed(photos, 0) +
+            "</div>\n<script>" + SCROLL_JS % (PAGE_SIZE, PAGE_SIZE) + "</script>\n</body></html>")
+
+
+# photo page laid out like a real unsplash photo page, the Info dialog is hidden until the button is clicked
+def photo_page(photo):
+    html = "<html><head><title>" + photo["title"] + "</title></head><body>\n"
+    # the avatar and hire links come before the name like they do on unsplash, only the name is the photographer
+    html += '<a href="/@' + photo["photographer"] + '"><img role="presentation" src="/images/avatar.jpg"></a>\n'
+    html += '<a href="/@' + photo["photographer"] + '/hire">Available for hire</a>\n'
+    html += '<a href="/@' + photo["photographer"] + '">' + photo["photographer"] + '</a>\n'
+    html += '<img itemprop="thumbnailUrl" src="/images/' + photo["id"] + '-thumb.jpg">\n'
+    html += '<img src="/images/' + photo["id"] + '.jpg?ixlib=rb-1.2.1&auto=format&fit=crop&w=1000&q=80">\n'
+    if photo["location"] is not None:
+        html += '<a href="/s/photos/' + photo["location"].split(",")[0].lower() + '"><span>' + \
+                photo["location"] + '</span></a>\n'
+    if photo["summary"] is not None:
+        html += '<p>' + photo["summary"] + '</p>\n'
+    html += '<p>Related collections</p>\n'
+    html += ('<button onclick="document.getElementById(\'info\').style.display=\'block\'">'
+             '<span>Info</span></button>\n')
+    html += '<div id="info" style="display:none"><dl>\n'
+    html += '<div><dt><span>Views</span></dt><dd><span>' + format(photo["views"], ",") + '</span></dd></div>\n'
+    html += '<div><dt><span>Downloads</span></dt><dd><span>' + format(photo["downloads"], ",") + \
+            '</span></dd></div>\n'
+    for label, key in [("Camera Make", "camera_make"), ("Camera Model", "camera_model"),
+                       ("Focal Length", "focal_len"), ("Aperture", "aperture"),
+                       ("Shutter Speed", "shutter_speed"), ("ISO", "iso"), ("Dimensions", "dimensions")]:
+        html += '<div><dt>' + label + '</dt><dd>' + photo[key] + '</dd></div>\n'
+    html += "</dl></div>\n</body></html>"
+    return html
+
+
+# request handler for the stand-in, the server it is attached to holds the photos and the simulated latency
+class StandInHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        query = parse_qs(urlparse(self.path).query)
+        if path == "/":
+            self.send_html(landing_page(self.server.photos))
+        elif path == "/feed":
+            time.sleep(self.server.latency)
+            self.send_html(feed(self.server.photos, int(query.get("offset", ["0"])[0])))
+        elif path.startswith("/photos/") and path[len("/photos/"):] in self.server.by_id:
+            time.sleep(self.server.latency)
+            if self.server.fail():
+                self.send_error(503)
+            else:
+                self.send_html(photo_page(self.server.by_id[path[len("/photos/"):]]))
+        else:
+            self.send_error(404)
+
+    def send_html(self, html):
+        body = html.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # keeps benchmark output readable
+    def log_message(self, format, *args):
+        pass
+
+
+# local http server that pretends to be unsplash.com, runs on a background thread until stop is called
+# latency is added to every feed and photo page request, failure_rate is the share of photo page requests
+# that are answered with a 503 (the same seed fails the same requests)
+class StandInServer:
+    def __init__(self, photos, latency=0.0, port=0, failure_rate=0.0, seed=0):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), StandInHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.photos = photos
+        self.httpd.by_id = {photo["id"]: photo for photo in photos}
+        self.httpd.latency = latency
+        self.httpd.fail = Failures(failure_rate, seed)
+        self.base = "http://127.0.0.1:" + str(self.httpd.server_address[1]) + "/"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+# decides which requests the stand-in fails and counts them, safe to share between handler threads
+class Failures:
+    def __init__(self, rate, seed=0):
+        self.rate = rate
+        self.rand = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failed = 0
+
+    def __call__(self):
+        with self.lock:
+            self.requests += 1
+            if self.rate > 0 and self.rand.random() < self.rate:
+                self.failed += 1
+                return True
+            return False
+
+
+# peak resident memory of this process in MB
+def peak_rss_mb():
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes everywhere else
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+# runs a full crawl of the stand-in and returns the scraper along with rows/sec
+# output goes to a temp file so the real data/data.csv is never overwritten
+# the stand-in doesnt need protecting so crawls are not rate limited unless asked to be, and they never
+# touch the real crawl checkpoint
+def time_crawl(server, items, **options):
+    import UnsplashScrape
+
+    options.setdefault("rate", None)
+    options.setdefault("checkpoint", None)
+    options.setdefault("timings", None)
+
+    output = os.path.join(tempfile.gettempdir(), "unsplash_bench.csv")
+    start = time.perf_counter()
+    us = UnsplashScrape.UnsplashScrape(server.base, items, output=output, **options)
+    elapsed = time.perf_counter() - start
+    return us, items / elapsed
+
+
+# times a full crawl of the stand-in for each worker count and prints rows/sec
+# scaling should be close to linear as long as max_concurrent is left at the worker count
+def bench_workers(worker_counts=(1, 2, 4), items=40, latency=0.5):
+    server = StandInServer(make_photos(items), latency=latency).start()
+    results = {}
+    try:
+        for workers in worker_counts:
+            results[workers] = time_crawl(server, items, workers=workers)[1]
+            print(str(workers) + " worker(s): " + str(round(results[workers], 2)) + " rows/sec")
+    finally:
+        server.stop()
+
+    base_rate = results[worker_counts[0]]
+    for workers in worker_counts:
+        print(str(workers) + " worker(s) speedup: " + str(round(results[workers] / base_rate, 2)) + "x")
+    return results
+
+
+# times a full crawl of the stand-in with each extraction backend and prints rows/sec
+# the rows of both crawls are compared as well since the backends must agree, an AssertionError names the
+# columns they differ in
+def bench_backends(items=40, latency=0.1, workers=4):
+    server = StandInServer(make_photos(items), latency=latency).start()
+    results = {}
+    frames = {}
+    try:
+        for backend in ["browser", "http"]:
+            us, results[backend] = time_crawl(server, items, workers=workers, backend=backend)
+            frames[backend] = UnsplashScrapeStore.load_frame(us.output)
+            print(backend + " backend: " + str(round(results[backend], 2)) + " rows/sec")
+    finally:
+        server.stop()
+
+    # both backends read the same selectors, so any difference is a bug in one of them
+    differing = [column for column in frames["browser"].columns
+                 if not frames["browser"][column].equals(frames["http"].get(column))]
+    print("Rows identical: " + str(not differing))
+    if differing:
+        raise AssertionError("The browser and http backends gave different " + ", ".join(differing))
+    return results
+
+
+# times landing page discovery at several sizes and prints the cost of the first and last scrolls
+# the per scroll cost should stay flat as the page grows since only newly added nodes are looked at
+def bench_discovery(sizes=(100, 1000, 5000), latency=0.0):
+    import UnsplashScrape
+    import UnsplashScrapeEngine
+
+    server = StandInServer(make_photos(max(sizes)), latency=latency).start()
+    results = {}
+    driver = None
+    try:
+        driver = UnsplashScrape.new_driver()
+        for size in sizes:
+            driver.get(server.base)
+            start = time.perf_counter()
+            pages, scroll_times = UnsplashScrape.discover_pages(driver, size, UnsplashScrapeEngine.TokenBucket(None))
+            elapsed = time.perf_counter() - start
+            tail = scroll_times[-10:]
+            results[size] = {
+                "items": len(pages),
+                "seconds": elapsed,
+                "first_scroll_ms": 1000 * scroll_times[0] if scroll_times else 0.0,
+                "last_scrolls_ms": 1000 * sum(tail) / len(tail) if tail else 0.0
+            }
+            print(str(size) + " items: " + str(round(elapsed, 2)) + "s, first scroll " +
+                  str(round(results[size]["first_scroll_ms"], 1)) + "ms, last scrolls " +
+                  str(round(results[size]["last_scrolls_ms"], 1)) + "ms")
+    finally:
+        if driver is not None:
+            driver.quit()
+        server.stop()
+    return results
+
+
+# times collecting the fields of an already open photo page one element at a time against the single
+# injected extractor, and checks that both give the same row
+def bench_extraction(items=20, repeats=5):
+    import UnsplashScrape
+    import UnsplashScrapeExtract
+
+    server = StandInServer(make_photos(items)).start()
+    times = {"elements": [], "script": []}
+    same = True
+    driver = None
+    try:
+        driver = UnsplashScrape.new_driver()
+        for photo in server.httpd.photos:
+            driver.get(server.base + "photos/" + photo["id"])
+            UnsplashScrape.open_info(driver)
+            rows = {}
+            for name, collect in [("elements", UnsplashScrape.collect_raw_elements),
+                                  ("script", UnsplashScrape.collect_raw)]:
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    raw = collect(driver)
+                    times[name].append(time.perf_counter() - start)
+                rows[name] = UnsplashScrapeExtract.parse_info(raw)
+            same = same and rows["elements"] == rows["script"]
+    finally:
+        if driver is not None:
+            driver.quit()
+        server.stop()
+
+    results = {}
+    for name in times:
+        results[name] = 1000 * sum(times[name]) / len(times[name])
+        print(name + " extraction: " + str(round(results[name], 1)) + "ms per page")
+    print("Rows identical: " + str(same))
+    return results
+
+
+# times loading the dataset and measures its memory at several row counts, the current csv path against the
+# typed parquet and feather datasets, rows are sampled from the scraped csv in source
+def bench_storage(sizes=(1000, 100000, 1000000), source="data/data.csv"):
+    import pandas as pd
+
+    seed = pd.read_csv(source)
+    results = {}
+    for size in sizes:
+        frame = seed.sample(n=size, replace=True, random_state=0).reset_index(drop=True)
+        results[size] = {}
+        with tempfile.TemporaryDirectory() as folder:
+            paths = {name: os.path.join(folder, "data." + name) for name in ["csv", "parquet", "feather"]}
+            frame.to_csv(paths["csv"], index=False)
+            UnsplashScrapeStore.save_dataset(frame, paths["parquet"])
+            UnsplashScrapeStore.save_dataset(frame, paths["feather"])
+
+            for name, path in paths.items():
+                start = time.perf_counter()
+                if name == "csv":
+                    df = pd.read_csv(path)
+                else:
+                    df = UnsplashScrapeStore.load_dataset(path)
+                elapsed = time.perf_counter() - start
+                results[size][name] = {
+                    "seconds": elapsed,
+                    "memory_mb": df.memory_usage(deep=True).sum() / 1e6,
+                    "disk_mb": os.path.getsize(path) / 1e6
+                }
+                print(str(size) + " rows " + name + ": " + str(round(elapsed, 3)) + "s load, " +
+                      str(round(results[size][name]["memory_mb"], 1)) + "MB in memory, " +
+                      str(round(results[size][name]["disk_mb"], 1)) + "MB on disk")
+    return results
+
+
+# builds a synthetic dataset of `rows` photos spread over `makes` camera makes of `models` models each, in the
+# typed dataset layout. generated with numpy so millions of rows only take a moment
+def make_dataset(rows, makes=20, models=5, photographers=500, seed=0):
+    import numpy as np
+    import pandas as pd
+
+    rand = np.random.default_rng(seed)
+    make = rand.integers(0, makes, rows)
+    model = rand.integers(0, models, rows)
+    frame = pd.DataFrame({
+        "img_page": pd.Series(np.arange(rows)).map("https://unsplash.com/photos/photo{}".format),
+        "photographer": pd.Categorical.from_codes(rand.integers(0, photographers, rows),
+                                                  ["user" + str(i) for i in range(photographers)]),
+        "views": rand.integers(1000, 10000000, rows),
+        "downloads": rand.integers(10, 100000, rows),
+        "camera_make": pd.Categorical.from_codes(make, ["Make " + str(i) for i in range(makes)]),
+        "camera_model": pd.Categorical.from_codes(make * models + model, ["Model " + str(i) + "-" + str(j)
+                                                                          for i in range(makes)
+                                                                          for j in range(models)]),
+        "focal_len": rand.choice([24.0, 35.0, 50.0, 85.0], rows),
+        "aperture": rand.choice([1.4, 2.8, 4.0, 8.0], rows),
+        "shutter_speed": rand.choice([1 / 15, 1 / 125, 1 / 1000, 2.0], rows),
+        "iso": rand.choice([100, 400, 800, 2000], rows),
+        "img_width": rand.choice([6000, 4032], rows),
+        "img_height": rand.choice([4000, 3024], rows),
+        "count": np.ones(rows, dtype="int64")
+    })
+    return UnsplashScrapeStore.typed_frame(frame)
+
+
+# renders the per make charts of a synthetic dataset into a temp folder, run in a fresh process so the
+# peak rss belongs to this run alone
+def render_run(makes, workers):
+    import resource
+    import UnsplashScrapeAnalysis
+    import UnsplashScrapeVisualizer
+
+    results = UnsplashScrapeAnalysis.aggregate(make_dataset(100 * makes, makes=makes))
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder)
+        os.mkdir("data")
+        try:
+            start = time.perf_counter()
+            UnsplashScrapeVisualizer.avg_make_model(results, workers=workers)
+            elapsed = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+    return {
+        "seconds": elapsed,
+        "peak_rss_mb": peak_rss_mb(),
+        "worker_peak_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    }
+
+
+# times drawing the per make charts at several numbers of makes, serially and with a pool of processes,
+# and reports the peak rss of the main process and of the largest worker
+def bench_render(makes=(10, 100, 500), worker_counts=(1, 4)):
+    from concurrent.futures import ProcessPoolExecutor
+
+    results = {}
+    for count in makes:
+        results[count] = {}
+        for workers in worker_counts:
+            with ProcessPoolExecutor(max_workers=1) as runner:
+                run = runner.submit(render_run, count, workers).result()
+            results[count][workers] = run
+            print(str(count) + " makes, " + str(workers) + " worker(s): " + str(round(run["seconds"], 2)) + "s, " +
+                  "peak rss " + str(round(run["peak_rss_mb"], 1)) + "MB, worker peak rss " +
+                  str(round(run["worker_peak_rss_mb"], 1)) + "MB")
+    return results
+
+
+# runs one crawl of the stand-in at base in a fresh process and summarizes it
+# only plain values come back so the result can be sent between processes
+def crawl_run(base, items, options):
+    import UnsplashScrape
+
+    options = dict(options, rate=None, checkpoint=None, timings=None)
+    output = os.path.join(tempfile.gettempdir(), "unsplash_bench_" + str(os.getpid()) + ".csv")
+    start = time.perf_counter()
+    us = UnsplashScrape.UnsplashScrape(base, items, output=output, **options)
+    elapsed = time.perf_counter() - start
+    rows = sum(1 for _ in UnsplashScrapeStore.iter_rows(output))
+    os.remove(output)
+
+    page = us.timer.summary().get("page", {})
+    return {
+        "items": rows,
+        "seconds": elapsed,
+        "items_per_sec": rows / elapsed,
+        "page_p50_ms": 1000 * page.get("p50", 0.0),
+        "page_p95_ms": 1000 * page.get("p95", 0.0),
+        "page_p99_ms": 1000 * page.get("p99", 0.0),
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+# crawls the stand-in with each backend under the given latency and failure rate and reports items/sec,
+# per page latency percentiles and the crawler's peak memory (the browser's own processes are not included)
+def bench_crawl(items=100, latency=0.2, failure_rate=0.05, workers=4, backends=("browser", "http")):
+    from concurrent.futures import ProcessPoolExecutor
+
+    server = StandInServer(make_photos(items), latency=latency, failure_rate=failure_rate).start()
+    results = {}
+    try:
+        for backend in backends:
+            with ProcessPoolExecutor(max_workers=1) as runner:
+                run = runner.submit(crawl_run, server.base, items, {"backend": backend, "workers": workers,
+                                                                    "max_concurrent": workers}).result()
+            results[backend] = run
+            print(backend + " backend: " + str(round(run["items_per_sec"], 2)) + " items/sec, page p50 " +
+                  str(round(run["page_p50_ms"], 1)) + "ms p95 " + str(round(run["page_p95_ms"], 1)) + "ms p99 " +
+                  str(round(run["page_p99_ms"], 1)) + "ms, peak rss " + str(round(run["peak_rss_mb"], 1)) + "MB")
+        results["failed_requests"] = server.httpd.fail.failed
+    finally:
+        server.stop()
+    return results
+
+
+# times the visualizer's aggregation and charts on synthetic datasets of several sizes
+# every size runs in a fresh process so its peak rss is its own
+def bench_visualizer(sizes=(10000, 100000, 1000000)):
+    from concurrent.futures import ProcessPoolExecutor
+
+    results = {}
+    for size in sizes:
+        with ProcessPoolExecutor(max_workers=1) as runner:
+            results[size] = runner.submit(visualizer_run, size).result()
+        print(str(size) + " rows: " + ", ".join(step + " " + str(round(seconds, 3)) + "s"
+                                                for step, seconds in results[size]["seconds"].items()) +
+              ", peak rss " + str(round(results[size]["peak_rss_mb"], 1)) + "MB")
+    return results
+
+
+# aggregates and charts a synthetic dataset of `rows` photos in a temp folder
+def visualizer_run(rows):
+    import UnsplashScrapeAnalysis
+    import UnsplashScrapeVisualizer
+
+    seconds = {}
+    df = make_dataset(rows)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder)
+        os.mkdir("data")
+        try:
+            start = time.perf_counter()
+            results = UnsplashScrapeAnalysis.aggregate(df)
+            seconds["aggregate"] = time.perf_counter() - start
+            for name, draw in [("top_photographer", UnsplashScrapeVisualizer.top_photographer),
+                               ("avg_make_model", UnsplashScrapeVisualizer.avg_make_model),
+                               ("most_used_qual", UnsplashScrapeVisualizer.most_used_qual),
+                               ("perfect_camera", UnsplashScrapeAnalysis.Aggregates.perfect_camera)]:
+                start = time.perf_counter()
+                draw(results)
+                seconds[name] = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+    return {"seconds": seconds, "peak_rss_mb": peak_rss_mb()}
+
+
+# aggregates a synthetic csv dataset of several sizes all at once and in chunks of chunksize rows, every run in
+# a fresh process so its peak rss is its own, and checks that both give the same aggregates
+def bench_chunked(sizes=(100000, 1000000), chunksize=100000):
+    from concurrent.futures import ProcessPoolExecutor
+
+    results = {}
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "data.csv")
+            with ProcessPoolExecutor(max_workers=1) as runner:
+                runner.submit(write_dataset, size, path).result()
+            runs = {}
+            for name, rows in [("in_memory", 0), ("chunked", chunksize)]:
+                with ProcessPoolExecutor(max_workers=1) as runner:
+                    runs[name] = runner.submit(chunked_run, path, rows).result()
+        results[size] = {name: {"seconds": run["seconds"], "peak_rss_mb": run["peak_rss_mb"]}
+                         for name, run in runs.items()}
+        results[size]["identical"] = runs["in_memory"]["digest"] == runs["chunked"]["digest"]
+        print(str(size) + " rows: " + ", ".join(name + " " + str(round(run["seconds"], 2)) + "s peak rss " +
+                                                str(round(run["peak_rss_mb"], 1)) + "MB" for name, run in runs.items()) +
+              (", identical" if results[size]["identical"] else ", RESULTS DIFFER"))
+    return results
+
+
+# saves a synthetic dataset of `rows` photos as csv
+def write_dataset(rows, path):
+    make_dataset(rows).to_csv(path, index=False)
+
+
+# aggregates the dataset at path in chunks of chunksize rows (0 for all at once) without the typed cache and
+# returns the time taken, the peak rss and a digest of every aggregate
+def chunked_run(path, chunksize):
+    import UnsplashScrapeAnalysis
+
+    start = time.perf_counter()
+    if chunksize == 0:
+        results = UnsplashScrapeAnalysis.aggregate(UnsplashScrapeStore.load_dataset(path, cache=False))
+    else:
+        results = UnsplashScrapeAnalysis.aggregate_chunks(UnsplashScrapeStore.iter_chunks(path, chunksize,
+                                                                                         cache=False))
+    elapsed = time.perf_counter() - start
+    digest = [results.digest(part) for part in ["photographers", "make_model", "settings"]] + [results.most_viewed]
+    return {"seconds": elapsed, "peak_rss_mb": peak_rss_mb(), "digest": digest}
+
+
+# raw strings of the fixture photos as a crawl keeps them, formatted the way the photo pages show them
+def make_raw(rows):
+    raws = []
+    for i, photo in enumerate(make_photos(rows)):
+        raws.append({
+            "img_page": "https://unsplash.com/photos/" + photo["id"], "img_hvr_txt": photo["title"],
+            "photographer": "/@" + photo["photographer"], "img_url": "https://images.unsplash.com/" + photo["id"],
+            "location": photo["location"], "summary": photo["summary"], "views": format(photo["views"], ","),
+            "downloads": format(photo["downloads"], ","), "camera_make": photo["camera_make"],
+            "camera_model": photo["camera_model"], "focal_len": photo["focal_len"], "aperture": photo["aperture"],
+            "shutter_speed": photo["shutter_speed"], "iso": photo["iso"], "img_resolution": photo["dimensions"],
+            "fallbacks": ["views"] if i % 100 == 0 else []
+        })
+    return raws
+
+
+# parses the same raw strings one row at a time with parse_info, the way a crawl does, and a whole column at
+# a time with UnsplashScrapeNormalize, and checks that both give the same rows
+def bench_normalize(sizes=(10000, 100000, 1000000)):
+    import pandas as pd
+    import UnsplashScrapeExtract
+    import UnsplashScrapeNormalize
+
+    results = {}
+    for size in sizes:
+        raws = make_raw(size)
+        frame = pd.DataFrame.from_records(raws, columns=UnsplashScrapeStore.RAW_COLUMNS)
+
+        start = time.perf_counter()
+        by_row = [UnsplashScrapeStore.PhotoRow(img_page=raw["img_page"], img_hvr_txt=raw["img_hvr_txt"],
+                                               **UnsplashScrapeExtract.parse_info(raw)).as_list() for raw in raws]
+        row_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        normalized = UnsplashScrapeNormalize.normalize_frame(frame)
+        column_seconds = time.perf_counter() - start
+
+        by_column = [row.as_list() for row in UnsplashScrapeStore.frame_rows(normalized)]
+        results[size] = {"by_row_seconds": row_seconds, "by_column_seconds": column_seconds,
+                         "rows_per_sec": size / column_seconds, "identical": by_row == by_column}
+        print(str(size) + " rows: by row " + str(round(row_seconds, 3)) + "s, by column " +
+              str(round(column_seconds, 3)) + "s" + (", identical" if by_row == by_column else ", ROWS DIFFER"))
+    return results
+
+
+# synthetic metrics history, `rows` observations of `photos` photos taken once a day starting at day first
+def make_history(rows, photos, first=0, seed=0):
+    rand = random.Random(seed)
+    start = datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc)
+    history = []
+    for i in range(rows):
+        day = first + i // photos
+        history.append({
+            "img_page": "photo" + str(i % photos),
+            "seen_at": (start + datetime.timedelta(days=day)).isoformat(timespec="seconds"),
+            "photographer": "user" + str(i % photos % 5000),
+            "camera_make": CAMERAS[i % photos % len(CAMERAS)][0],
+            "camera_model": CAMERAS[i % photos % len(CAMERAS)][1],
+            "views": 1000 * (day + 1) + rand.randrange(1000),
+            "downloads": 10 * (day + 1) + rand.randrange(10)
+        })
+    return history
+
+
+# builds the analytics index from synthetic histories of several sizes and times the initial build, appending
+# one more day of observations and the ranking and trending queries
+def bench_index(sizes=(100000, 1000000), photos=50000, repeats=20):
+    import UnsplashScrapeIndex
+
+    results = {}
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as folder:
+            with UnsplashScrapeIndex.AnalyticsIndex(os.path.join(folder, "index.db")) as index:
+                history = make_history(size, photos)
+                start = time.perf_counter()
+                index.observe(history)
+                build = time.perf_counter() - start
+
+                day = make_history(photos, photos, first=size // photos + 1, seed=1)
+                start = time.perf_counter()
+                index.observe(day)
+                append = time.perf_counter() - start
+
+                queries = {}
+                for name, query in [("top_photographers", index.top_photographers), ("top_cameras", index.top_cameras),
+                                    ("trending", index.trending)]:
+                    start = time.perf_counter()
+                    for _ in range(repeats):
+                        query(10)
+                    queries[name + "_ms"] = 1000 * (time.perf_counter() - start) / repeats
+
+        results[size] = dict({"build_seconds": build, "append_day_seconds": append}, **queries)
+        print(str(size) + " rows: build " + str(round(build, 2)) + "s, append a day of " + str(photos) + " photos " +
+              str(round(append, 2)) + "s, " + ", ".join(name + " " + str(round(ms, 2)) + "ms"
+                                                      for name, ms in queries.items()))
+    return results
+
+
+# imports every entry point in IMPORT_BUDGETS in a fresh interpreter, repeats times, and checks the fastest
+# import against its budget and that no heavy dependency was loaded
+def bench_imports(budgets=None, repeats=5):
+    budgets = budgets if budgets is not None else IMPORT_BUDGETS
+    folder = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for module, budget in budgets.items():
+        script = IMPORT_SCRIPT.format(module=module, heavy=HEAVY_MODULES)
+        runs = [json.loads(subprocess.run([sys.executable, "-c", script], cwd=folder, capture_output=True, text=True,
+                                          check=True).stdout) for _ in range(repeats)]
+        seconds = min(run["seconds"] for run in runs)
+        heavy = runs[0]["heavy"]
+        results[module] = {"seconds": seconds, "budget": budget, "heavy": heavy,
+                           "within_budget": seconds <= budget and not heavy}
+        print(module + ": " + str(round(1000 * seconds, 1)) + "ms (budget " + str(round(1000 * budget)) + "ms)" +
+              ("" if not heavy else ", imports " + ", ".join(heavy)) +
+              ("" if results[module]["within_budget"] else " OVER BUDGET"))
+    return results
+
+
+# entry points of a suite run that broke their import budget
+def over_budget(results):
+    imports = results["benchmarks"].get("imports", {})
+    return [module for module, run in imports.items() if not run["within_budget"]]
+
+
+# runs every benchmark and saves the results to path as JSON along with where and when they were taken
+# quick shrinks every benchmark so the whole suite finishes in a few minutes
+def run_suite(path="data/bench.json", quick=False):
+    if quick:
+        benches = {
+            "imports": bench_imports,
+            "crawl": lambda: bench_crawl(items=30, latency=0.05),
+            "storage": lambda: bench_storage(sizes=(1000, 100000)),
+            "render": lambda: bench_render(makes=(10, 50)),
+            "visualizer": lambda: bench_visualizer(sizes=(10000, 100000)),
+            "chunked": lambda: bench_chunked(sizes=(100000,), chunksize=10000),
+            "normalize": lambda: bench_normalize(sizes=(10000, 100000)),
+            "index": lambda: bench_index(sizes=(100000,))
+        }
+    else:
+        benches = {
+            "imports": bench_imports,
+            "workers": bench_workers,
+            "backends": bench_backends,
+            "crawl": bench_crawl,
+            "discovery": bench_discovery,
+            "extraction": bench_extraction,
+            "storage": bench_storage,
+            "render": bench_render,
+            "visualizer": bench_visualizer,
+            "chunked": bench_chunked,
+            "normalize": bench_normalize,
+            "index": bench_index
+        }
+
+    results = {
+        "taken_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "benchmarks": {}
+    }
+    for name, bench in benches.items():
+        print("\n" + name)
+        results["benchmarks"][name] = bench()
+
+    if path is not None:
+        with open(path, "w") as file:
+            json.dump(results, file, indent=2)
+    return results
+
+
+# every number in a nested result, keyed by its path e.g. "crawl/http/items_per_sec"
+def flatten(results, prefix=""):
+    values = {}
+    for key, val in results.items():
+        if isinstance(val, dict):
+            values.update(flatten(val, prefix + str(key) + "/"))
+        elif isinstance(val, (int, float)) and not isinstance(val, bool):
+            values[prefix + str(key)] = val
+    return values
+
+
+# compares two saved suite runs and prints every number that got worse by more than tolerance (10% by default)
+# rates (per_sec) are worse when they drop, everything else (times, latencies, memory) when it grows
+def compare(old_path, new_path, tolerance=0.1):
+    with open(old_path) as file:
+        old = flatten(json.load(file)["benchmarks"])
+    with open(new_path) as file:
+        new = flatten(json.load(file)["benchmarks"])
+
+    regressions = {}
+    for key in sorted(set(old) & set(new)):
+        # counts describe the run rather than its speed
+        if old[key] == 0 or key.split("/")[-1] in ["items", "failed_requests"]:
+            continue
+        change = (new[key] - old[key]) / abs(old[key])
+        if key.endswith("per_sec"):
+            change = -change
+        if change > tolerance:
+            regressions[key] = change
+            print(key + ": " + str(round(old[key], 3)) + " -> " + str(round(new[key], 3)) +
+                  " (" + str(round(100 * change, 1)) + "% worse)")
+    if not regressions:
+        print("No regressions over " + str(round(100 * tolerance)) + "%")
+    return regressions
+
+
+# python UnsplashScrapeBench.py runs the whole suite, --quick runs a smaller version of it and
+# --compare old.json new.json compares two saved runs
+# the suite exits with status 1 when an entry point broke its import budget
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--compare":
+        compare(sys.argv[2], sys.argv[3])
+    else:
+        over = over_budget(run_suite(quick="--quick" in sys.argv))
+        if over:
+            print("Over import budget: " + ", ".join(over))
+            sys.exit(1)
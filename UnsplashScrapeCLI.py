@@ -0,0 +1,356 @@
+"""
+UNSPLASH SCRAPE COMMAND LINE
+
+Non-interactive entry point for scheduled (e.g. cron) runs, nothing here ever waits for input. Every part of
+the program is a subcommand:
+ - crawl - scrape photos from the landing page into an output file
+ - normalize - parse the raw strings kept by a crawl into an output file again
+ - refresh - re-fetch the views and downloads of the photos already scraped
+ - analyze - print (or write as JSON) the top photographers, the perfect camera and the most viewed photo
+ - index - update the analytics index of every crawl and refresh and print the rankings and trending photos
+ - render - draw the charts to data/*.png
+ - download - download the images of the scraped photos
+ - coordinate / work - the two halves of a distributed crawl
+
+e.g. python UnsplashScrapeCLI.py crawl --count 500 --backend http --output data/data.parquet
+
+The exit status is 0 when the command finished, 2 when the options are invalid, and 1 (with the traceback)
+when the command failed.
+"""
+
+# necessary imports
+import os
+import sys
+import json
+import argparse
+
+# output formats and the extension of each, the format of a file is always picked by its extension
+FORMATS = {"csv": ".csv", "jsonl": ".jsonl", "parquet": ".parquet", "arrow": ".arrow"}
+
+# checkpoint of crawls into a csv or jsonl output unless --checkpoint names another one
+CHECKPOINT = "data/checkpoint.db"
+
+# charts render can draw, in menu order
+CHART_NAMES = ["top_photographer", "avg_make_model", "most_used_qual"]
+
+
+# raised for options that cannot be used together, reported like any other argparse error
+class OptionError(Exception):
+    pass
+
+
+# requests per second from the command line, 0 or less turns the limit off
+def rate_limit(rate):
+    return rate if rate > 0 else None
+
+
+# output path from --output and --format, the default output is data/data with the format's extension
+def output_path(output, file_format):
+    if output is None:
+        return "data/data" + FORMATS[file_format or "csv"]
+    ext = os.path.splitext(output)[1].lower()
+    if file_format is not None and FORMATS[file_format] != ext and not (file_format == "arrow" and ext == ".feather"):
+        raise OptionError("--format " + file_format + " does not match the extension of " + output)
+    if ext not in FORMATS.values() and ext != ".feather":
+        raise OptionError("Unsupported output format: " + output)
+    return output
+
+
+# checkpoint of a crawl into output, an interrupted crawl is resumed by appending to its output so outputs that
+# cannot be appended to (parquet, arrow) are crawled without one unless --checkpoint asks for it
+def checkpoint_path(args, output):
+    import UnsplashScrapeStore
+
+    if args.no_checkpoint:
+        return None
+    if UnsplashScrapeStore.can_append(output):
+        return args.checkpoint or CHECKPOINT
+    if args.checkpoint is not None:
+        raise OptionError("--checkpoint needs a csv or jsonl output (pass --no-checkpoint to turn resuming off)")
+    print("Resuming is turned off for " + output + ", only csv and jsonl outputs can be resumed.")
+    return None
+
+
+def crawl(args):
+    import UnsplashScrape
+
+    output = output_path(args.output, args.format)
+    us = UnsplashScrape.UnsplashScrape(args.site, args.count, workers=args.workers,
+                                       max_concurrent=args.max_concurrent,
+                                       output=output, backend=args.backend,
+                                       rate=rate_limit(args.rate), attempts=args.attempts, append=args.append,
+                                       checkpoint=checkpoint_path(args, output),
+                                       seen=args.seen, exclude=args.exclude, skip_sponsored=not args.keep_sponsored,
+                                       timings=args.timings, metrics_port=args.metrics_port, events=args.events,
+                                       recycle_after=args.recycle_after, raw=args.raw, run=False)
+    if not us.check_input:
+        raise OptionError(us.error)
+    us.run()
+
+
+def normalize(args):
+    import UnsplashScrapeNormalize
+
+    if args.chunksize < 1:
+        raise OptionError("--chunksize must be at least 1")
+    if not args.raw.lower().endswith(".jsonl"):
+        raise OptionError("Raw strings are kept in a .jsonl file: " + args.raw)
+    UnsplashScrapeNormalize.normalize_file(args.raw, output_path(args.output, args.format), args.chunksize)
+
+
+def refresh(args):
+    import UnsplashScrape
+
+    UnsplashScrape.refresh(args.site, data=args.data, history=args.history, new_pages=args.new_pages,
+                           rate=rate_limit(args.rate), max_concurrent=args.max_concurrent, attempts=args.attempts,
+                           index=None if args.no_index else args.index, backend=args.backend, workers=args.workers,
+                           seen=args.seen, exclude=args.exclude, skip_sponsored=not args.keep_sponsored)
+
+
+# aggregates of the dataset, through the visualizer's cache unless it is turned off
+# chunksize is the number of rows read at a time, 0 loads the whole dataset and None decides by its size
+def load_aggregates(data, use_cache, chunksize=None):
+    import UnsplashScrapeAnalysis
+
+    if chunksize is not None and chunksize < 0:
+        raise OptionError("--chunksize must be 0 or more")
+    if use_cache:
+        cache = UnsplashScrapeAnalysis.AggregateCache(chunksize=chunksize)
+        return cache, cache.aggregates(data)
+    return None, UnsplashScrapeAnalysis.aggregate_file(data, chunksize)
+
+
+# writes a summary as JSON to path, - for stdout
+def write_json(summary, path):
+    text = json.dumps(summary, indent=2, ensure_ascii=False)
+    if path == "-":
+        print(text)
+    else:
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+
+
+def analyze(args):
+    results = load_aggregates(args.data, not args.no_cache, args.chunksize)[1]
+    summary = results.summary(args.top, args.exclude)
+
+    if args.json is not None:
+        write_json(summary, args.json)
+        return
+
+    print(str(summary["photos"]) + " photo(s) in " + args.data)
+    print("\nTop " + str(args.top) + " photographers by views")
+    for rank, row in enumerate(summary["photographers"], start=1):
+        print(str(rank).rjust(3) + ". " + str(row["photographer"]).ljust(30) + str(row["views"]).rjust(14))
+    print("\nPerfect camera")
+    for key, value in summary["perfect_camera"].items():
+        print("  " + key.ljust(14) + str(value))
+    print("\nMost viewed photo: " + str(summary["most_viewed"]))
+
+
+def index(args):
+    import UnsplashScrapeIndex
+
+    with UnsplashScrapeIndex.AnalyticsIndex(args.index) as analytics:
+        added = analytics.update(args.data, args.history)
+        summary = {
+            "counts": analytics.counts(),
+            "photographers": analytics.top_photographers(args.top, args.exclude),
+            "cameras": analytics.top_cameras(args.top),
+            "trending": analytics.trending(args.top, args.by, args.exclude)
+        }
+
+    if args.json is not None:
+        write_json(summary, args.json)
+        return
+
+    print(str(added) + " new row(s) indexed, " + str(summary["counts"]["photos"]) + " photo(s) in " + args.index)
+    print("\nTop " + str(args.top) + " photographers by views")
+    for rank, row in enumerate(summary["photographers"], start=1):
+        print(str(rank).rjust(3) + ". " + str(row["photographer"]).ljust(30) + str(row["views"]).rjust(14))
+    print("\nTop " + str(args.top) + " cameras by views")
+    for rank, row in enumerate(summary["cameras"], start=1):
+        print(str(rank).rjust(3) + ". " + (row["camera_make"] + " " + row["camera_model"]).ljust(30) +
+              str(row["views"]).rjust(14))
+    print("\nTrending photos by " + args.by + " per day")
+    for rank, row in enumerate(summary["trending"], start=1):
+        print(str(rank).rjust(3) + ". " + row["img_page"].ljust(60) + str(round(row["per_day"])).rjust(10))
+
+
+def render(args):
+    import UnsplashScrapeVisualizer
+
+    cache, results = load_aggregates(args.data, not args.no_cache, args.chunksize)
+    os.makedirs("data", exist_ok=True)
+    for name in args.chart or CHART_NAMES:
+        if cache is not None:
+            UnsplashScrapeVisualizer.show_chart(cache, results, name)
+        else:
+            print("Saved: " + ", ".join(UnsplashScrapeVisualizer.CHARTS[name][2](results, None)))
+
+
+def download(args):
+    import UnsplashScrapeImages
+
+    UnsplashScrapeImages.download_dataset(args.data, args.folder, width=args.width, quality=args.quality,
+                                          max_concurrent=args.max_concurrent, rate=rate_limit(args.rate),
+                                          bandwidth=args.bandwidth, max_bytes=args.max_bytes)
+
+
+def coordinate(args):
+    import UnsplashScrape
+
+    UnsplashScrape.coordinate(args.site, args.count, queue=args.queue, output=output_path(args.output, args.format),
+                              rate=rate_limit(args.rate), lease=args.lease, attempts=args.attempts, seen=args.seen,
+                              exclude=args.exclude, skip_sponsored=not args.keep_sponsored)
+
+
+def work(args):
+    import UnsplashScrape
+
+    UnsplashScrape.work(queue=args.queue, worker=args.worker, backend=args.backend, rate=rate_limit(args.rate),
+                        attempts=args.attempts, batch=args.batch, recycle_after=args.recycle_after, idle=args.idle,
+                        metrics_port=args.metrics_port, events=args.events)
+
+
+# builds the parser of every subcommand, defaults are the same as the library's
+def build_parser():
+    parser = argparse.ArgumentParser(prog="UnsplashScrapeCLI.py",
+                                     description="Scrape, analyze and chart photos from unsplash.com.")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    commands.required = True
+
+    # options shared by the subcommands that crawl the landing page
+    site = argparse.ArgumentParser(add_help=False)
+    site.add_argument("--site", default="https://unsplash.com/", help="landing page to crawl")
+    site.add_argument("--seen", metavar="PATH", help="skip the photos recorded in PATH by earlier crawls and record "
+                                                     "the new ones (e.g. data/seen.db)")
+    site.add_argument("--exclude", action="append", metavar="ACCOUNT",
+                      help="skip the photos of ACCOUNT, repeatable (default data/excluded.txt or ballparkbrand)")
+    site.add_argument("--keep-sponsored", action="store_true", help="scrape sponsored photos as well")
+
+    # options shared by the subcommands that scrape photo pages
+    limits = argparse.ArgumentParser(add_help=False)
+    limits.add_argument("--rate", type=float, default=1.0, help="max requests per second, 0 for no limit")
+    limits.add_argument("--attempts", type=int, default=3, help="tries of a failing step before giving up")
+
+    # options of the subcommands that write rows
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument("--output", help="output file, the format is picked by its extension (default data/data.csv)")
+    output.add_argument("--format", choices=list(FORMATS), help="output format, sets the extension of the default "
+                                                                "output")
+
+    # options of the subcommands that scrape for a long time
+    telemetry = argparse.ArgumentParser(add_help=False)
+    telemetry.add_argument("--metrics-port", type=int, metavar="PORT",
+                           help="serve live metrics for Prometheus at http://127.0.0.1:PORT/metrics")
+    telemetry.add_argument("--events", metavar="PATH", help="append every page, failure, retry and skip to a JSONL "
+                                                            "log at PATH")
+
+    # options of the subcommands that read a dataset
+    dataset = argparse.ArgumentParser(add_help=False)
+    dataset.add_argument("--data", default="data/data.csv", help="dataset to read")
+
+    cmd = commands.add_parser("crawl", parents=[site, limits, output, telemetry],
+                              help="scrape photos into an output file")
+    cmd.add_argument("-n", "--count", type=int, default=100, help="number of photos to scrape")
+    cmd.add_argument("--workers", type=int, default=1, help="browser sessions visiting photo pages")
+    cmd.add_argument("--max-concurrent", type=int, help="cap on pages loading at once (requests per host for "
+                                                        "http, 4 by default)")
+    cmd.add_argument("--backend", choices=["browser", "http"], default="browser", help="how photo pages are read")
+    cmd.add_argument("--append", action="store_true", help="add to the output instead of replacing it")
+    cmd.add_argument("--checkpoint", help="checkpoint used to resume crawls (default " + CHECKPOINT + ", only "
+                                           "csv and jsonl outputs are resumed)")
+    cmd.add_argument("--no-checkpoint", action="store_true", help="do not resume or checkpoint the crawl")
+    cmd.add_argument("--timings", default="data/timings.json", help="where the step timings are written")
+    cmd.add_argument("--recycle-after", type=int, default=200, help="pages a browser loads before it is restarted")
+    cmd.add_argument("--raw", metavar="PATH", help="also keep the raw strings of every page in a .jsonl file, see "
+                                                   "normalize (e.g. data/data.raw.jsonl)")
+    cmd.set_defaults(run=crawl, parser=cmd)
+
+    cmd = commands.add_parser("normalize", parents=[output], help="parse the raw strings kept by a crawl again")
+    cmd.add_argument("--raw", default="data/data.raw.jsonl", help="raw strings kept by crawl --raw")
+    cmd.add_argument("--chunksize", type=int, default=100000, metavar="ROWS", help="rows parsed at a time")
+    cmd.set_defaults(run=normalize, parser=cmd)
+
+    cmd = commands.add_parser("refresh", parents=[site, limits, dataset], help="re-fetch views and downloads")
+    cmd.add_argument("--history", default="data/history.csv", help="where the metrics history is appended")
+    cmd.add_argument("--new-pages", type=int, default=0, help="also scrape this many photos from the landing page")
+    cmd.add_argument("--max-concurrent", type=int, default=4, help="requests in flight per host")
+    cmd.add_argument("--workers", type=int, default=1, help="browser sessions used for new photos")
+    cmd.add_argument("--backend", choices=["browser", "http"], default="browser", help="how new photos are read")
+    cmd.add_argument("--index", default="data/index.db", help="analytics index updated after the refresh")
+    cmd.add_argument("--no-index", action="store_true", help="do not update the analytics index")
+    cmd.set_defaults(run=refresh, parser=cmd)
+
+    # options of the subcommands that rank photographers
+    ranking = argparse.ArgumentParser(add_help=False)
+    ranking.add_argument("--top", type=int, default=10, help="number of entries listed")
+    ranking.add_argument("--exclude", action="append", metavar="ACCOUNT",
+                         help="account left out of the rankings, repeatable (default data/excluded.txt or "
+                              "ballparkbrand)")
+    ranking.add_argument("--json", metavar="PATH", help="write the summary as JSON to PATH (- for stdout)")
+
+    # options of the subcommands that aggregate a dataset
+    aggregation = argparse.ArgumentParser(add_help=False)
+    aggregation.add_argument("--no-cache", action="store_true", help="do not use or fill data/cache")
+    aggregation.add_argument("--chunksize", type=int, metavar="ROWS",
+                             help="aggregate the dataset ROWS rows at a time so it never has to fit in memory, 0 "
+                                  "loads it whole (default: whole up to 256 MB, in chunks above)")
+
+    cmd = commands.add_parser("analyze", parents=[dataset, ranking, aggregation], help="summarize a dataset")
+    cmd.set_defaults(run=analyze, parser=cmd)
+
+    cmd = commands.add_parser("index", parents=[dataset, ranking], help="update and query the analytics index")
+    cmd.add_argument("--history", default="data/history.csv", help="metrics history written by refresh")
+    cmd.add_argument("--index", default="data/index.db", help="analytics index")
+    cmd.add_argument("--by", choices=["views", "downloads"], default="views", help="what trending photos gain")
+    cmd.set_defaults(run=index, parser=cmd)
+
+    cmd = commands.add_parser("render", parents=[dataset, aggregation], help="draw the charts to data/*.png")
+    cmd.add_argument("--chart", action="append", choices=CHART_NAMES, help="chart to draw, repeatable (default all)")
+    cmd.set_defaults(run=render, parser=cmd)
+
+    cmd = commands.add_parser("download", parents=[dataset], help="download the images of a dataset")
+    cmd.add_argument("--folder", default="data/images", help="image cache folder")
+    cmd.add_argument("--width", type=int, help="width of the requested copies in pixels")
+    cmd.add_argument("--quality", type=int, help="quality of the requested copies (1-100)")
+    cmd.add_argument("--max-concurrent", type=int, default=4, help="downloads in flight")
+    cmd.add_argument("--rate", type=float, default=0, help="max requests per second, 0 for no limit")
+    cmd.add_argument("--bandwidth", type=int, help="max bytes per second")
+    cmd.add_argument("--max-bytes", type=int, default=2 * 1024 ** 3, help="size of the image cache")
+    cmd.set_defaults(run=download, parser=cmd)
+
+    cmd = commands.add_parser("coordinate", parents=[site, limits, output], help="publish a distributed crawl and collect it")
+    cmd.add_argument("-n", "--count", type=int, default=100, help="number of photos to scrape")
+    cmd.add_argument("--queue", default="data/queue.db", help="work queue shared with the workers")
+    cmd.add_argument("--lease", type=float, default=120.0, help="seconds a worker may hold a page")
+    cmd.set_defaults(run=coordinate, parser=cmd)
+
+    cmd = commands.add_parser("work", parents=[limits, telemetry], help="work on a distributed crawl")
+    cmd.add_argument("--queue", default="data/queue.db", help="work queue shared with the coordinator")
+    cmd.add_argument("--worker", help="name of this worker (default host:pid)")
+    cmd.add_argument("--backend", choices=["browser", "http"], default="browser", help="how photo pages are read")
+    cmd.add_argument("--batch", type=int, default=1, help="pages claimed at a time")
+    cmd.add_argument("--recycle-after", type=int, default=200, help="pages a browser loads before it is restarted")
+    cmd.add_argument("--idle", type=float, default=60.0, help="seconds to wait for work before exiting")
+    cmd.set_defaults(run=work, parser=cmd)
+
+    return parser
+
+
+# runs the command in argv (sys.argv by default) and returns the exit status
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        args.run(args)
+    except OptionError as e:
+        args.parser.print_usage(sys.stderr)
+        print(args.parser.prog + ": error: " + str(e), file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
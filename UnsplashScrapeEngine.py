@@ -0,0 +1,161 @@
+"""
+UNSPLASH SCRAPE CRAWL ENGINE
+
+Pacing and scheduling for the scraper. Instead of fixed sleeps every request takes a token from a
+token bucket so the crawl never goes faster than the configured rate, failed steps are retried with
+exponential backoff, and the asyncio crawler overlaps the network waits of many photo pages while
+capping how many requests go to a single host at once.
+
+Wall clock time of an http crawl is bounded by the rate limit rather than the sum of page latencies,
+while the site never sees more than `rate` requests a second (ethical crawling).
+"""
+
+# necessary imports
+import time
+import asyncio
+import threading
+import urllib.error
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+import UnsplashScrapeMetrics
+
+
+# token bucket rate limiter, shared between threads and coroutines
+# tokens refill at `rate` per second up to `burst`, every request takes one token (or `amount` tokens, e.g.
+# bytes when the bucket limits bandwidth), a rate of None disables limiting
+class TokenBucket:
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    # takes a token and returns how long the caller has to wait before it may use it
+    # the bucket is allowed to go negative so that waiting callers queue up in order
+    def reserve(self, amount=1):
+        if self.rate is None:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    # blocking version, used by the browser backend
+    def wait(self, amount=1):
+        delay = self.reserve(amount)
+        if delay > 0:
+            time.sleep(delay)
+
+    # asyncio version, used by the async crawler
+    async def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+# decides if a failed http request is worth retrying
+# server errors, rate limiting and network problems are, pages that dont exist are not
+def transient_error(e):
+    if isinstance(e, urllib.error.HTTPError):
+        return e.code >= 500 or e.code == 429
+    return isinstance(e, (urllib.error.URLError, TimeoutError, ConnectionError))
+
+
+# calls func until it succeeds, waiting backoff, 2 * backoff, 4 * backoff... seconds between attempts
+# on_retry(error, attempt) is called before every new attempt, e.g. to count retries
+def retry(func, attempts=3, backoff=1.0, exceptions=(Exception,), should_retry=None, on_retry=None):
+    for attempt in range(attempts):
+        try:
+            return func()
+        except exceptions as e:
+            if attempt == attempts - 1 or (should_retry is not None and not should_retry(e)):
+                raise
+            if on_retry is not None:
+                on_retry(e, attempt)
+            time.sleep(backoff * 2 ** attempt)
+
+
+# asyncio version of retry, func must return an awaitable
+async def retry_async(func, attempts=3, backoff=1.0, exceptions=(Exception,), should_retry=None, on_retry=None):
+    for attempt in range(attempts):
+        try:
+            return await func()
+        except exceptions as e:
+            if attempt == attempts - 1 or (should_retry is not None and not should_retry(e)):
+                raise
+            if on_retry is not None:
+                on_retry(e, attempt)
+            await asyncio.sleep(backoff * 2 ** attempt)
+
+
+# asyncio crawl engine
+# extract is a blocking function that turns a url into a result (e.g. HttpBackend.get_raw), it is run on a
+# thread pool so many pages can be waiting on the network at once
+# time spent waiting on the rate limiter is recorded in timer as rate-wait, and the whole of every page
+# (retries included) as page. the pages that are waiting for a host slot count towards the timer's queue_depth
+# a page that still fails after its attempts stops the crawl, unless on_error is given: on_error(pos, url, error)
+# is then called for it and the other pages carry on
+class AsyncCrawler:
+    def __init__(self, limiter, per_host=1, attempts=3, backoff=1.0, timer=None, on_error=None):
+        self.limiter = limiter
+        self.timer = timer if timer is not None else UnsplashScrapeMetrics.StepTimer()
+        self.per_host = per_host
+        self.attempts = attempts
+        self.backoff = backoff
+        self.on_error = on_error
+        self.hosts = {}
+
+    # semaphore capping the requests in flight to the host of url
+    def host_limit(self, url):
+        host = urlparse(url).netloc
+        if host not in self.hosts:
+            self.hosts[host] = asyncio.Semaphore(self.per_host)
+        return self.hosts[host]
+
+    # extracts a single page, waiting for a host slot and a token before every attempt
+    # the row is handed to emit as soon as it is ready when emit is given, otherwise it is returned
+    # a page given up on with on_error set is not emitted and returns None
+    async def fetch(self, pos, url, extract, executor, emit=None):
+        loop = asyncio.get_running_loop()
+
+        async def attempt():
+            start = time.perf_counter()
+            await self.limiter.acquire()
+            self.timer.observe("rate-wait", time.perf_counter() - start)
+            return await loop.run_in_executor(executor, extract, url)
+
+        async with self.host_limit(url):
+            self.timer.shift("queue_depth", -1)
+            print(str(pos + 1) + ". Collecting info from: " + url)
+            try:
+                with self.timer.page(url):
+                    row = await retry_async(attempt, self.attempts, self.backoff, should_retry=transient_error,
+                                            on_retry=lambda e, tried: self.timer.retried(url, e, tried))
+            except Exception as e:
+                if self.on_error is None:
+                    raise
+                self.on_error(pos, url, e)
+                return None
+
+        if emit is None:
+            return row
+        emit(pos, row)
+
+    # extracts every url and returns the rows in the same order as urls
+    # with emit every row is passed to emit(pos, row) as it finishes and nothing is kept
+    async def crawl_async(self, urls, extract, emit=None):
+        hosts = set(urlparse(url).netloc for url in urls)
+        self.timer.shift("queue_depth", len(urls))
+        with ThreadPoolExecutor(max_workers=max(1, len(hosts) * self.per_host)) as executor:
+            return await asyncio.gather(*[self.fetch(pos, url, extract, executor, emit)
+                                          for pos, url in enumerate(urls)])
+
+    # blocking entry point for code that isnt running an event loop
+    def crawl(self, urls, extract, emit=None):
+        self.hosts = {}
+        return asyncio.run(self.crawl_async(urls, extract, emit))
@@ -0,0 +1,551 @@
+"""
+UNSPLASH PHOTO PAGE EXTRACTION
+
+Extraction backends for the individual photo pages. Every backend only collects the raw strings found
+on the page (photographer link, image source, location, summary and the Info dialog's dt/dd pairs),
+the raw strings are then turned into a row by parse_info. Because every backend shares parse_info the
+browser and http backends give identical rows for the same page. Parsing never happens while a browser
+session is checked out, the crawl parses a page once its raw strings are handed to the writer, and raw
+strings kept by a crawl can be parsed again in bulk by UnsplashScrapeNormalize.
+
+Every field is declared once in FIELDS: the selectors that find its raw string, tried in order until one
+matches, the parser that turns the string into a value and the bounds the value is expected in. A field
+that cannot be found or parsed becomes None instead of stopping the crawl, and is counted in a FieldStats so
+markup changes show up in the report at the end of a crawl. A value outside its bounds is kept but counted
+as suspect, the report lists a few of the strings that were invalid or suspect.
+
+Backends:
+ - browser - the Selenium session in UnsplashScrape.get_page, driven by the selectors in FIELDS
+ - http - plain http requests parsed with the standard library html parser, no browser needed. the page is
+   built into a small tree the same selectors are evaluated on, covering the parts of CSS and XPath that
+   FIELDS uses
+
+Selenium is still used for the landing page since new photos are only loaded in by scrolling.
+"""
+
+# necessary imports
+import re
+import threading
+import urllib.request
+from urllib.parse import urljoin
+from html.parser import HTMLParser
+import UnsplashScrapeMetrics
+
+# labels in the Info dialog, in the order they are read
+INFO_LABELS = ["Views", "Downloads", "Camera Make", "Camera Model", "Focal Length", "Aperture",
+               "Shutter Speed", "ISO", "Dimensions"]
+
+# what can go wrong with a field, in the order they are reported
+OUTCOMES = ["missing", "invalid", "suspect", "fallback"]
+
+# invalid or suspect strings a FieldStats keeps of every field for the report
+SAMPLES = 5
+
+# labels whose value is wrapped in a span alongside other text, only the first span holds the value
+SPAN_LABELS = ["Views", "Downloads"]
+
+# headers sent with every http request, unsplash serves a stripped page to unknown clients
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:91.0) Gecko/20100101 Firefox/91.0",
+    "Accept": "text/html,application/xhtml+xml",
+    "Accept-Language": "en-US,en;q=0.5"
+}
+
+
+# links look like https://unsplash.com/@name or /@name depending on the backend
+def parse_photographer(href):
+    return href.split("/@")[-1]
+
+
+def parse_count(text):
+    return int(text.replace(",", ""))
+
+
+def parse_focal_len(text):
+    return float(text.replace("mm", ""))
+
+
+def parse_aperture(text):
+    return float(text.replace("ƒ/", "").replace("f/", ""))
+
+
+# create shutter speed as a float instead of fraction in string format
+def parse_shutter_speed(text):
+    text = text.replace("s", "")
+    if len(text.split("/")) == 2:
+        text = text.split("/")
+        return float(text[0]) / float(text[1])
+    return float(text)
+
+
+def parse_iso(text):
+    return int(text)
+
+
+def parse_dimensions(text):
+    return text.replace(" × ", ", ")
+
+
+# a field of a row, selectors are tried in order until one matches, each selector is a dict with
+#  - css or xpath - where to look, every match is checked in document order
+#  - read - "text" (default) for the element's text, anything else is read as a property or attribute
+#  - skip - values that are never taken, skip_containing - skip values containing any of these
+#  - skip_text - elements whose text is one of these are skipped, for values read from a property or attribute
+# parse turns the raw string into the value (None keeps the string), optional fields are often not on the
+# page so them missing is not counted as a failure, label is the field's label in the Info dialog and bounds
+# is the (low, high) range a parsed value is expected in, either end None for no limit
+class Field:
+    def __init__(self, name, selectors, parse=None, optional=False, label=None, bounds=None):
+        self.name = name
+        self.selectors = selectors
+        self.parse = parse
+        self.optional = optional
+        self.label = label
+        self.bounds = bounds
+
+    # whether a parsed value lies outside the field's bounds
+    def suspect(self, value):
+        if self.bounds is None:
+            return False
+        low, high = self.bounds
+        return (low is not None and value < low) or (high is not None and value > high)
+
+
+# selectors of the value of a label in the Info dialog
+# everything under the info tab is basically formatted the same, it has a title for what it is in the dt tag
+# so the value is in the dd next to it
+def info_selectors(label):
+    if label in SPAN_LABELS:
+        first = '//*[text()="' + label + '"]/../following-sibling::dd/span[1]'
+    else:
+        first = '//*[text()="' + label + '"]/following-sibling::dd'
+    return [{"xpath": first}, {"xpath": '//dt[normalize-space()="' + label + '"]/following-sibling::dd[1]'}]
+
+
+# text of the @ links that are not the photographer's name, the avatar has none
+PHOTOGRAPHER_SKIP_TEXT = ["", "Available for hire"]
+
+# every field of a row in the order they are collected
+FIELDS = [
+    # first @ link with a name, the avatar and "Available for hire" links lead to the profile as well
+    Field("photographer", [{"css": "a[href^='/@']", "read": "href", "skip_text": PHOTOGRAPHER_SKIP_TEXT},
+                           {"css": "[itemprop='author'] a[href*='/@']", "read": "href"}],
+          parse=parse_photographer),
+    # first img that isnt a thumbnail, tracking pixel or decorative
+    Field("img_url", [{"css": "img:not([itemprop='thumbnailUrl']):not([role]):not([src*='1pixel.gif'])",
+                       "read": "src"},
+                      {"css": "meta[property='og:image']", "read": "content"}]),
+    Field("location", [{"css": "a[href^='/s/photos'] > span"}, {"css": "a[href^='/s/photos']"}], optional=True),
+    # the only other <p> tags are ones leading to related content
+    Field("summary", [{"css": "p", "skip_containing": ["Related"]}], optional=True),
+    Field("views", info_selectors("Views"), parse=parse_count, label="Views", bounds=(0, None)),
+    Field("downloads", info_selectors("Downloads"), parse=parse_count, label="Downloads", bounds=(0, None)),
+    Field("camera_make", info_selectors("Camera Make"), label="Camera Make"),
+    Field("camera_model", info_selectors("Camera Model"), label="Camera Model"),
+    Field("focal_len", info_selectors("Focal Length"), parse=parse_focal_len, label="Focal Length",
+          bounds=(1, 2000)),
+    Field("aperture", info_selectors("Aperture"), parse=parse_aperture, label="Aperture", bounds=(0.5, 64)),
+    # in seconds, from 1/64000s to an hour long exposure
+    Field("shutter_speed", info_selectors("Shutter Speed"), parse=parse_shutter_speed, label="Shutter Speed",
+          bounds=(1 / 64000, 3600)),
+    Field("iso", info_selectors("ISO"), parse=parse_iso, label="ISO", bounds=(1, 409600)),
+    Field("img_resolution", info_selectors("Dimensions"), parse=parse_dimensions, label="Dimensions")
+]
+
+FIELDS_BY_NAME = {field.name: field for field in FIELDS}
+
+# field of every label in the Info dialog
+LABEL_FIELDS = {field.label: field.name for field in FIELDS if field.label is not None}
+
+# fields that change over time, the only ones a refresh collects
+METRIC_FIELDS = ["views", "downloads"]
+
+
+# counts, per field, how often it could not be found (missing), could not be parsed (invalid), was parsed
+# outside its bounds (suspect) or was only found by a fallback selector (fallback), and keeps the first few
+# invalid and suspect strings of every field, safe to share between threads
+class FieldStats:
+    def __init__(self):
+        self.counts = {}
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    # counts amount occurrences of outcome, samples are the strings that caused them
+    def record(self, field, outcome, amount=1, samples=()):
+        with self.lock:
+            counts = self.counts.setdefault(field, {key: 0 for key in OUTCOMES})
+            counts[outcome] += amount
+            kept = self.samples.setdefault(field, [])
+            for sample in samples:
+                if len(kept) >= SAMPLES:
+                    break
+                if sample not in kept:
+                    kept.append(sample)
+
+    def summary(self):
+        with self.lock:
+            return {field: dict(counts) for field, counts in self.counts.items()}
+
+    # prints the fields that had problems, nothing if every field was found and parsed
+    def report(self):
+        summary = self.summary()
+        if summary:
+            print("\nField           missing  invalid  suspect  fallback")
+            for field, counts in summary.items():
+                print(field.ljust(14) + "".join(str(counts[key]).rjust(9) for key in OUTCOMES))
+            with self.lock:
+                samples = {field: list(kept) for field, kept in self.samples.items() if kept}
+            for field, kept in samples.items():
+                print("  " + field + ": " + ", ".join(repr(sample) for sample in kept))
+        return summary
+
+
+# turns the raw strings of the given fields into values
+# "--" is what unsplash shows when a value was not provided, anything that is missing or cannot be parsed
+# becomes None and is counted in stats, values outside their field's bounds are kept and counted as suspect
+def parse_fields(raw, names, stats=None):
+    row = {}
+    fallbacks = raw.get("fallbacks") or []
+    for name in names:
+        field = FIELDS_BY_NAME[name]
+        text = raw.get(name)
+        row[name] = None
+        if text is None:
+            if stats is not None and not field.optional:
+                stats.record(name, "missing")
+        elif text != "--":
+            try:
+                row[name] = text if field.parse is None else field.parse(text)
+            except (ValueError, ZeroDivisionError, AttributeError):
+                if stats is not None:
+                    stats.record(name, "invalid", samples=[text])
+            else:
+                if stats is not None and field.suspect(row[name]):
+                    stats.record(name, "suspect", samples=[text])
+        if stats is not None and name in fallbacks:
+            stats.record(name, "fallback")
+    return row
+
+
+# turns the raw strings collected from a photo page into a row
+def parse_info(raw, stats=None):
+    row = parse_fields(raw, [field.name for field in FIELDS], stats)
+
+    # add 1 to count in order to keep a total of images when combining rows and such later on
+    row["count"] = 1
+    return row
+
+
+# turns the raw strings collected from a photo page into just the values that change over time
+def parse_metrics(raw, stats=None):
+    return parse_fields(raw, METRIC_FIELDS, stats)
+
+
+# collapses whitespace the same way the browser does when it reports an element's text
+def clean_text(text):
+    return " ".join(text.split())
+
+
+# elements that never have children or an end tag
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+# properties the browser resolves against the page's url when a selector reads them
+URL_PROPERTIES = {"href", "src"}
+
+# the parts of CSS the selectors in FIELDS use: a tag or *, [attribute], [attribute op 'value'] with =, ^=, *=
+# or $=, :not() around any of those, and the descendant and child combinators
+CSS_COMPOUND = re.compile(r"([a-zA-Z][\w-]*|\*)?((?:\[[^\]]+\]|:not\(\[[^\]]+\]\))*)")
+CSS_CONDITION = re.compile(r"""(:not\()?\[([\w-]+)(?:([\^*$]?=)(?:'([^']*)'|"([^"]*)"))?\]\)?""")
+
+# the parts of XPath the selectors in FIELDS use: / and // steps on the child and following-sibling axes, ..,
+# and [n], [text()="..."] and [normalize-space()="..."] predicates
+XPATH_STEP = re.compile(r"(//|/)(?:(\.\.)|(?:(child|following-sibling)::)?([\w-]+|\*)((?:\[[^\]]*\])*))")
+XPATH_PREDICATE = re.compile(r"""\[(?:(\d+)|(text|normalize-space)\(\)\s*=\s*(?:"([^"]*)"|'([^']*)'))\]""")
+
+
+# element of a parsed page, just enough of the DOM for the selectors in FIELDS
+class Node:
+    __slots__ = ["tag", "attrs", "parent", "children", "order", "cleaned"]
+
+    def __init__(self, tag, attrs, parent, order):
+        self.tag = tag
+        self.attrs = attrs
+        self.parent = parent
+        self.children = []  # child Nodes and text, in document order
+        self.order = order  # position in document order
+        self.cleaned = None  # text(), once it was asked for
+
+    def elements(self):
+        return [child for child in self.children if isinstance(child, Node)]
+
+    # every element below this one, in document order
+    def descendants(self):
+        found = []
+        stack = list(reversed(self.elements()))
+        while stack:
+            node = stack.pop()
+            found.append(node)
+            stack.extend(reversed(node.elements()))
+        return found
+
+    # all text below this one, like the DOM's textContent
+    def string(self):
+        return "".join(child if isinstance(child, str) else child.string() for child in self.children)
+
+    # text the way the browser reports it, whitespace collapsed. only read once the page is parsed
+    def text(self):
+        if self.cleaned is None:
+            self.cleaned = clean_text(self.string())
+        return self.cleaned
+
+
+# a CSS selector as a list of (combinator, tag, conditions) from left to right, conditions are
+# (negated, attribute, operator, value). raises ValueError for anything outside the supported parts
+def parse_css(css):
+    parts = []
+    combinator = " "
+    for token in css.replace(">", " > ").split():
+        if token == ">":
+            combinator = ">"
+            continue
+        compound = CSS_COMPOUND.fullmatch(token)
+        if compound is None or not token:
+            raise ValueError("Unsupported css selector: " + css)
+        conditions = [(bool(negated), name, op, single if single else double)
+                      for negated, name, op, single, double in CSS_CONDITION.findall(compound.group(2))]
+        parts.append((combinator, (compound.group(1) or "*").lower(), conditions))
+        combinator = " "
+    if not parts:
+        raise ValueError("Unsupported css selector: " + css)
+    return parts
+
+
+# whether node has the tag and attributes of one compound selector
+def css_matches(node, tag, conditions):
+    if tag != "*" and node.tag != tag:
+        return False
+    for negated, name, op, value in conditions:
+        actual = node.attrs.get(name)
+        if actual is None:
+            found = False if name not in node.attrs else (not op or (op == "=" and value == ""))
+        elif not op:
+            found = True
+        elif op == "=":
+            found = actual == value
+        elif op == "^=":
+            found = value != "" and actual.startswith(value)
+        elif op == "*=":
+            found = value != "" and value in actual
+        else:
+            found = value != "" and actual.endswith(value)
+        if found == negated:
+            return False
+    return True
+
+
+# whether node matches parts[:end], checked from the right like a browser does
+def css_chain(node, parts, end):
+    combinator, tag, conditions = parts[end - 1]
+    if not css_matches(node, tag, conditions):
+        return False
+    if end == 1:
+        return True
+    ancestor = node.parent
+    while ancestor is not None and ancestor.tag is not None:
+        if css_chain(ancestor, parts, end - 1):
+            return True
+        if combinator == ">":
+            return False
+        ancestor = ancestor.parent
+    return False
+
+
+# the elements of nodes (every element of a page in document order) that match css
+def select_css(nodes, css):
+    parts = parse_css(css)
+    return [node for node in nodes if css_chain(node, parts, len(parts))]
+
+
+# an XPath expression as a list of (separator, axis, tag, predicates), axis ".." steps to the parent
+def parse_xpath(xpath):
+    steps, pos = [], 0
+    while pos < len(xpath):
+        step = XPATH_STEP.match(xpath, pos)
+        if step is None:
+            raise ValueError("Unsupported xpath: " + xpath)
+        separator, parent, axis, tag, predicates = step.groups()
+        rest = predicates
+        parsed = []
+        for predicate in XPATH_PREDICATE.finditer(predicates or ""):
+            number, function, double, single = predicate.groups()
+            parsed.append(int(number) if number else (function, double if double is not None else single))
+            rest = rest.replace(predicate.group(0), "", 1)
+        if rest:
+            raise ValueError("Unsupported xpath: " + xpath)
+        steps.append((separator, ".." if parent else axis or "child", (tag or "").lower(), parsed))
+        pos = step.end()
+    return steps
+
+
+# whether node passes a text() or normalize-space() predicate
+def xpath_text(node, function, value):
+    if function == "text":
+        return any(isinstance(child, str) and child == value for child in node.children)
+    return node.text() == value
+
+
+# the nodes of candidates that have the tag and pass the predicates, positions count among candidates
+def xpath_filter(candidates, tag, predicates):
+    found = [node for node in candidates if tag == "*" or node.tag == tag]
+    for predicate in predicates:
+        if isinstance(predicate, int):
+            found = found[predicate - 1:predicate]
+        else:
+            found = [node for node in found if xpath_text(node, *predicate)]
+    return found
+
+
+# the nodes one step takes context to, positions count per context node like they do in XPath
+def xpath_step(context, axis, tag, predicates):
+    if axis == "..":
+        return [context.parent] if context.parent is not None and context.parent.tag is not None else []
+    if axis == "child":
+        return xpath_filter(context.elements(), tag, predicates)
+    siblings = context.parent.elements() if context.parent is not None else []
+    return xpath_filter(siblings[siblings.index(context) + 1:], tag, predicates)
+
+
+# the elements of a page that match xpath, every element of the page in document order is passed along
+# since most expressions start with //
+def select_xpath(root, everything, xpath):
+    nodes = [root]
+    for separator, axis, tag, predicates in parse_xpath(xpath):
+        if separator == "//":
+            below = everything if nodes == [root] else [node for context in nodes for node in context.descendants()]
+            if axis == "child" and not any(isinstance(predicate, int) for predicate in predicates):
+                # without a position every element below the context that passes the step is picked
+                found = {node.order: node for node in xpath_filter(below, tag, predicates)}
+                nodes = [found[order] for order in sorted(found)]
+                continue
+            nodes = nodes + below
+        found = {}
+        for context in nodes:
+            for node in xpath_step(context, axis, tag, predicates):
+                found[node.order] = node
+        nodes = [found[order] for order in sorted(found)]
+    return nodes
+
+
+# html parser that builds the page as a tree of Nodes, html that is not well formed is closed the forgiving
+# way: an end tag closes the innermost open element with its tag and end tags nothing is open for are ignored
+class PhotoPageParser(HTMLParser):
+    def __init__(self, url):
+        super().__init__(convert_charrefs=True)
+        self.url = url
+        self.root = Node(None, {}, None, 0)
+        self.open = [self.root]
+        self.nodes = []  # every element, in document order
+
+    def handle_starttag(self, tag, attrs):
+        node = Node(tag, {name: value for name, value in attrs}, self.open[-1], len(self.nodes) + 1)
+        self.open[-1].children.append(node)
+        self.nodes.append(node)
+        if tag not in VOID_TAGS:
+            self.open.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.open.pop()
+
+    def handle_endtag(self, tag):
+        for i in range(len(self.open) - 1, 0, -1):
+            if self.open[i].tag == tag:
+                del self.open[i:]
+                break
+
+    def handle_data(self, data):
+        self.open[-1].children.append(data)
+
+    # reads an element the way the browser does for a selector's read, urls are resolved like the
+    # browser's href and src properties
+    def read(self, node, how):
+        if how is None or how == "text":
+            return node.text()
+        value = node.attrs.get(how)
+        if how in URL_PROPERTIES:
+            return urljoin(self.url, value) if value is not None else ""
+        return value
+
+    # the raw strings of the given fields, every selector is tried in order and its matches are checked the
+    # same way the browser checks them (see UnsplashScrape.EXTRACT_JS), fields found by a fallback selector
+    # are listed under fallbacks
+    def collect(self, names=None):
+        raw = {"fallbacks": []}
+        for field in FIELDS:
+            if names is not None and field.name not in names:
+                continue
+            raw[field.name] = None
+            for i, selector in enumerate(field.selectors):
+                if "css" in selector:
+                    nodes = select_css(self.nodes, selector["css"])
+                else:
+                    nodes = select_xpath(self.root, self.nodes, selector["xpath"])
+                for node in nodes:
+                    if node.text() in selector.get("skip_text", []):
+                        continue
+                    val = self.read(node, selector.get("read"))
+                    if val is None or val in selector.get("skip", []) or \
+                            any(part in val for part in selector.get("skip_containing", [])):
+                        continue
+                    raw[field.name] = val
+                    break
+                if raw[field.name] is not None:
+                    if i > 0:
+                        raw["fallbacks"].append(field.name)
+                    break
+        return raw
+
+
+# parses a saved or fetched photo page into the raw strings of names (every field by default)
+def parse_photo_page(html, url, names=None):
+    parser = PhotoPageParser(url)
+    parser.feed(html)
+    parser.close()
+    return parser.collect(names)
+
+
+# extraction backend that fetches photo pages over plain http instead of opening them in the browser
+# downloads are timed as fetch steps and reading the html as extract steps, fields that could not be found
+# or parsed are counted in stats
+class HttpBackend:
+    def __init__(self, timeout=30, timer=None, stats=None):
+        self.timeout = timeout
+        self.timer = timer if timer is not None else UnsplashScrapeMetrics.StepTimer()
+        self.stats = stats if stats is not None else FieldStats()
+
+    # downloads the html of a page
+    def fetch(self, url):
+        request = urllib.request.Request(url, headers=HEADERS)
+        with self.timer.time("fetch"):
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                charset = response.headers.get_content_charset() or "utf-8"
+                return response.read().decode(charset, errors="replace")
+
+    # collects the raw strings of a photo page, the same ones UnsplashScrape.get_page collects
+    def get_raw(self, url):
+        html = self.fetch(url)
+        with self.timer.time("extract"):
+            return parse_photo_page(html, url)
+
+    # collects all attributes from a photo page as a row
+    def get_info(self, url):
+        raw = self.get_raw(url)
+        with self.timer.time("parse"):
+            return parse_info(raw, self.stats)
+
+    # collects only the views and downloads of a photo page
+    def get_metrics(self, url):
+        html = self.fetch(url)
+        with self.timer.time("extract"):
+            return parse_metrics(parse_photo_page(html, url, METRIC_FIELDS), self.stats)
@@ -0,0 +1,182 @@
+"""
+UNSPLASH SCRAPE FILTER
+
+Decides which photos found on the landing page are worth extracting, before a tab is ever opened for them.
+Opening a photo page is by far the most expensive step of a crawl, so pages that would be thrown away
+afterwards are dropped while the landing page is scrolled and the crawl keeps scrolling until it has found
+enough pages that are actually new.
+
+A page is skipped when
+ - its photo was already scraped by an earlier crawl (seen), recorded in a SeenSet
+ - the same photo was already found in this crawl under another url (duplicate), unsplash links a photo both
+   as /photos/<id> and as /photos/<slug>-<id>
+ - its card is marked as sponsored (sponsored)
+ - its photographer is an excluded account (excluded), see UnsplashScrapeAnalysis.excluded_accounts
+
+Photos are told apart by the id at the end of their page url rather than by the url itself. A SeenSet keeps a
+64 bit hash of every id in a sqlite table whose only column is the rowid, about 16 bytes a photo on disk, so
+millions of photos can be checked without loading them into memory. A hash set is used rather than a Bloom
+filter because a false positive would skip a new photo in every crawl from then on, with 64 bit hashes a
+collision is about as likely as one in a million after ten million photos.
+"""
+
+# necessary imports
+import os
+import re
+import sqlite3
+import hashlib
+import threading
+from urllib.parse import urlsplit
+import UnsplashScrapeStore
+import UnsplashScrapeAnalysis
+
+# length of the ids unsplash gives its photos
+ID_LENGTH = 11
+
+# part of a photo page url that holds the photo's id, optionally after a slug of its description
+PHOTO_PATH = re.compile(r"/photos/([^/]+)")
+
+# ids looked up in a single query
+BATCH_SIZE = 500
+
+# reasons a page can be skipped for, in the order they are reported
+REASONS = ["seen", "duplicate", "sponsored", "excluded"]
+
+
+# the id of the photo on a photo page, /photos/yeq7XzeJaiM and /photos/leafless-tree-yeq7XzeJaiM both give
+# yeq7XzeJaiM. urls that are not photo pages are identified by their host and path
+def photo_id(url):
+    parts = urlsplit(url)
+    path = parts.path.rstrip("/")
+    match = PHOTO_PATH.search(path)
+    if match is None:
+        return parts.netloc.lower() + path
+    slug = match.group(1)
+    if len(slug) > ID_LENGTH and slug[-ID_LENGTH - 1] == "-":
+        return slug[-ID_LENGTH:]
+    return slug
+
+
+# 64 bit hash of a photo id, signed so it fits in a sqlite integer
+def id_hash(pid):
+    return int.from_bytes(hashlib.blake2b(pid.encode(), digest_size=8).digest(), "big", signed=True)
+
+
+# photo ids of every scraped photo, persisted in a sqlite file and safe to share between threads
+class SeenSet:
+    def __init__(self, path="data/seen.db"):
+        self.path = path
+        self.lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS seen (id INTEGER PRIMARY KEY)")
+        self.conn.commit()
+
+    # the ones of the given photo ids that are in the set
+    def contains(self, ids):
+        hashes = {}
+        for pid in ids:
+            hashes.setdefault(id_hash(pid), []).append(pid)
+        keys = list(hashes)
+        found = set()
+        with self.lock:
+            for start in range(0, len(keys), BATCH_SIZE):
+                batch = keys[start:start + BATCH_SIZE]
+                rows = self.conn.execute("SELECT id FROM seen WHERE id IN (" + ",".join("?" * len(batch)) + ")",
+                                         batch).fetchall()
+                for (key,) in rows:
+                    found.update(hashes[key])
+        return found
+
+    def __contains__(self, url):
+        pid = photo_id(url)
+        return pid in self.contains([pid])
+
+    # records the photos of the given page urls
+    def add(self, urls):
+        with self.lock:
+            with self.conn:
+                self.conn.executemany("INSERT OR IGNORE INTO seen VALUES (?)",
+                                      [(id_hash(photo_id(url)),) for url in urls])
+
+    # records every photo of a dataset, e.g. to start a set from the photos scraped before it existed
+    def add_dataset(self, path):
+        if UnsplashScrapeStore.can_append(path):
+            pages = (row["img_page"] for row in UnsplashScrapeStore.iter_rows(path))
+        else:
+            pages = iter(UnsplashScrapeStore.load_frame(path)["img_page"].tolist())
+        while True:
+            batch = [page for _, page in zip(range(BATCH_SIZE), pages) if page]
+            if not batch:
+                break
+            self.add(batch)
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# picks the links found on the landing page that should be extracted, see the module docstring
+# seen is a SeenSet (None to not check earlier crawls), skip holds page urls that are skipped as seen as well,
+# accounts are the photographers whose photos are skipped (None reads excluded_accounts(), case does not
+# matter) and sponsored whether sponsored cards are skipped. every skipped photo is counted in timer (an
+# UnsplashScrapeMetrics.StepTimer) if one is given
+class PageFilter:
+    def __init__(self, seen=None, skip=(), accounts=None, sponsored=True, timer=None):
+        self.seen = seen
+        self.timer = timer
+        self.skip = set(photo_id(url) for url in skip)
+        if accounts is None:
+            accounts = UnsplashScrapeAnalysis.excluded_accounts()
+        self.accounts = set(account.lower() for account in accounts)
+        self.sponsored = sponsored
+        self.ids = set()  # photo ids kept so far in this crawl
+        self.counts = {reason: 0 for reason in REASONS}
+
+    # the links that are kept, in the order they were given
+    # every link is [url, hover text, photographer or None, whether the card is sponsored]
+    def keep(self, links):
+        ids = [photo_id(link[0]) for link in links]
+        seen = self.seen.contains(ids) if self.seen is not None else set()
+        kept = []
+        for link, pid in zip(links, ids):
+            reason = self.reason(link, pid, seen)
+            if reason is None:
+                self.ids.add(pid)
+                kept.append(link)
+            else:
+                self.counts[reason] += 1
+                if self.timer is not None:
+                    self.timer.count("skipped", reason=reason)
+                    self.timer.event("skip", url=link[0], reason=reason)
+        return kept
+
+    # why a link is skipped, None if it is not
+    def reason(self, link, pid, seen):
+        url, title, account, sponsored = link
+        if pid in seen or pid in self.skip:
+            return "seen"
+        if pid in self.ids:
+            return "duplicate"
+        if sponsored and self.sponsored:
+            return "sponsored"
+        if account is not None and account.lower() in self.accounts:
+            return "excluded"
+        return None
+
+    # prints how many pages were skipped for every reason
+    def report(self):
+        if any(self.counts.values()):
+            print("Skipped before extraction: " + ", ".join(str(self.counts[reason]) + " " + reason
+                                                            for reason in REASONS))
@@ -0,0 +1,313 @@
+"""
+UNSPLASH SCRAPE IMAGES
+
+Optional download stage for the images themselves. The crawl only records img_url, this fetches those urls
+so the photos are available for downstream work.
+
+Images are requested concurrently over a small pool of keep-alive connections, so downloading many photos
+from the same image host does not pay for a new TLS handshake every time. Unsplash serves its images
+through a resizing CDN, the w= (width) and q= (quality) query parameters of img_url are rewritten to
+request a smaller copy when width or quality are given.
+
+Downloaded images are kept in a content-addressed cache (data/images by default): every file is named by
+the sha256 of its bytes and a small sqlite index maps the requested urls to them. An image that is already
+cached is never downloaded again, identical images requested through different urls are stored once, and
+the least recently used images are removed once the cache grows past max_bytes.
+
+Requests per second, bytes per second and the number of downloads in flight can all be capped.
+"""
+
+# necessary imports
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import http.client
+import urllib.error
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+from concurrent.futures import ThreadPoolExecutor
+import UnsplashScrapeStore
+import UnsplashScrapeEngine
+import UnsplashScrapeExtract
+import UnsplashScrapeMetrics
+
+# headers sent with every image request, the CDN picks the smallest format the client accepts
+IMAGE_HEADERS = {
+    "User-Agent": UnsplashScrapeExtract.HEADERS["User-Agent"],
+    "Accept": "image/avif,image/webp,image/*;q=0.8"
+}
+
+# file extension of every image type the CDN serves
+EXTENSIONS = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp", "image/avif": ".avif",
+              "image/gif": ".gif"}
+
+# bytes read from a response at a time, and so the most the bandwidth limit lets through at once
+CHUNK_SIZE = 64 * 1024
+
+# status codes that point to the image somewhere else
+REDIRECTS = [301, 302, 303, 307, 308]
+
+
+# img_url with its w= and q= query parameters set to width and quality, None leaves a parameter as it is
+def sized_url(url, width=None, quality=None):
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    for key, value in [("w", width), ("q", quality)]:
+        if value is not None:
+            query = [(k, v) for k, v in query if k != key] + [(key, str(int(value)))]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+# pool of keep-alive http connections, safe to share between threads
+# a connection is taken out of the pool for every request and put back once its response has been read,
+# at most size idle connections are kept per host
+class ConnectionPool:
+    def __init__(self, size=8, timeout=30):
+        self.size = size
+        self.timeout = timeout
+        self.idle = {}  # (scheme, host) -> idle connections
+        self.lock = threading.Lock()
+
+    # an idle connection to host if there is one, otherwise a new one, and whether it was reused
+    def checkout(self, scheme, host):
+        with self.lock:
+            idle = self.idle.get((scheme, host))
+            if idle:
+                return idle.pop(), True
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, timeout=self.timeout), False
+        return http.client.HTTPConnection(host, timeout=self.timeout), False
+
+    def checkin(self, scheme, host, conn):
+        with self.lock:
+            idle = self.idle.setdefault((scheme, host), [])
+            if len(idle) < self.size:
+                idle.append(conn)
+                return
+        conn.close()
+
+    # downloads url and returns the response and its body, on_chunk(size) is called after every chunk of the
+    # body is read so the caller can pace the download
+    # anything but a 200 raises an HTTPError, redirects are followed
+    def get(self, url, headers=None, on_chunk=None, redirects=3):
+        parts = urlsplit(url)
+        path = (parts.path or "/") + ("?" + parts.query if parts.query else "")
+        conn, reused = self.checkout(parts.scheme, parts.netloc)
+        try:
+            conn.request("GET", path, headers=headers or {})
+            response = conn.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            if not reused:
+                raise
+            # the server closed the connection while it sat idle, the request is sent again on another one
+            return self.get(url, headers, on_chunk, redirects)
+        except BaseException:
+            conn.close()
+            raise
+
+        try:
+            if response.status in REDIRECTS and response.getheader("Location") and redirects > 0:
+                response.read()
+                location = urljoin(url, response.getheader("Location"))
+            elif response.status != 200:
+                response.read()
+                raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, None)
+            else:
+                location = None
+                chunks = []
+                while True:
+                    chunk = response.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+                    if on_chunk is not None:
+                        on_chunk(len(chunk))
+        except BaseException:
+            conn.close()
+            raise
+
+        if response.will_close:
+            conn.close()
+        else:
+            self.checkin(parts.scheme, parts.netloc, conn)
+        if location is not None:
+            return self.get(location, headers, on_chunk, redirects - 1)
+        return response, b"".join(chunks)
+
+    def close(self):
+        with self.lock:
+            for idle in self.idle.values():
+                for conn in idle:
+                    conn.close()
+            self.idle = {}
+
+
+# content-addressed image cache on disk
+# every image is stored once as <folder>/<first 2 digits of its sha256>/<sha256><extension>, index.db maps
+# every url that was downloaded to the hash of what it returned and records when each image was last used
+# the least recently used images are deleted once the images add up to more than max_bytes
+class ImageCache:
+    def __init__(self, folder="data/images", max_bytes=2 * 1024 ** 3):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(folder, "index.db"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, digest TEXT)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, file TEXT, size INTEGER, "
+                          "used REAL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS blobs_used ON blobs (used)")
+        self.conn.commit()
+        self.size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    # path of the cached image of url, None if it has not been downloaded (or was evicted)
+    def get(self, url):
+        with self.lock:
+            found = self.conn.execute("SELECT blobs.digest, blobs.file FROM urls JOIN blobs "
+                                      "ON urls.digest = blobs.digest WHERE urls.url = ?", (url,)).fetchone()
+            if found is None:
+                return None
+            digest, file = found
+            path = os.path.join(self.folder, file)
+            if not os.path.exists(path):
+                return None
+            with self.conn:
+                self.conn.execute("UPDATE blobs SET used = ? WHERE digest = ?", (time.time(), digest))
+        return path
+
+    # stores the image url returned and gives back its path, an image that is already cached is not written again
+    def put(self, url, data, ext=""):
+        digest = hashlib.sha256(data).hexdigest()
+        file = os.path.join(digest[0:2], digest + ext)
+        path = os.path.join(self.folder, file)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # written under a temporary name first so a crash never leaves half an image behind
+            with open(path + ".part", "wb") as image:
+                image.write(data)
+            os.replace(path + ".part", path)
+
+        with self.lock:
+            with self.conn:
+                added = self.conn.execute("INSERT OR IGNORE INTO blobs VALUES (?, ?, ?, ?)",
+                                          (digest, file, len(data), time.time())).rowcount
+                self.conn.execute("UPDATE blobs SET used = ? WHERE digest = ?", (time.time(), digest))
+                self.conn.execute("INSERT OR REPLACE INTO urls VALUES (?, ?)", (url, digest))
+            if added:
+                self.size += len(data)
+            self.evict(keep=digest)
+        return path
+
+    # deletes the least recently used images until the cache fits in max_bytes, keep is never deleted
+    def evict(self, keep=None):
+        while self.size > self.max_bytes:
+            oldest = self.conn.execute("SELECT digest, file, size FROM blobs WHERE digest != ? "
+                                       "ORDER BY used LIMIT 1", (keep,)).fetchone()
+            if oldest is None:
+                break
+            digest, file, size = oldest
+            with self.conn:
+                self.conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+                self.conn.execute("DELETE FROM urls WHERE digest = ?", (digest,))
+            if os.path.exists(os.path.join(self.folder, file)):
+                os.remove(os.path.join(self.folder, file))
+            self.size -= size
+
+    def close(self):
+        self.conn.close()
+
+
+# downloads images into an ImageCache
+# width and quality request a resized copy from the CDN, max_concurrent caps the downloads in flight,
+# rate the requests per second and bandwidth the bytes per second (None for no limit), max_bytes is the
+# size of the cache. every download is timed as a download step
+class ImageDownloader:
+    def __init__(self, folder="data/images", width=None, quality=None, max_concurrent=4, rate=None,
+                 bandwidth=None, max_bytes=2 * 1024 ** 3, attempts=3, timeout=30, timer=None):
+        self.width = width
+        self.quality = quality
+        self.max_concurrent = max_concurrent
+        self.attempts = attempts
+        self.cache = ImageCache(folder, max_bytes)
+        self.client = ConnectionPool(max_concurrent, timeout)
+        self.limiter = UnsplashScrapeEngine.TokenBucket(rate)
+        self.bandwidth = UnsplashScrapeEngine.TokenBucket(bandwidth, burst=CHUNK_SIZE)
+        self.timer = timer if timer is not None else UnsplashScrapeMetrics.StepTimer()
+        self.counts = {"downloaded": 0, "cached": 0, "failed": 0, "bytes": 0}
+        self.lock = threading.Lock()
+
+    def count(self, outcome, size=0):
+        with self.lock:
+            self.counts[outcome] += 1
+            self.counts["bytes"] += size
+
+    # path of the image at url, downloaded only if it is not cached yet
+    def fetch(self, url):
+        url = sized_url(url, self.width, self.quality)
+        path = self.cache.get(url)
+        if path is not None:
+            self.count("cached")
+            return path
+
+        def attempt():
+            self.limiter.wait()
+            return self.client.get(url, IMAGE_HEADERS, self.bandwidth.wait)
+
+        with self.timer.time("download"):
+            response, data = UnsplashScrapeEngine.retry(attempt, self.attempts,
+                                                        should_retry=UnsplashScrapeEngine.transient_error)
+        content_type = (response.getheader("Content-Type") or "").split(";")[0].strip()
+        path = self.cache.put(url, data, EXTENSIONS.get(content_type, ""))
+        self.count("downloaded", len(data))
+        return path
+
+    # paths of the images at urls in the same order, None for images that could not be downloaded
+    def download(self, urls):
+        def safe_fetch(url):
+            try:
+                return self.fetch(url)
+            except Exception as e:
+                print("Could not download " + url + ": " + str(e))
+                self.count("failed")
+                return None
+
+        unique = list(dict.fromkeys(url for url in urls if url))
+        with ThreadPoolExecutor(max_workers=self.max_concurrent) as executor:
+            paths = dict(zip(unique, executor.map(safe_fetch, unique)))
+        return [paths.get(url) for url in urls]
+
+    def close(self):
+        self.client.close()
+        self.cache.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# downloads the image of every photo in a dataset (data/data.csv by default) and returns
+# {img_page: path of the image}, photos whose image could not be downloaded are left out
+# the keyword arguments are passed on to ImageDownloader
+def download_dataset(data="data/data.csv", folder="data/images", **options):
+    if UnsplashScrapeStore.can_append(data):
+        rows = [(row["img_page"], row["img_url"]) for row in UnsplashScrapeStore.iter_rows(data)]
+    else:
+        df = UnsplashScrapeStore.load_frame(data)
+        rows = list(zip(df["img_page"], df["img_url"]))
+
+    with ImageDownloader(folder, **options) as downloader:
+        paths = downloader.download([url for page, url in rows])
+        counts = downloader.counts
+        print(str(counts["downloaded"]) + " image(s) downloaded (" + str(round(counts["bytes"] / 1024 ** 2, 1)) +
+              " MB), " + str(counts["cached"]) + " already cached, " + str(counts["failed"]) + " failed")
+        downloader.timer.report()
+    return {page: path for (page, url), path in zip(rows, paths) if path is not None}
+
+
+if __name__ == "__main__":
+    download_dataset()
@@ -0,0 +1,328 @@
+"""
+UNSPLASH SCRAPE INDEX
+
+Analytics over every crawl and refresh that has been run, kept up to date as new rows are appended instead of
+being recomputed from the full history.
+
+The index is a sqlite database (data/index.db by default) holding:
+ - photos - the latest views and downloads of every photo seen, the observation before it and the views and
+   downloads it gained per day in between (its trend)
+ - photographers - views, downloads and photo count per photographer
+ - cameras - views, downloads and photo count per camera make and model
+ - files - how far every dataset and history file has been read and a fingerprint of what was read
+
+update reads only the part of data/data.csv and data/history.csv written since the last update, and every
+new observation of a photo adjusts the rollups by the difference to the one before it, so the cost of an
+update grows with the rows added rather than with the size of the history. The rankings and trending photos
+are read off indexes, so they come back in milliseconds however many rows have been ingested.
+
+Observations are ordered by when they were taken. History rows carry their scraped_at, dataset rows have no
+time of their own and are undated: the crawl that found a photo always comes before any refresh of it, so an
+undated observation is ordered before every dated one of the same photo, and undated observations are ordered
+among themselves by when their file was written. An observation older than what is already indexed is
+ignored, so reading a file again never counts anything twice.
+"""
+
+# necessary imports
+import io
+import os
+import csv
+import json
+import sqlite3
+import hashlib
+import datetime
+import functools
+import threading
+import UnsplashScrapeStore
+import UnsplashScrapeAnalysis
+
+# tables and indexes of the index database
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS photos (img_page TEXT PRIMARY KEY, photographer TEXT, camera_make TEXT, "
+    "camera_model TEXT, seen_at TEXT, views INTEGER, downloads INTEGER, prev_seen_at TEXT, prev_views INTEGER, "
+    "prev_downloads INTEGER, views_trend REAL, downloads_trend REAL, dated INTEGER, prev_dated INTEGER)",
+    "CREATE TABLE IF NOT EXISTS photographers (photographer TEXT PRIMARY KEY, views INTEGER, downloads INTEGER, "
+    "count INTEGER)",
+    "CREATE TABLE IF NOT EXISTS cameras (camera_make TEXT, camera_model TEXT, views INTEGER, downloads INTEGER, "
+    "count INTEGER, PRIMARY KEY (camera_make, camera_model))",
+    "CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, offset INTEGER, fingerprint TEXT)",
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+    "CREATE INDEX IF NOT EXISTS photographers_views ON photographers (views)",
+    "CREATE INDEX IF NOT EXISTS cameras_views ON cameras (views)",
+    "CREATE INDEX IF NOT EXISTS photos_views_trend ON photos (views_trend)",
+    "CREATE INDEX IF NOT EXISTS photos_downloads_trend ON photos (downloads_trend)"
+]
+
+# version of the layout above, an index of another version is dropped and built again from the files
+VERSION = "3"
+
+# bytes at the start and at the end of what was read of a file that its fingerprint is taken from
+FINGERPRINT_BYTES = 4096
+
+# photos looked up in the index per query while merging
+BATCH_SIZE = 500
+
+# attributes of a photo taken from the dataset, the history only has its metrics
+ATTRIBUTES = ["photographer", "camera_make", "camera_model"]
+
+
+# time of an observation as an ISO 8601 string in UTC, these sort in the order they were taken
+def timestamp(seconds):
+    return datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc).isoformat(timespec="seconds")
+
+
+# timestamp as a datetime, every crawl shares a handful of timestamps so they are only parsed once
+@functools.lru_cache(maxsize=4096)
+def parse_timestamp(text):
+    return datetime.datetime.fromisoformat(text)
+
+
+# hash of the first and last FINGERPRINT_BYTES of the first offset bytes of an open file, a file that was
+# replaced rather than appended to almost always changes one of them
+def fingerprint(file, offset):
+    file.seek(0)
+    start = file.read(min(offset, FINGERPRINT_BYTES))
+    file.seek(max(offset - FINGERPRINT_BYTES, 0))
+    end = file.read(min(offset, FINGERPRINT_BYTES))
+    return hashlib.sha1(str(offset).encode() + b"\n" + start + end).hexdigest()
+
+
+# days between two timestamps
+def days_between(start, end):
+    return (parse_timestamp(end) - parse_timestamp(start)).total_seconds() / 86400
+
+
+# metric from a csv cell or json value, None if it is missing
+def to_int(value):
+    if value is None or value == "":
+        return None
+    return int(float(value))
+
+
+# lowercased accounts to leave out of a ranking, UnsplashScrapeAnalysis.excluded_accounts() if exclude is None
+def excluded(exclude):
+    if exclude is None:
+        return UnsplashScrapeAnalysis.excluded_accounts()
+    return [account.lower() for account in exclude]
+
+
+# adds views, downloads and count to the photographer and camera of a photo in rollups, the running totals
+# of a batch that are written to the rollup tables in one go
+def roll_up(rollups, attributes, views, downloads, count):
+    for table, key in [("photographers", (attributes.get("photographer"),)),
+                       ("cameras", (attributes.get("camera_make"), attributes.get("camera_model")))]:
+        if None not in key:
+            total = rollups[table].get(key)
+            if total is None:
+                total = rollups[table][key] = [0, 0, 0]
+            total[0] += views
+            total[1] += downloads
+            total[2] += count
+
+
+# incrementally maintained analytics over every crawl and refresh, safe to share between threads
+class AnalyticsIndex:
+    def __init__(self, path="data/index.db"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        version = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if version is None or version[0] != VERSION:
+            for table in ["photos", "photographers", "cameras", "files"]:
+                self.conn.execute("DROP TABLE IF EXISTS " + table)
+        for statement in SCHEMA:
+            self.conn.execute(statement)
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (VERSION,))
+        self.conn.commit()
+
+    # reads the rows of a dataset or history file that were written since it was last read, and returns them
+    # with the offset and fingerprint to remember. a file that was replaced (it is shorter than what was read
+    # or what was read changed) is read from the start, formats that cannot be appended to are always read whole
+    def read_new(self, path):
+        if not UnsplashScrapeStore.can_append(path):
+            return UnsplashScrapeStore.load_frame(path).to_dict("records"), 0, ""
+
+        with self.lock:
+            known = self.conn.execute("SELECT offset, fingerprint FROM files WHERE path = ?",
+                                      (os.path.abspath(path),)).fetchone()
+        with open(path, "rb") as file:
+            head = file.readline()
+            file.seek(0, os.SEEK_END)
+            size = file.tell()
+            offset = 0
+            if known is not None and known[0] <= size and fingerprint(file, known[0]) == known[1]:
+                offset = known[0]
+            file.seek(offset)
+            data = file.read()
+
+            # a row that is still being written is left for the next read
+            data = data[0:data.rfind(b"\n") + 1]
+            read = fingerprint(file, offset + len(data))
+        text = data.decode("utf-8")
+        if path.lower().endswith(".csv"):
+            # past the start the header is not in what was read, so it is taken from the first line
+            header = None if offset == 0 else next(csv.reader([head.decode("utf-8")]))
+            rows = [{key: (None if val == "" else val) for key, val in row.items()}
+                    for row in csv.DictReader(io.StringIO(text, newline=""), fieldnames=header)]
+        else:
+            rows = [json.loads(line) for line in text.split("\n") if line.strip()]
+        return rows, offset + len(data), read
+
+    # indexes the rows added to a dataset (rows with photographer and camera) or history file (rows with
+    # scraped_at) since it was last read. rows without a scraped_at are undated, they are ordered before every
+    # dated observation of their photo and by when the file was last written among themselves. returns how
+    # many rows were read
+    def ingest(self, path):
+        if not os.path.exists(path):
+            return 0
+        written_at = timestamp(os.path.getmtime(path))
+        rows, offset, read = self.read_new(path)
+        for row in rows:
+            if "seen_at" not in row:
+                row["dated"] = bool(row.get("scraped_at"))
+                row["seen_at"] = row.get("scraped_at") or written_at
+        self.observe(rows)
+        if offset > 0:
+            with self.lock, self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?)",
+                                  (os.path.abspath(path), offset, read))
+        return len(rows)
+
+    # brings the index up to date with the dataset and the metrics history, returns how many rows were read
+    def update(self, data="data/data.csv", history="data/history.csv"):
+        return self.ingest(data) + self.ingest(history)
+
+    # adds observations of photos, dicts with img_page, seen_at, dated (False for the undated observations of
+    # a dataset, True when missing) and views/downloads and (from the dataset) the photographer and camera.
+    # only the newest two observations of every photo are kept
+    def observe(self, observations):
+        metrics = {}  # img_page -> {(dated, seen_at): (views, downloads)}
+        attributes = {}  # img_page -> latest known photographer, camera make and model
+        for obs in observations:
+            page = obs["img_page"]
+            if any(key in obs for key in ATTRIBUTES):
+                known = attributes.setdefault(page, {})
+                known.update({key: obs.get(key) for key in ATTRIBUTES if obs.get(key) is not None})
+            views = to_int(obs.get("views"))
+            if views is not None:
+                key = (bool(obs.get("dated", True)), obs["seen_at"])
+                metrics.setdefault(page, {})[key] = (views, to_int(obs.get("downloads")) or 0)
+
+        pages = list(set(metrics) | set(attributes))
+        with self.lock, self.conn:
+            # the indexed state of every photo, looked up a few hundred at a time
+            current = {}
+            for i in range(0, len(pages), BATCH_SIZE):
+                part = pages[i:i + BATCH_SIZE]
+                for row in self.conn.execute("SELECT img_page, photographer, camera_make, camera_model, seen_at, "
+                                             "views, downloads, prev_seen_at, prev_views, prev_downloads, dated, "
+                                             "prev_dated FROM photos WHERE img_page IN (" +
+                                             ", ".join("?" * len(part)) + ")", part):
+                    current[row[0]] = row[1:]
+
+            photos = []
+            rollups = {"photographers": {}, "cameras": {}}
+            for page in pages:
+                row = self.merge(page, current.get(page), metrics.get(page, {}), attributes.get(page, {}), rollups)
+                if row is not None:
+                    photos.append(row)
+
+            self.conn.executemany("INSERT OR REPLACE INTO photos VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                  photos)
+            self.conn.executemany("INSERT INTO photographers VALUES (?, ?, ?, ?) ON CONFLICT (photographer) DO UPDATE "
+                                  "SET views = views + excluded.views, downloads = downloads + excluded.downloads, "
+                                  "count = count + excluded.count",
+                                  [key + tuple(total) for key, total in rollups["photographers"].items()])
+            self.conn.executemany("INSERT INTO cameras VALUES (?, ?, ?, ?, ?) ON CONFLICT (camera_make, camera_model) "
+                                  "DO UPDATE SET views = views + excluded.views, downloads = downloads + "
+                                  "excluded.downloads, count = count + excluded.count",
+                                  [key + tuple(total) for key, total in rollups["cameras"].items()])
+
+    # merges the new observations and attributes of one photo with what is indexed for it (current) and returns
+    # its new row of photos, None if nothing changed. the difference to the old numbers is added to rollups
+    # observations are keyed by (dated, seen_at) so the undated ones sort before the dated ones
+    @staticmethod
+    def merge(page, current, metrics, attributes, rollups):
+        old = dict(zip(ATTRIBUTES, current[0:3])) if current is not None else {}
+        new = dict(old, **attributes)
+
+        # the two newest of the observations already indexed and the new ones
+        seen = dict(metrics)
+        if current is not None:
+            for (seen_at, views, downloads), dated in [(current[3:6], current[9]), (current[6:9], current[10])]:
+                if seen_at is not None:
+                    seen.setdefault((bool(dated), seen_at), (views, downloads))
+        newest = sorted(seen.items(), reverse=True)[0:2]
+        latest = newest[0] if newest else ((None, None), (None, None))
+        previous = newest[1] if len(newest) > 1 else ((None, None), (None, None))
+
+        if current is not None and new == old and latest[0] == (bool(current[9]), current[3]) and \
+                previous[0] == (bool(current[10]), current[6]):
+            return None
+
+        # an undated observation may have been written after the dated one that follows it, there is no trend
+        # between them then
+        trends = [None, None]
+        if previous[0][1] is not None:
+            days = days_between(previous[0][1], latest[0][1])
+            if days > 0:
+                trends = [(latest[1][i] - previous[1][i]) / days for i in range(2)]
+
+        # the photo's old numbers come out of the rollups and its new ones go in
+        if current is not None and current[4] is not None:
+            roll_up(rollups, old, -current[4], -current[5], -1)
+        if latest[0][1] is not None:
+            roll_up(rollups, new, latest[1][0], latest[1][1], 1)
+
+        return (page, new.get("photographer"), new.get("camera_make"), new.get("camera_model"), latest[0][1],
+                latest[1][0], latest[1][1], previous[0][1], previous[1][0], previous[1][1], trends[0], trends[1],
+                latest[0][0], previous[0][0])
+
+    # runs a query and returns its rows as dicts
+    def query(self, sql, params=()):
+        with self.lock:
+            cursor = self.conn.execute(sql, params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    # the n photographers with the most views, leaving out the excluded accounts
+    # (UnsplashScrapeAnalysis.excluded_accounts() by default, case does not matter)
+    def top_photographers(self, n=10, exclude=None):
+        exclude = excluded(exclude)
+        return self.query("SELECT photographer, views, downloads, count FROM photographers WHERE LOWER(photographer) "
+                          "NOT IN "
+                          "(" + ", ".join("?" * len(exclude)) + ") AND count > 0 ORDER BY views DESC LIMIT ?",
+                          exclude + [n])
+
+    # the n camera makes and models with the most views
+    def top_cameras(self, n=10):
+        return self.query("SELECT camera_make, camera_model, views, downloads, count FROM cameras WHERE count > 0 "
+                          "ORDER BY views DESC LIMIT ?", (n,))
+
+    # the n photos that gained the most views (or downloads, by="downloads") per day between their last two
+    # observations, photos of the excluded accounts are left out
+    def trending(self, n=10, by="views", exclude=None):
+        if by not in ["views", "downloads"]:
+            raise ValueError("Trending photos are ranked by views or downloads, not " + str(by))
+        exclude = excluded(exclude)
+        return self.query("SELECT img_page, photographer, seen_at, views, downloads, prev_seen_at, prev_views, "
+                          "prev_downloads, " + by + "_trend AS per_day FROM photos WHERE " + by + "_trend IS NOT NULL "
+                          "AND LOWER(COALESCE(photographer, '')) NOT IN (" + ", ".join("?" * len(exclude)) + ") "
+                          "ORDER BY " + by + "_trend DESC LIMIT ?", exclude + [n])
+
+    # number of photos, photographers and cameras in the index
+    def counts(self):
+        with self.lock:
+            return {table: self.conn.execute("SELECT COUNT(*) FROM " + table).fetchone()[0]
+                    for table in ["photos", "photographers", "cameras"]}
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
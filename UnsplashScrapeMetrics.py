@@ -0,0 +1,318 @@
+"""
+UNSPLASH SCRAPE METRICS
+
+Timing of every step of a crawl so it is possible to see where the time actually goes.
+
+Each step (startup, discover, rate-wait, open, wait-info, extract, parse, fetch, download) and every photo page
+as a whole (page) is timed into a histogram with exponentially sized buckets, so memory stays the same no matter
+how long the crawl runs. At the end of a run a summary with the count, mean, p50/p95/p99 and max of every step
+is printed and written as JSON.
+
+Along with the timings the StepTimer keeps counters (pages done and failed, retries, photos skipped) and
+gauges (pages in flight, pages waiting, when the last page finished) while the crawl runs. A MetricsServer
+serves all of them in the Prometheus text format on a local port so long crawls can be watched, graphed
+and alerted on (e.g. when unsplash_scrape_last_progress_timestamp_seconds stops moving), and an EventLog
+writes every finished page, failure, retry and skip as a line of JSON along with a snapshot of the counters
+every few seconds.
+"""
+
+# necessary imports
+import json
+import time
+import bisect
+import datetime
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# upper bounds of the histogram buckets in seconds, each about 19% bigger than the last (1ms up to ~17 minutes)
+BUCKETS = [0.001 * 2 ** (i / 4) for i in range(81)]
+
+# prefix of every metric the MetricsServer exposes
+PREFIX = "unsplash_scrape_"
+
+# every counter and gauge, name -> (prometheus type, exposed name, help text)
+METRICS = {
+    "pages": ("counter", "pages_total", "Photo pages finished, by outcome (done or failed)."),
+    "retries": ("counter", "retries_total", "Steps tried again after a temporary failure."),
+    "skipped": ("counter", "skipped_total", "Landing page photos skipped before extraction, by reason."),
+    "rows": ("counter", "rows_written_total", "Rows written to the output."),
+    "in_flight": ("gauge", "in_flight", "Photo pages being loaded right now."),
+    "queue_depth": ("gauge", "queue_depth", "Photo pages waiting to be loaded."),
+    "last_progress": ("gauge", "last_progress_timestamp_seconds", "Unix time the last photo page finished.")
+}
+
+# content type of the Prometheus text format
+EXPOSITION_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# latency histogram with fixed buckets, percentiles are estimated from the bucket bounds
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last bucket holds everything slower than the biggest bound
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    # estimate of the q-th quantile, interpolated inside the bucket that holds it
+    # never more than the slowest value seen
+    def percentile(self, q):
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count > 0 and seen + count >= rank:
+                lower = BUCKETS[i - 1] if i > 0 else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "max": self.max,
+            "buckets": {str(round(BUCKETS[i], 6)) if i < len(BUCKETS) else "inf": count
+                        for i, count in enumerate(self.counts) if count > 0}
+        }
+
+
+# name{labels} of a series in the Prometheus text format
+def series(name, labels):
+    if not labels:
+        return name
+    return name + "{" + ",".join(key + '="' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+                                 for key, value in labels) + "}"
+
+
+# times the steps of a crawl and counts what happens in it, safe to share between threads
+# counters and gauges are kept per name and labels, e.g. count("pages", outcome="done")
+class StepTimer:
+    def __init__(self):
+        self.steps = {}
+        self.counters = {}  # (name, labels) -> value
+        self.gauges = {}  # (name, labels) -> value
+        self.events = None  # EventLog every event is written to, None to keep no log
+        self.lock = threading.Lock()
+
+    def observe(self, step, seconds):
+        with self.lock:
+            if step not in self.steps:
+                self.steps[step] = Histogram()
+            self.steps[step].observe(seconds)
+
+    # with timer.time("open"): ... records how long the block took
+    @contextmanager
+    def time(self, step):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(step, time.perf_counter() - start)
+
+    # adds amount to a counter
+    def count(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    # sets a gauge to value
+    def gauge(self, name, value, **labels):
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    # moves a gauge up or down by delta
+    def shift(self, name, delta, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.gauges[key] = self.gauges.get(key, 0) + delta
+
+    # writes an event to the event log, if there is one
+    def event(self, kind, **fields):
+        events = self.events
+        if events is not None:
+            events.write(kind, fields)
+
+    # with timer.page(url): ... loads a photo page, the block is timed as a page step, the page counts as in
+    # flight while it runs and as done or failed (if it raised) once it is over
+    @contextmanager
+    def page(self, url):
+        self.shift("in_flight", 1)
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            self.shift("in_flight", -1)
+            self.observe("page", seconds)
+            if error is None:
+                self.count("pages", outcome="done")
+                self.gauge("last_progress", time.time())
+                self.event("page", url=url, seconds=round(seconds, 6))
+            else:
+                self.count("pages", outcome="failed")
+                self.event("failed", url=url, seconds=round(seconds, 6), error=repr(error))
+
+    # records that a step of url failed temporarily and is tried again, made to be passed to retry as
+    # on_retry=lambda e, attempt: timer.retried(url, e, attempt)
+    def retried(self, url, error, attempt):
+        self.count("retries")
+        self.event("retry", url=url, attempt=attempt + 1, error=repr(error))
+
+    # current value of every counter and gauge, {"counters": {series: value}, "gauges": {series: value}}
+    def snapshot(self):
+        with self.lock:
+            return {
+                "counters": {series(name, labels): value for (name, labels), value in self.counters.items()},
+                "gauges": {series(name, labels): value for (name, labels), value in self.gauges.items()}
+            }
+
+    # every counter, gauge and step histogram in the Prometheus text format
+    def exposition(self):
+        with self.lock:
+            values = {}
+            for (name, labels), value in list(self.counters.items()) + list(self.gauges.items()):
+                values.setdefault(name, []).append((labels, value))
+            steps = [(step, list(hist.counts), hist.total, hist.count) for step, hist in self.steps.items()]
+
+        lines = []
+        for name, (kind, exposed, text) in METRICS.items():
+            if name in values:
+                lines += ["# HELP " + PREFIX + exposed + " " + text, "# TYPE " + PREFIX + exposed + " " + kind]
+                lines += [series(PREFIX + exposed, labels) + " " + repr(value) for labels, value in values[name]]
+
+        name = PREFIX + "step_seconds"
+        lines += ["# HELP " + name + " Time taken by every step of a crawl.", "# TYPE " + name + " histogram"]
+        for step, counts, total, count in steps:
+            cumulative = 0
+            for i, bucket in enumerate(counts):
+                cumulative += bucket
+                le = repr(round(BUCKETS[i], 6)) if i < len(BUCKETS) else "+Inf"
+                lines.append(series(name + "_bucket", (("step", step), ("le", le))) + " " + str(cumulative))
+            lines.append(series(name + "_sum", (("step", step),)) + " " + repr(total))
+            lines.append(series(name + "_count", (("step", step),)) + " " + str(count))
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        with self.lock:
+            return {step: hist.summary() for step, hist in self.steps.items()}
+
+    # prints a table of the steps and writes the full summary, histograms included, to path
+    def report(self, path=None):
+        summary = self.summary()
+        print("\nStep          count    mean     p50      p95      p99      max   (ms)")
+        for step, stats in summary.items():
+            print(step.ljust(12) + str(stats["count"]).rjust(7) + "".join(
+                str(round(1000 * stats[key], 1)).rjust(9) for key in ["mean", "p50", "p95", "p99", "max"]))
+        if path is not None:
+            with open(path, "w") as file:
+                json.dump(summary, file, indent=2)
+        return summary
+
+
+# appends events to a JSONL file as they happen, one object per line with the time and kind of the event
+# attached to timer every event of the timer is written, along with a progress event holding the timer's
+# snapshot every interval seconds and once more when the log is closed
+class EventLog:
+    def __init__(self, path, timer=None, interval=10.0):
+        self.file = open(path, "a", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.timer = timer
+        self.stop = threading.Event()
+        self.thread = None
+        if timer is not None:
+            timer.events = self
+            self.thread = threading.Thread(target=self.progress, args=(interval,), daemon=True)
+            self.thread.start()
+
+    def write(self, kind, fields):
+        event = {"time": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="milliseconds"),
+                 "event": kind}
+        event.update(fields)
+        line = json.dumps(event, ensure_ascii=False)
+        with self.lock:
+            if not self.file.closed:
+                # flushed straight away so the log can be followed while the crawl runs
+                self.file.write(line + "\n")
+                self.file.flush()
+
+    # writes a progress event every interval seconds until the log is closed
+    def progress(self, interval):
+        while not self.stop.wait(interval):
+            self.write("progress", self.timer.snapshot())
+
+    def close(self):
+        if self.timer is not None:
+            self.stop.set()
+            self.thread.join()
+            self.write("progress", self.timer.snapshot())
+            if self.timer.events is self:
+                self.timer.events = None
+        with self.lock:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# answers GET /metrics with the exposition of the server's timer
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ["/", "/metrics"]:
+            self.send_error(404)
+            return
+        body = self.server.timer.exposition().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", EXPOSITION_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # scrapes would otherwise print a line each
+    def log_message(self, format, *args):
+        pass
+
+
+# local http endpoint Prometheus can scrape the metrics of a timer from, at http://host:port/metrics
+# port 0 picks a free port, the one picked is in port
+class MetricsServer:
+    def __init__(self, timer, port=9108, host="127.0.0.1"):
+        self.httpd = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.timer = timer
+        self.port = self.httpd.server_address[1]
+        self.url = "http://" + host + ":" + str(self.port) + "/metrics"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
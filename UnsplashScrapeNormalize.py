@@ -0,0 +1,229 @@
+"""
+UNSPLASH SCRAPE NORMALIZE
+
+Batch stage that turns the raw strings kept by a crawl (UnsplashScrape(raw=...), a .jsonl file of RawRows)
+into rows a whole column at a time instead of one row at a time. Because the raw strings are kept, the
+dataset can be rebuilt whenever the parsing rules change without crawling a single page again.
+
+Every field is parsed by the column version of its parser in COLUMN_PARSERS: pandas string methods strip the
+units ("mm", "ƒ/", the "s" of shutter speeds), split the shutter speed fractions and replace the " × " of the
+dimensions, a regular expression checks that what is left is a plain number and numpy converts the matching
+strings in one go. Anything else (and every field whose parser has no column version) is handed to the
+field's own parser one string at a time, so the rows are the same as the ones parse_info gives during a crawl.
+The only exceptions are values a column cannot hold: integers that do not fit in 64 bits are counted as
+invalid and "nan" becomes a missing value.
+
+Like a crawl, every field that is missing, cannot be parsed or lies outside its bounds is counted in a
+FieldStats, whose report lists a few of the strings that caused it.
+"""
+
+# necessary imports
+import os
+import UnsplashScrapeStore
+import UnsplashScrapeExtract
+
+# a number the way float() reads it, without the surrounding whitespace or underscores it also allows
+NUMBER = r"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?"
+
+# an integer small enough to always fit in 64 bits
+INTEGER = r"[+-]?\d{1,18}"
+
+# pandas dtype of the parsed columns, the capitalized ints allow missing values
+DTYPES = {"int64": "Int64", "float64": "float64", "string": object}
+
+# values an Int64 column can hold
+INT64_RANGE = (-2 ** 63, 2 ** 63 - 1)
+
+
+# the strings of texts that are entirely pattern, converted to dtype, and which of them they are
+# strings that do not match are converted as "0" and left for the field's own parser
+def numbers(texts, pattern, dtype):
+    matched = texts.str.fullmatch(pattern).astype(bool)
+    return texts.where(matched, "0").astype(dtype), matched
+
+
+def photographer_column(texts):
+    return texts.str.rpartition("/@")[2], texts.notna()
+
+
+def count_column(texts):
+    return numbers(texts.str.replace(",", "", regex=False), INTEGER, "int64")
+
+
+def focal_len_column(texts):
+    return numbers(texts.str.replace("mm", "", regex=False), NUMBER, "float64")
+
+
+def aperture_column(texts):
+    return numbers(texts.str.replace("ƒ/", "", regex=False).str.replace("f/", "", regex=False), NUMBER, "float64")
+
+
+# fractions like 1/15s are divided out, a zero denominator is left for the field's parser to reject
+def shutter_speed_column(texts):
+    texts = texts.str.replace("s", "", regex=False)
+    fraction = texts.str.fullmatch(NUMBER + "/" + NUMBER).astype(bool)
+    plain = texts.str.fullmatch(NUMBER).astype(bool)
+    parts = texts.str.partition("/")
+    numerator = parts[0].where(fraction | plain, "0").astype("float64")
+    denominator = parts[2].where(fraction, "1").astype("float64")
+    fraction &= denominator != 0
+    return numerator / denominator.where(denominator != 0, 1.0), plain | fraction
+
+
+def iso_column(texts):
+    return numbers(texts, INTEGER, "int64")
+
+
+def dimensions_column(texts):
+    return texts.str.replace(" × ", ", ", regex=False), texts.notna()
+
+
+# column version of every parser of UnsplashScrapeExtract.FIELDS, each gives the parsed values and a mask of
+# the strings it could parse
+COLUMN_PARSERS = {
+    UnsplashScrapeExtract.parse_photographer: photographer_column,
+    UnsplashScrapeExtract.parse_count: count_column,
+    UnsplashScrapeExtract.parse_focal_len: focal_len_column,
+    UnsplashScrapeExtract.parse_aperture: aperture_column,
+    UnsplashScrapeExtract.parse_shutter_speed: shutter_speed_column,
+    UnsplashScrapeExtract.parse_iso: iso_column,
+    UnsplashScrapeExtract.parse_dimensions: dimensions_column
+}
+
+
+# parses the raw strings of a single field, texts is a column of strings and None
+# "--" and missing strings become missing values, like parse_fields they are counted in stats along with
+# the strings that cannot be parsed or lie outside the field's bounds
+# text that is kept as it is only has "--" taken out, a parsed field usually only has a few distinct strings
+# (cameras, apertures, ...) so each of them is parsed once and the column is put back together from their codes
+def normalize_column(texts, field, stats=None):
+    import numpy as np
+    import pandas as pd
+
+    index = texts.index
+    if field.parse is None:
+        if stats is not None and not field.optional and texts.isna().any():
+            stats.record(field.name, "missing", int(texts.isna().sum()))
+        return texts.astype(object).where(texts.notna() & (texts != "--"), None)
+
+    codes, uniques = pd.factorize(texts)
+    uniques = pd.Series(uniques, dtype=object).astype(str)
+    occurrences = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    if stats is not None and not field.optional and (codes < 0).any():
+        stats.record(field.name, "missing", int((codes < 0).sum()))
+
+    # one value per distinct string plus a missing value at the end, which the -1 code of missing strings picks
+    dtype = DTYPES[UnsplashScrapeStore.ARROW_TYPES[field.name]]
+    values = pd.Series([None] * (len(uniques) + 1), dtype=dtype)
+    texts = uniques[uniques != "--"]
+
+    # the common strings are parsed all at once, the rest one by one by the field's parser
+    if field.parse in COLUMN_PARSERS:
+        parsed, done = COLUMN_PARSERS[field.parse](texts)
+    else:
+        parsed, done = texts, texts.isna()
+    values[parsed.index[done]] = parsed[done]
+
+    invalid = []
+    for unique, text in texts[~done].items():
+        try:
+            value = field.parse(text)
+        except (ValueError, ZeroDivisionError, AttributeError):
+            invalid.append(unique)
+            continue
+        if dtype == "Int64" and not INT64_RANGE[0] <= value <= INT64_RANGE[1]:
+            invalid.append(unique)
+            continue
+        values[unique] = value
+    if stats is not None and invalid:
+        stats.record(field.name, "invalid", int(occurrences[invalid].sum()), uniques[invalid].tolist())
+
+    if stats is not None and field.bounds is not None:
+        low, high = field.bounds
+        known = values[:-1]
+        suspect = np.zeros(len(known), dtype=bool)
+        if low is not None:
+            suspect |= (known < low).fillna(False).to_numpy(dtype=bool)
+        if high is not None:
+            suspect |= (known > high).fillna(False).to_numpy(dtype=bool)
+        if suspect.any():
+            stats.record(field.name, "suspect", int(occurrences[suspect].sum()), uniques[suspect].tolist())
+    return pd.Series(values.take(codes).array, index=index)
+
+
+# turns a frame of raw strings (columns of RAW_COLUMNS) into a frame of rows (columns of COLUMNS)
+# every field that could not be found, parsed or only by a fallback selector is counted in stats
+def normalize_frame(raw, stats=None):
+    import pandas as pd
+
+    frame = pd.DataFrame(index=raw.index)
+    for column in ["img_page", "img_hvr_txt"]:
+        frame[column] = raw[column] if column in raw else None
+    for field in UnsplashScrapeExtract.FIELDS:
+        texts = raw[field.name] if field.name in raw else pd.Series(None, index=raw.index, dtype=object)
+        frame[field.name] = normalize_column(texts, field, stats)
+    frame["count"] = 1
+
+    if stats is not None and "fallbacks" in raw:
+        fallbacks = raw["fallbacks"].explode().dropna().value_counts()
+        for name, amount in fallbacks.items():
+            stats.record(name, "fallback", int(amount))
+    return frame[UnsplashScrapeStore.COLUMNS]
+
+
+# reads a raw .jsonl file as frames of raw strings, chunksize rows at a time
+# the lines are parsed by pyarrow's json reader when it is installed, several times faster than the json module
+def iter_raw(path, chunksize=UnsplashScrapeStore.CHUNK_ROWS):
+    import pandas as pd
+
+    if not path.lower().endswith(".jsonl"):
+        raise ValueError("Raw strings are kept in a .jsonl file: " + path)
+    try:
+        import pyarrow as pa
+        import pyarrow.json as pj
+    except ImportError:
+        pa = None
+
+    if pa is None:
+        batch = []
+        for row in UnsplashScrapeStore.iter_rows(path):
+            batch.append(row)
+            if len(batch) >= chunksize:
+                yield pd.DataFrame.from_records(batch, columns=UnsplashScrapeStore.RAW_COLUMNS)
+                batch = []
+        if batch:
+            yield pd.DataFrame.from_records(batch, columns=UnsplashScrapeStore.RAW_COLUMNS)
+        return
+
+    # the reader gives blocks of any size, they are cut into chunks of chunksize rows
+    schema = pa.schema([(column, pa.list_(pa.string()) if column == "fallbacks" else pa.string())
+                        for column in UnsplashScrapeStore.RAW_COLUMNS])
+    options = pj.ParseOptions(explicit_schema=schema, unexpected_field_behavior="ignore")
+    if os.path.getsize(path) == 0:
+        return
+    batches, rows = [], 0
+    for block in pj.open_json(path, parse_options=options):
+        batches.append(block)
+        rows += block.num_rows
+        while rows >= chunksize:
+            table = pa.Table.from_batches(batches, schema)
+            yield table.slice(0, chunksize).to_pandas()
+            batches, rows = table.slice(chunksize).to_batches(), rows - chunksize
+    if rows:
+        yield pa.Table.from_batches(batches, schema).to_pandas()
+
+
+# parses the raw strings kept by a crawl into output (any format a crawl can write) chunksize rows at a time,
+# the output is replaced and gets exactly the rows the crawl would have written with the current parsers
+# fields that could not be found or parsed are counted in stats and reported, returns the number of rows
+def normalize_file(raw="data/data.raw.jsonl", output="data/data.csv", chunksize=UnsplashScrapeStore.CHUNK_ROWS,
+                   stats=None):
+    stats = stats if stats is not None else UnsplashScrapeExtract.FieldStats()
+    written = 0
+    with UnsplashScrapeStore.open_sink(output) as sink:
+        for chunk in iter_raw(raw, chunksize):
+            sink.write_frame(normalize_frame(chunk, stats))
+            written += len(chunk)
+    print("Normalized " + str(written) + " row(s) from " + raw + " into " + output + ".")
+    stats.report()
+    return written
@@ -0,0 +1,600 @@
+"""
+UNSPLASH SCRAPE STORAGE
+
+Rows are written out one at a time while the crawl is running instead of being kept in memory until
+the end, so a crash only loses the page that was being scraped and memory use stays the same no matter
+how many photos are crawled.
+
+A crawl can also keep the raw strings of every photo page in a RawRow, written to a .jsonl file, so the rows
+can be parsed again later (see UnsplashScrapeNormalize) without crawling the pages again.
+
+Every photo is held in a PhotoRow and handed to a sink, the sink is picked by the output file's extension:
+ - .csv - CSV file, the same layout as the original data/data.csv
+ - .jsonl - one JSON object per line
+ - .parquet - Parquet file written in batches (needs pyarrow)
+ - .arrow / .feather - Arrow IPC file written in batches (needs pyarrow)
+
+For analysis the rows are loaded as a typed dataset (load_dataset), every column has a declared dtype,
+the camera and photographer columns are categoricals and the resolution is split into integer width and
+height columns. The typed dataset is saved as Parquet or Feather so later sessions can reload it without
+parsing and converting the csv again.
+
+Datasets that do not fit in memory can be streamed instead (iter_chunks), as typed datasets of a fixed
+number of rows read one after another from any of the formats.
+
+Crawls can be resumed through a Checkpoint, a small sqlite database that remembers the urls found on
+the landing page and which of them have already been written to the output.
+
+Distributed crawls share a WorkQueue, a sqlite database on a filesystem every node can reach. The
+coordinator publishes the discovered urls to it, workers claim them with leases and store their rows in it,
+and a lease that runs out (e.g. because its worker died) is handed to the next worker that asks.
+"""
+
+# necessary imports
+import os
+import csv
+import json
+import time
+import sqlite3
+import threading
+
+# columns of the dataset, in output order
+COLUMNS = ["img_page", "img_hvr_txt", "photographer", "img_url", "location", "summary", "views", "downloads",
+           "camera_make", "camera_model", "focal_len", "aperture", "shutter_speed", "iso", "img_resolution",
+           "count"]
+
+# columns of the raw strings a crawl can keep, the columns of a row before parsing along with the fields that
+# were only found by a fallback selector
+RAW_COLUMNS = COLUMNS[:-1] + ["fallbacks"]
+
+# columns of the metrics history written by refresh runs, one row per photo per run
+HISTORY_COLUMNS = ["img_page", "scraped_at", "views", "downloads"]
+
+# arrow type of every column, used by the parquet and arrow sinks
+ARROW_TYPES = {
+    "img_page": "string", "img_hvr_txt": "string", "photographer": "string", "img_url": "string",
+    "location": "string", "summary": "string", "views": "int64", "downloads": "int64", "camera_make": "string",
+    "camera_model": "string", "focal_len": "float64", "aperture": "float64", "shutter_speed": "float64",
+    "iso": "int64", "img_resolution": "string", "count": "int64"
+}
+
+# columns of the typed dataset used for analysis, img_resolution is split into img_width and img_height
+DATASET_COLUMNS = ["img_page", "img_hvr_txt", "photographer", "img_url", "location", "summary", "views", "downloads",
+                   "camera_make", "camera_model", "focal_len", "aperture", "shutter_speed", "iso", "img_width",
+                   "img_height", "count"]
+
+# columns that hold text, read as text by iter_chunks even when every value of a chunk looks like a number
+TEXT_COLUMNS = [column for column, kind in ARROW_TYPES.items() if kind == "string"]
+
+# rows iter_chunks reads at a time by default
+CHUNK_ROWS = 100000
+
+# seconds a worker may hold a task of a WorkQueue, and times a task is handed out before it is given up on
+LEASE = 120.0
+ATTEMPTS = 3
+
+# pandas dtype of every column of the typed dataset, the capitalized ints allow missing values
+DATASET_DTYPES = {
+    "img_page": "string", "img_hvr_txt": "string", "photographer": "category", "img_url": "string",
+    "location": "string", "summary": "string", "views": "Int64", "downloads": "Int64", "camera_make": "category",
+    "camera_model": "category", "focal_len": "float64", "aperture": "float64", "shutter_speed": "float64",
+    "iso": "Int32", "img_width": "Int32", "img_height": "Int32", "count": "int64"
+}
+
+
+# a single scraped photo, slots keep every row small and make a forgotten column impossible
+class PhotoRow:
+    __slots__ = COLUMNS
+
+    def __init__(self, **values):
+        for column in COLUMNS:
+            setattr(self, column, values.get(column))
+
+    def as_dict(self):
+        return {column: getattr(self, column) for column in COLUMNS}
+
+    def as_list(self):
+        return [getattr(self, column) for column in COLUMNS]
+
+
+# raw strings of a single photo page, as collected from the page
+class RawRow:
+    __slots__ = RAW_COLUMNS
+
+    def __init__(self, **values):
+        for column in RAW_COLUMNS:
+            setattr(self, column, values.get(column))
+
+    def as_dict(self):
+        return {column: getattr(self, column) for column in RAW_COLUMNS}
+
+    def as_list(self):
+        return [getattr(self, column) for column in RAW_COLUMNS]
+
+
+# views and downloads of a photo at one point in time
+class MetricRow:
+    __slots__ = HISTORY_COLUMNS
+
+    def __init__(self, **values):
+        for column in HISTORY_COLUMNS:
+            setattr(self, column, values.get(column))
+
+    def as_dict(self):
+        return {column: getattr(self, column) for column in HISTORY_COLUMNS}
+
+    def as_list(self):
+        return [getattr(self, column) for column in HISTORY_COLUMNS]
+
+
+# the rows of a frame of COLUMNS as PhotoRows holding plain python values, missing values as None
+def frame_rows(frame):
+    values = [frame[column].astype(object).where(frame[column].notna(), None).tolist() for column in COLUMNS]
+    for row in zip(*values):
+        yield PhotoRow(**dict(zip(COLUMNS, row)))
+
+
+# appends rows to a csv file, flushing after every row
+# without append an existing file is replaced, with append new rows are added after the old ones
+# write_frame writes a whole frame of rows at once, laid out exactly like the same rows written one by one
+class CsvSink:
+    def __init__(self, path, append=False, columns=COLUMNS):
+        self.path = path
+        self.columns = columns
+        new_file = not append or not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "a" if append else "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        if new_file:
+            self.writer.writerow(columns)
+            self.file.flush()
+
+    def write(self, row):
+        self.writer.writerow(["" if val is None else val for val in row.as_list()])
+        self.file.flush()
+
+    def write_frame(self, frame):
+        frame[self.columns].to_csv(self.file, header=False, index=False, na_rep="", lineterminator="\r\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# appends rows to a json lines file, flushing after every row
+class JsonlSink:
+    def __init__(self, path, append=False):
+        self.path = path
+        self.file = open(path, "a" if append else "w", encoding="utf-8")
+
+    def write(self, row):
+        self.file.write(json.dumps(row.as_dict(), ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    def write_frame(self, frame):
+        self.file.writelines(json.dumps(row.as_dict(), ensure_ascii=False) + "\n" for row in frame_rows(frame))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# writes rows to a parquet or arrow file in batches of batch_size rows
+# only one batch is ever held in memory, at most one batch is lost if the crawl crashes
+# neither format can be appended to so an existing file is always replaced
+class ArrowSink:
+    def __init__(self, path, batch_size=100, file_format="parquet"):
+        import pyarrow as pa
+
+        self.pa = pa
+        self.path = path
+        self.batch_size = batch_size
+        self.schema = pa.schema([(column, getattr(pa, ARROW_TYPES[column])()) for column in COLUMNS])
+        self.batch = []
+
+        if file_format == "parquet":
+            import pyarrow.parquet as pq
+            self.writer = pq.ParquetWriter(path, self.schema)
+        else:
+            import pyarrow.ipc as ipc
+            self.sink = pa.OSFile(path, "wb")
+            self.writer = ipc.new_file(self.sink, self.schema)
+
+    def write(self, row):
+        self.batch.append(row)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    # turns the buffered rows into a record batch and writes it out
+    def flush(self):
+        if not self.batch:
+            return
+        arrays = [self.pa.array([getattr(row, column) for row in self.batch], type=self.schema.field(column).type)
+                  for column in COLUMNS]
+        self.writer.write_batch(self.pa.record_batch(arrays, schema=self.schema))
+        self.batch = []
+
+    # writes a whole frame of rows at once, after the rows that are still buffered
+    def write_frame(self, frame):
+        self.flush()
+        self.writer.write_table(self.pa.Table.from_pandas(frame[COLUMNS], schema=self.schema, preserve_index=False))
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+        if hasattr(self, "sink"):
+            self.sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# only the row based formats can be added to after they have been closed, needed for resuming crawls
+def can_append(path):
+    return os.path.splitext(path)[1].lower() in [".csv", ".jsonl"]
+
+
+# creates the sink that matches the extension of path
+# columns is only needed for csv files, which start with a header
+def open_sink(path, append=False, columns=COLUMNS):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return CsvSink(path, append, columns)
+    elif ext == ".jsonl":
+        return JsonlSink(path, append)
+    elif ext == ".parquet":
+        return ArrowSink(path, file_format="parquet")
+    elif ext in [".arrow", ".feather"]:
+        return ArrowSink(path, file_format="arrow")
+    raise ValueError("Unsupported output format: " + path)
+
+
+# loads a file written by any of the sinks into a DataFrame
+def load_frame(path):
+    import pandas as pd
+
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return pd.read_csv(path)
+    elif ext == ".jsonl":
+        return pd.read_json(path, lines=True)
+    elif ext == ".parquet":
+        return pd.read_parquet(path)
+    elif ext in [".arrow", ".feather"]:
+        return pd.read_feather(path)
+    raise ValueError("Unsupported output format: " + path)
+
+
+# turns a frame of rows as written by the sinks into the typed dataset
+# "6000, 4000" resolutions become img_width 6000 and img_height 4000, columns that already have
+# their declared dtype are left alone so a typed frame passes through without being copied again
+def typed_frame(df):
+    import pandas as pd
+
+    if "img_resolution" in df.columns:
+        size = df["img_resolution"].astype("string").str.extract(r"(\d+), (\d+)")
+        df = df.assign(img_width=pd.to_numeric(size[0]), img_height=pd.to_numeric(size[1]))
+    if list(df.columns) != DATASET_COLUMNS:
+        df = df.reindex(columns=DATASET_COLUMNS)
+    changed = {column: dtype for column, dtype in DATASET_DTYPES.items() if str(df[column].dtype) != dtype}
+    if changed:
+        df = df.astype(changed)
+    return df
+
+
+# saves a frame as a typed dataset, .parquet or .feather/.arrow (needs pyarrow)
+# both formats keep the dtypes, categoricals included, so nothing has to be converted on load
+def save_dataset(df, path):
+    df = typed_frame(df)
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".parquet":
+        df.to_parquet(path, index=False)
+    elif ext in [".arrow", ".feather"]:
+        df.to_feather(path)
+    else:
+        raise ValueError("Unsupported dataset format: " + path)
+    return df
+
+
+# path of the typed copy that load_dataset keeps next to a source file
+def dataset_cache_path(path):
+    return os.path.splitext(path)[0] + ".typed.parquet"
+
+
+# loads any output file as a typed dataset
+# datasets written by save_dataset are read as they are, anything else (csv, jsonl, or a crawl's own parquet
+# or arrow output) is converted, with cache the converted dataset is saved next to the source and reused
+# until the source changes. without pyarrow the source is simply converted every time
+def load_dataset(path, cache=True):
+    typed_path = dataset_cache_path(path)
+    if cache and os.path.exists(typed_path) and os.path.getmtime(typed_path) >= os.path.getmtime(path):
+        return typed_frame(load_frame(typed_path))
+
+    df = load_frame(path)
+    if "img_resolution" not in df.columns:
+        # already a typed dataset
+        return typed_frame(df)
+
+    df = typed_frame(df)
+    if cache:
+        try:
+            save_dataset(df, typed_path)
+        except ImportError:
+            pass
+    return df
+
+
+# streams any output file as typed datasets of at most chunksize rows, so only one chunk is ever in memory
+# a typed copy saved by load_dataset is read instead of the source as long as it is up to date
+def iter_chunks(path, chunksize=CHUNK_ROWS, cache=True):
+    import pandas as pd
+
+    typed_path = dataset_cache_path(path)
+    if cache and os.path.exists(typed_path) and os.path.getmtime(typed_path) >= os.path.getmtime(path):
+        path = typed_path
+
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        with pd.read_csv(path, chunksize=chunksize, dtype={column: object for column in TEXT_COLUMNS}) as reader:
+            for df in reader:
+                yield typed_frame(df)
+    elif ext == ".jsonl":
+        with pd.read_json(path, lines=True, chunksize=chunksize) as reader:
+            for df in reader:
+                yield typed_frame(df)
+    elif ext == ".parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield typed_frame(batch.to_pandas())
+    elif ext in [".arrow", ".feather"]:
+        import pyarrow as pa
+
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                for start in range(0, batch.num_rows, chunksize):
+                    yield typed_frame(batch.slice(start, chunksize).to_pandas())
+    else:
+        raise ValueError("Unsupported input format: " + path)
+
+
+# streams the rows of a csv or jsonl file as dicts without loading the whole file
+# csv values come back as strings, empty cells as None
+def iter_rows(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        with open(path, newline="", encoding="utf-8") as file:
+            for row in csv.DictReader(file):
+                yield {key: (None if val == "" else val) for key, val in row.items()}
+    elif ext == ".jsonl":
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        raise ValueError("Unsupported input format: " + path)
+
+
+# puts rows that finish out of order back in order before they reach the sink
+# rows are written as soon as every row before them has been written, so only the rows that
+# finished early are ever held in memory
+# done holds positions that will never arrive (already written by an earlier run), on_write(row) is
+# called after each row reaches the sink, a sink of None only calls on_write
+class OrderedWriter:
+    def __init__(self, sink, first=0, done=(), on_write=None):
+        self.sink = sink
+        self.next = first
+        self.done = set(done)
+        self.on_write = on_write
+        self.waiting = {}
+        self.lock = threading.Lock()
+
+    def put(self, pos, row):
+        with self.lock:
+            self.waiting[pos] = row
+            while self.next in self.waiting or self.next in self.done:
+                if self.next in self.waiting:
+                    self.write(self.waiting.pop(self.next))
+                self.next += 1
+
+    def write(self, row):
+        if self.sink is not None:
+            self.sink.write(row)
+        if self.on_write is not None:
+            self.on_write(row)
+
+    # writes whatever is still waiting, used when a crawl stops early so finished rows are not lost
+    # keep(row) is given the waiting rows instead, e.g. Checkpoint.keep so a resumed crawl writes them once the
+    # rows before them are scraped rather than the missing rows ending up after them
+    def close(self, keep=None):
+        with self.lock:
+            for pos in sorted(self.waiting):
+                row = self.waiting.pop(pos)
+                if keep is not None:
+                    keep(row)
+                else:
+                    self.write(row)
+
+
+# sqlite checkpoint of a crawl
+# frontier holds every url found on the landing page in order along with its hover text, done holds the
+# urls whose rows have reached the output and waiting the rows that were finished but still waited for an
+# earlier row when the crawl stopped. a checkpoint belongs to one site and output file, opening it for
+# anything else starts it over
+class Checkpoint:
+    def __init__(self, path, base, output):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS frontier (pos INTEGER PRIMARY KEY, url TEXT, hover TEXT)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS done (url TEXT PRIMARY KEY)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS waiting (url TEXT PRIMARY KEY, row TEXT)")
+
+        owner = dict(self.conn.execute("SELECT key, value FROM meta").fetchall())
+        if owner.get("base") != base or owner.get("output") != output:
+            self.clear()
+            with self.conn:
+                self.conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                                      [("base", base), ("output", output)])
+        self.conn.commit()
+
+    # (position, url, hover text) of every discovered url, in landing page order
+    def frontier(self):
+        with self.lock:
+            return self.conn.execute("SELECT pos, url, hover FROM frontier ORDER BY pos").fetchall()
+
+    # replaces the frontier with a fresh discovery, the done urls are kept
+    def set_frontier(self, pages):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM frontier")
+            self.conn.executemany("INSERT INTO frontier VALUES (?, ?, ?)", pages)
+
+    def done_urls(self):
+        with self.lock:
+            return set(url for url, in self.conn.execute("SELECT url FROM done"))
+
+    # records that a row is safely in the output, committed straight away so a crash cannot lose it
+    def mark_done(self, row):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO done VALUES (?)", (row.img_page,))
+
+    # holds a finished row (a RawRow) that could not be written yet since a row before it is missing
+    def keep(self, row):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO waiting VALUES (?, ?)",
+                              (row.img_page, json.dumps(row.as_dict(), ensure_ascii=False)))
+
+    # url -> RawRow of every row held by keep that has not reached the output yet
+    def waiting(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT row FROM waiting WHERE url NOT IN (SELECT url FROM done)").fetchall()
+        rows = [RawRow(**json.loads(row)) for row, in rows]
+        return {row.img_page: row for row in rows}
+
+    def clear(self):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM frontier")
+            self.conn.execute("DELETE FROM done")
+            self.conn.execute("DELETE FROM waiting")
+
+    def close(self):
+        self.conn.close()
+
+
+# sqlite work queue shared by the coordinator and workers of a distributed crawl
+# every task is a discovered photo page, a claimed task is leased to one worker for `lease` seconds and is
+# handed out again once the lease runs out without the task being completed, tasks that failed or were leased
+# `attempts` times are given up on. finished rows are stored in the same database
+# lease and attempts are stored in the queue by whoever opens it with them (the coordinator), a queue opened
+# without them (a worker) uses the stored ones, or the defaults while nothing is stored yet
+# the default rollback journal is used since sqlite's WAL mode does not work over network filesystems
+class WorkQueue:
+    def __init__(self, path, lease=None, attempts=None):
+        self.path = path
+        self.lease = LEASE
+        self.attempts = ATTEMPTS
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute("CREATE TABLE IF NOT EXISTS tasks (pos INTEGER PRIMARY KEY, url TEXT UNIQUE, hover TEXT, "
+                          "state TEXT DEFAULT 'todo', owner TEXT, expires REAL, attempts INTEGER DEFAULT 0)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS results (pos INTEGER PRIMARY KEY, row TEXT)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, expires)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        settings = [(key, str(value)) for key, value in [("lease", lease), ("attempts", attempts)] if value is not None]
+        self.conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", settings)
+        self.load_settings()
+
+    # reads the lease and attempts stored in the queue, a worker started before the coordinator stored them
+    # picks them up on its next claim
+    def load_settings(self):
+        settings = dict(self.conn.execute("SELECT key, value FROM meta").fetchall())
+        self.lease = float(settings.get("lease", LEASE))
+        self.attempts = int(settings.get("attempts", ATTEMPTS))
+
+    # adds (position, url, hover text) tasks, urls that are already queued are left alone
+    def publish(self, pages):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.executemany("INSERT OR IGNORE INTO tasks (pos, url, hover) VALUES (?, ?, ?)", pages)
+            self.conn.execute("COMMIT")
+
+    # leases up to count tasks to worker and returns their (position, url, hover text)
+    # tasks nobody has claimed come first, then tasks whose lease ran out. a task whose lease ran out after its
+    # last attempt is given up on instead of being handed out again
+    def claim(self, worker, count=1):
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.load_settings()
+                self.conn.execute("UPDATE tasks SET state = 'failed', owner = NULL, expires = NULL "
+                                  "WHERE state = 'leased' AND expires < ? AND attempts >= ?", (now, self.attempts))
+                tasks = self.conn.execute(
+                    "SELECT pos, url, hover FROM tasks WHERE state = 'todo' OR (state = 'leased' AND expires < ?) "
+                    "ORDER BY state DESC, pos LIMIT ?", (now, count)).fetchall()
+                self.conn.executemany("UPDATE tasks SET state = 'leased', owner = ?, expires = ?, "
+                                      "attempts = attempts + 1 WHERE pos = ?",
+                                      [(worker, now + self.lease, pos) for pos, url, hover in tasks])
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return tasks
+
+    # stores the row of a finished task, a task finished twice (its lease ran out while it was being worked on)
+    # keeps the first row
+    def complete(self, pos, row):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.execute("INSERT OR IGNORE INTO results VALUES (?, ?)",
+                              (pos, json.dumps(row.as_dict(), ensure_ascii=False)))
+            self.conn.execute("UPDATE tasks SET state = 'done', owner = NULL, expires = NULL WHERE pos = ?", (pos,))
+            self.conn.execute("COMMIT")
+
+    # hands a task worker could not extract back to the queue, or gives up on it after `attempts` tries
+    # nothing happens if the lease already ran out and the task belongs to someone else now
+    def fail(self, worker, pos):
+        with self.lock:
+            self.load_settings()
+            self.conn.execute("UPDATE tasks SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'todo' END, "
+                              "owner = NULL, expires = NULL WHERE pos = ? AND state = 'leased' AND owner = ?",
+                              (self.attempts, pos, worker))
+
+    # number of tasks in every state
+    def counts(self):
+        with self.lock:
+            counts = dict(self.conn.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state").fetchall())
+        return {state: counts.get(state, 0) for state in ["todo", "leased", "done", "failed"]}
+
+    # true while any task is still waiting for or being worked on by a worker
+    def pending(self):
+        counts = self.counts()
+        return counts["todo"] + counts["leased"] > 0
+
+    # finished rows as dicts, in landing page order
+    def rows(self):
+        with self.lock:
+            results = self.conn.execute("SELECT row FROM results ORDER BY pos").fetchall()
+        for row, in results:
+            yield json.loads(row)
+
+    def close(self):
+        self.conn.close()
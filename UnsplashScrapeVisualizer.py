@@ -35,26 +35,35 @@ Additional features include
 """
 
 # necessary imports
-import UnsplashScrape
+# selenium (through UnsplashScrape), matplotlib and numpy are only imported by the code that needs them, so
+# analyzing an existing csv never loads the crawler and the menu comes up without waiting on matplotlib
+import UnsplashScrapeAnalysis
+import time
+import hashlib
 import datetime
-import matplotlib.ticker as mtick
-import numpy as np
-import matplotlib.pyplot as plt
-import webbrowser
 import warnings
-import pandas as pd
+
+
+# imports pyplot the first time a chart is drawn
+# charts are only ever saved to png, the non-interactive backend avoids a gui and works in worker processes
+def pyplot():
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
 
 
 # this function will get the top 10 users by view and display them on a bar graph so they are easy to compare
-def top_photographer(df):
-    # remove add (at time until better method is found)
-    df = df[df.photographer != "ballparkbrand"]
-    # create data frame that sums total views and orders it from highest to lowest
-    new_df = df.groupby(by=["photographer"], as_index=False)["views"].sum()
-    new_df = new_df.sort_values(by=["views"], ascending=False, na_position='last')
+# exclude is a list of accounts to leave out, UnsplashScrapeAnalysis.excluded_accounts() by default
+def top_photographer(results, exclude=None):
+    import numpy as np
+    import matplotlib.ticker as mtick
+
+    plt = pyplot()
 
-    # get first 10 rows
-    new_df = new_df.head(10)
+    # first 10 rows without the excluded accounts (ads), the totals are already ordered from highest to lowest views
+    new_df = results.top_photographers(10, exclude)
 
     # create plot and title it
     fig, ax = plt.subplots()
@@ -63,14 +72,14 @@ def top_photographer(df):
     plt.ylabel("Views")
 
     # bar plot using each user as category
-    ax.bar(new_df["photographer"].tolist(), new_df["views"], width=0.5, align="center", color='r')
+    ax.bar(new_df["photographer"].astype(str).tolist(), new_df["views"], width=0.5, align="center", color='r')
 
     # set ticks and limits
     ymin, ymax = ax.get_ylim()
     ax.yaxis.set_ticks(np.arange(0, ymax+1000000, 1000000.0))
     ax.yaxis.set_major_formatter(mtick.FormatStrFormatter("%.0e"))
-    ax.xaxis.set_ticks(new_df["photographer"])
-    ax.set_xticklabels(new_df["photographer"], ha='right', rotation=45)
+    ax.xaxis.set_ticks(new_df["photographer"].astype(str))
+    ax.set_xticklabels(new_df["photographer"].astype(str), ha='right', rotation=45)
 
     for tick in ax.xaxis.get_minor_ticks():
         tick.tick1line.set_markersize(0)
@@ -79,82 +88,104 @@ def top_photographer(df):
 
     # output as png
     fig.savefig("data/top_photographers.png", bbox_inches="tight")
+    plt.close(fig)
+    return ["data/top_photographers.png"]
 
 
 # this function will create several subplots that show the average views and downloads of models of cameras
-def avg_make_model(df):
-    # cull empty value
-    df = df[df['camera_make'].notna()]
-    df = df[df['camera_model'].notna()]
-
-    # sum up views downloads and count by each camera model
-    new_df = df.groupby(['camera_make', 'camera_model'])["views", "downloads", "count"]\
-        .apply(lambda x: x.astype(int).sum()).reset_index()
-
-    # get average of views and downloads
-    new_df['views'] = np.where(new_df['count'] < 1, new_df['count'], new_df['views'] / new_df['count'])
-    new_df['downloads'] = np.where(new_df['count'] < 1, new_df['count'], new_df['downloads'] / new_df['count'])
-
-    # get unique camera makes to make it easier to iterate over
-    camera_makes = new_df.camera_make.unique()
-
-    for make in camera_makes:
-        # create subplots
-        fig, ax = plt.subplots(2)
-        fig.tight_layout()
-        fig.subplots_adjust(hspace=1.0)
-
-        # create new df for only that specific make
-        make_df = new_df[new_df['camera_make'] == make]
-
-        # create bar graph that shows average views of each model
-        ax[0].bar(make_df['camera_model'], make_df['views'], width=0.1, align='center', color='b')
-
-        # set ticks and limits
-        ax[0].set_xticklabels(make_df['camera_model'], ha='right', rotation=45)
-        ax[0].set_ylim(0, make_df["views"].max()+100)
-        ax[0].yaxis.set_ticks([0, round(((make_df["views"].max() + (make_df["views"].max() / 10)) / 2)),
-                               make_df["views"].max() + (make_df["views"].max() / 10)])
-        ax[0].yaxis.set_major_formatter(mtick.FormatStrFormatter("%.0e"))
-
-        # create bar graph that shows average downloads of each model
-        ax[1].bar(make_df['camera_model'], make_df['downloads'], width=0.1, align='center', color='r')
-        ax[1].set_xticklabels(make_df['camera_model'], ha='right', rotation=45)
-        ax[1].set_ylim(0, make_df["downloads"].max() + 100)
-        ax[1].yaxis.set_ticks([0, round(((make_df["downloads"].max() + (make_df["downloads"].max() / 10)) / 2)),
-                               make_df["downloads"].max() + (make_df["downloads"].max() / 10)])
-
-        # set titles and labels
-        ax[0].set_ylabel("Views")
-        ax[1].set_ylabel("Downloads")
-        ax[0].set_title("Total Views and Downloads for " + make + " cameras on " +
-                        datetime.date.today().strftime("%B %d, %Y") + "\n")
-
-        # output plot to png
-        fig.savefig("data/" + make + "_avg_views_dls.png", bbox_inches="tight")
+# every make is a chart of its own, the charts are drawn in parallel by a pool of `workers` processes
+# (defaults to the number of cpus), with a cache only the makes whose numbers changed are drawn again
+def avg_make_model(results, cache=None, workers=None):
+    # average views and downloads of each camera model, models without a make or model are already left out
+    new_df = results.make_model
+    today = datetime.date.today().isoformat()
+
+    # charts of makes that are unchanged are taken from the cache, the rest are drawn
+    paths = {}
+    jobs = []
+    for make, make_df in new_df.groupby("camera_make", observed=True, sort=True):
+        make_df = make_df[["camera_model", "avg_views", "avg_downloads"]].reset_index(drop=True)
+        digest = UnsplashScrapeAnalysis.frame_digest(make_df) + "-" + today
+        restored = cache.restore("make-" + str(make), digest) if cache is not None else None
+        if restored is not None:
+            paths[make] = restored[0]
+        else:
+            jobs.append((str(make), make_df, digest))
 
+    for (make, make_df, digest), path in zip(jobs, render_parallel(render_make, [job[0:2] for job in jobs], workers)):
+        paths[make] = path
+        if cache is not None:
+            cache.store("make-" + make, digest, [path])
+    return [paths[make] for make in sorted(paths, key=str)]
 
-# this function will show line graphs that can be used to interpret the distribution of camera settings
-def most_used_qual(df):
-    # gets rid of lines that are missing a certain setting
-    focal_len_df = df[df['focal_len'].notna()]
-    aperture_df = df[df['aperture'].notna()]
-    shutter_speed_df = df[df['shutter_speed'].notna()]
-    iso_df = df[df['iso'].notna()]
 
-    # get totals of all sub data frames and sort them so that matplotlib interprets them correctly
+# draws the average views and downloads chart of a single camera make and returns where it was saved
+# runs in a worker process, the figure is closed as soon as it is saved so memory does not build up
+def render_make(make, make_df):
+    import matplotlib.ticker as mtick
+
+    plt = pyplot()
+
+    # create subplots
+    fig, ax = plt.subplots(2)
+    fig.tight_layout()
+    fig.subplots_adjust(hspace=1.0)
+    models = make_df['camera_model'].astype(str)
 
-    focal_len_df = focal_len_df.groupby(["focal_len"])['count'].apply(lambda x: x.astype(float).sum()).reset_index()\
-        .sort_values(['focal_len'], ascending=False)
+    # create bar graph that shows average views of each model
+    ax[0].bar(models, make_df['avg_views'], width=0.1, align='center', color='b')
+
+    # set ticks and limits
+    ax[0].set_xticks(range(len(models)))
+    ax[0].set_xticklabels(models, ha='right', rotation=45)
+    ax[0].set_ylim(0, make_df["avg_views"].max()+100)
+    ax[0].yaxis.set_ticks([0, round(((make_df["avg_views"].max() + (make_df["avg_views"].max() / 10)) / 2)),
+                           make_df["avg_views"].max() + (make_df["avg_views"].max() / 10)])
+    ax[0].yaxis.set_major_formatter(mtick.FormatStrFormatter("%.0e"))
+
+    # create bar graph that shows average downloads of each model
+    ax[1].bar(models, make_df['avg_downloads'], width=0.1, align='center', color='r')
+    ax[1].set_xticks(range(len(models)))
+    ax[1].set_xticklabels(models, ha='right', rotation=45)
+    ax[1].set_ylim(0, make_df["avg_downloads"].max() + 100)
+    ax[1].yaxis.set_ticks([0, round(((make_df["avg_downloads"].max() + (make_df["avg_downloads"].max() / 10)) / 2)),
+                           make_df["avg_downloads"].max() + (make_df["avg_downloads"].max() / 10)])
+
+    # set titles and labels
+    ax[0].set_ylabel("Views")
+    ax[1].set_ylabel("Downloads")
+    ax[0].set_title("Total Views and Downloads for " + make + " cameras on " +
+                    datetime.date.today().strftime("%B %d, %Y") + "\n")
+
+    # output plot to png
+    path = "data/" + make + "_avg_views_dls.png"
+    fig.savefig(path, bbox_inches="tight")
+    plt.close(fig)
+    return path
+
+
+# calls func with every tuple of arguments in jobs and returns the results in order
+# more than one job is spread over a pool of processes, matplotlib is not thread safe and the drawing
+# is cpu bound so processes are used rather than threads
+def render_parallel(func, jobs, workers=None):
+    from concurrent.futures import ProcessPoolExecutor
+
+    if len(jobs) < 2 or workers == 1:
+        return [func(*job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, *zip(*jobs)))
 
-    aperture_df = aperture_df.groupby(["aperture"])['count'].apply(lambda x: x.astype(float).sum()).reset_index()\
-        .sort_values(['aperture'], ascending=False)
 
-    shutter_speed_df = shutter_speed_df.groupby(["shutter_speed"])['count'].apply(lambda x: x.astype(float).sum())\
-        .reset_index().sort_values(['shutter_speed'], ascending=False)
+# this function will show line graphs that can be used to interpret the distribution of camera settings
+def most_used_qual(results):
+    plt = pyplot()
 
-    iso_df = iso_df.groupby(["iso"])['count'].apply(lambda x: x.astype(int).sum()).reset_index()\
-        .sort_values(['iso'], ascending=False)
+    # totals of every setting, photos missing a setting are left out and values are sorted so that
+    # matplotlib interprets them correctly
+    focal_len_df = results.settings["focal_len"]
+    aperture_df = results.settings["aperture"]
+    shutter_speed_df = results.settings["shutter_speed"]
+    iso_df = results.settings["iso"]
 
     # create figures and subplots, adjust spacing
     fig, ax = plt.subplots(4)
@@ -173,77 +204,61 @@ def most_used_qual(df):
     ax[2].set_xlabel("Shutter Speed (seconds)")
     ax[2].set_xscale('log')
 
-    ax[3].plot(iso_df['iso'], iso_df['count'], color='b')
+    ax[3].plot(iso_df['iso'].astype(float), iso_df['count'], color='b')
     ax[3].set_xlabel("ISO")
 
     ax[0].set_title("Most used camera settings as of " + datetime.date.today().strftime("%B %d, %Y"))
 
     # output subplots to single png
     fig.savefig("data/camera_settings.png", bbox_inches="tight")
+    plt.close(fig)
+    return ["data/camera_settings.png"]
 
 
 # this method will open the most viewed image in a new browser tab, or window if browser is not already open
-def most_pop_img(df):
-    df.sort_values(['views'], ascending=False)
-    webbrowser.open_new_tab(df['img_page'].iloc[0])
+def most_pop_img(results):
+    import webbrowser
+
+    webbrowser.open_new_tab(results.most_viewed)
 
 
 # this function will build the perfect camera based of averages on views for make, model, and possible settings
 # make and model are grouped together as it would be weird to have a model that doesnt match its corresponding make
-def perf_cam(df):
-    # create sub frames and remove rows that are missing values for specified setting
-    make_model_df = df[df['camera_make'].notna()]
-    make_model_df = make_model_df[make_model_df['camera_model'].notna()]
-    focal_len_df = df[df['focal_len'].notna()]
-    aperture_df = df[df['aperture'].notna()]
-    shutter_speed_df = df[df['shutter_speed'].notna()]
-    iso_df = df[df['iso'].notna()]
-
-    # group and sum sub frames and sort the indices in order to find the setting that matches the highest average views
-
-    make_model_df = df.groupby(['camera_make', 'camera_model'])["views", "count"] \
-        .apply(lambda x: x.astype(int).sum()).reset_index()
-    make_model_df['views'] = np.where(make_model_df['count'] < 1, make_model_df['count'],
-                                      make_model_df['views'] / make_model_df['count'])
-    make_model_df = make_model_df.sort_values(['views'], ascending=False)
-    perf_make = make_model_df['camera_make'].iloc[0]
-    perf_model = make_model_df['camera_model'].iloc[0]
-
-    focal_len_df = focal_len_df.groupby(["focal_len"])['views', 'count'].apply(
-        lambda x: x.astype(float).sum()).reset_index()
-    focal_len_df['views'] = np.where(focal_len_df['count'] < 1, focal_len_df['count'],
-                                     focal_len_df['views'] / focal_len_df['count'])
-    focal_len_df = focal_len_df.sort_values(['views'], ascending=False)
-    perf_focal_len = focal_len_df['focal_len'].iloc[0]
-
-    aperture_df = aperture_df.groupby(["aperture"])['views', 'count'].apply(lambda x: x.astype(float).sum())\
-        .reset_index()
-    aperture_df['views'] = np.where(aperture_df['count'] < 1, aperture_df['count'],
-                                    aperture_df['views'] / aperture_df['count'])
-    aperture_df = aperture_df.sort_values(['views'], ascending=False)
-    perf_aperture = aperture_df['aperture'].iloc[0]
-
-    shutter_speed_df = shutter_speed_df.groupby(["shutter_speed"])['views', 'count'].apply(
-        lambda x: x.astype(float).sum()).reset_index()
-    shutter_speed_df['views'] = np.where(shutter_speed_df['count'] < 1, shutter_speed_df['count'],
-                                         shutter_speed_df['views'] / shutter_speed_df['count'])
-    shutter_speed_df = shutter_speed_df.sort_values(['views'], ascending=False)
-    perf_shutter_speed = shutter_speed_df['shutter_speed'].iloc[0]
-
-    iso_df = iso_df.groupby(["iso"])['views', 'count'].apply(lambda x: x.astype(int).sum()).reset_index()
-    iso_df['views'] = np.where(iso_df['count'] < 1, iso_df['count'],
-                               iso_df['views'] / iso_df['count'])
-    iso_df = iso_df.sort_values(['views'], ascending=False)
-    perf_iso = iso_df['iso'].iloc[0]
+def perf_cam(results):
+    camera = results.perfect_camera()
 
     # output a table showing 'perfect' camera
     print("The perfect camera as of " + datetime.date.today().strftime("%B %d, %Y") + "\n" +
-          "Make: " + perf_make +
-          "\nModel: " + perf_model +
-          "\nFocal Length: " + str(perf_focal_len) + "mm" +
-          "\nAperture: ƒ/" + str(perf_aperture) +
-          "\nShutter Speed: " + str(perf_shutter_speed) + " seconds" +
-          "\nISO: " + str(perf_iso) + "\n")
+          "Make: " + str(camera["camera_make"]) +
+          "\nModel: " + str(camera["camera_model"]) +
+          "\nFocal Length: " + str(camera["focal_len"]) + "mm" +
+          "\nAperture: ƒ/" + str(camera["aperture"]) +
+          "\nShutter Speed: " + str(camera["shutter_speed"]) + " seconds" +
+          "\nISO: " + str(camera["iso"]) + "\n")
+
+
+# charts the menu can draw, name -> (part of the aggregates it is drawn from, columns it plots,
+# function that draws it from the aggregates and the cache)
+CHARTS = {
+    "top_photographer": ("photographers", ["views"], lambda results, cache: top_photographer(results)),
+    "avg_make_model": ("make_model", ["avg_views", "avg_downloads"], avg_make_model),
+    "most_used_qual": ("settings", ["count"], lambda results, cache: most_used_qual(results))
+}
+
+
+# draws a chart through the cache, a chart whose numbers have not changed is not drawn again
+# the titles hold the date so a chart from an earlier day is drawn again as well
+def show_chart(cache, results, name):
+    part, columns, draw = CHARTS[name]
+    digest = results.digest(part, columns) + "-" + datetime.date.today().isoformat()
+    if part == "photographers":
+        # a change to the excluded accounts changes the ranking as well
+        digest += "-" + hashlib.sha1("\n".join(UnsplashScrapeAnalysis.excluded_accounts()).encode()).hexdigest()[:8]
+    start = time.perf_counter()
+    paths, cached = cache.chart(name, digest, lambda: draw(results, cache))
+    print(("Up to date: " if cached else "Saved: ") + ", ".join(paths) +
+          " (" + str(round(time.perf_counter() - start, 2)) + "s)")
+    return paths
 
 
 if __name__ == "__main__":
@@ -254,15 +269,22 @@ if __name__ == "__main__":
                         " (New scrape will take 30-45 minutes to complete) Type 'csv' to load from csv, type 'new' to "
                         "start new scrape:")
         if use_csv[0].lower() == 'c':
-            unsplash_df = pd.read_csv('data/data.csv')
+            data_path = 'data/data.csv'
             break
         elif use_csv[0].lower() == 'n':
+            import UnsplashScrape
+
             us = UnsplashScrape.UnsplashScrape("https://unsplash.com/", 1000)
-            unsplash_df = us.df
+            data_path = us.output
             break
         else:
             print("Invalid inout. Please try again.")
 
+    # every plot and the perfect camera read from the same aggregates, computed once per version of the data
+    # and cached along with the charts in data/cache
+    cache = UnsplashScrapeAnalysis.AggregateCache()
+    results = cache.aggregates(data_path)
+
     while True:
         print("\nMenu")
         print("1. View Top 10 Photographers by Views on ")
@@ -275,15 +297,15 @@ if __name__ == "__main__":
         choice = input("Please make a menu selection: ").strip()
 
         if choice == "1":
-            top_photographer(unsplash_df)
+            show_chart(cache, results, "top_photographer")
         elif choice == "2":
-            avg_make_model(unsplash_df)
+            show_chart(cache, results, "avg_make_model")
         elif choice == "3":
-            most_used_qual(unsplash_df)
+            show_chart(cache, results, "most_used_qual")
         elif choice == "4":
-            most_pop_img(unsplash_df)
+            most_pop_img(results)
         elif choice == "5":
-            perf_cam(unsplash_df)
+            perf_cam(results)
             input("Type anything to return to menu: ")
         elif choice == "6":
             print("Goodbye, thank you for using Unsplash Scrape Visualizer")
@@ -0,0 +1,37 @@
+import UnsplashScrapeStore
+import UnsplashScrapeAnalysis
+
+
+def row(page, photographer, views, downloads, model="R"):
+    return UnsplashScrapeStore.PhotoRow(img_page=page, photographer=photographer, camera_make="Canon",
+                                        camera_model=model, views=views, downloads=downloads, count=1, focal_len=50,
+                                        aperture=2.8, shutter_speed=0.01, iso=100, img_resolution="6000, 4000")
+
+
+# a photo whose views or downloads could not be read keeps its place in the dataset, the sums and averages
+# leave its missing metric out and reading the dataset whole or in chunks gives the same aggregates
+def test_dataset_with_missing_metrics(tmp_path):
+    path = str(tmp_path / "data.csv")
+    with UnsplashScrapeStore.CsvSink(path) as sink:
+        sink.write(row("p1", "ann", 100, 10))
+        sink.write(row("p2", "ann", None, 30))
+        sink.write(row("p3", "bob", None, None, model="M"))
+        sink.write(row("p4", "bob", 50, 5))
+
+    df = UnsplashScrapeStore.load_dataset(path)
+    assert str(df["views"].dtype) == "Int64"
+    assert df["views"].isna().tolist() == [False, True, True, False]
+    chunks = list(UnsplashScrapeStore.iter_chunks(path, 1))
+    assert [str(chunk["downloads"].dtype) for chunk in chunks] == ["Int64"] * 4
+
+    whole = UnsplashScrapeAnalysis.aggregate_file(path, 0)
+    chunked = UnsplashScrapeAnalysis.aggregate_file(path, 1)
+    for results in [whole, chunked]:
+        ann, bob = results.photographers.to_dict("records")
+        assert (ann["views"], ann["downloads"], ann["count"]) == (100, 40, 2)
+        assert (ann["avg_views"], ann["avg_downloads"]) == (100.0, 20.0)
+        assert (bob["views"], bob["count"], bob["avg_views"], bob["avg_downloads"]) == (50, 2, 50.0, 5.0)
+        assert results.most_viewed == "p1"
+        assert results.perfect_camera()["camera_model"] == "R"
+    for part in ["photographers", "make_model", "settings"]:
+        assert whole.digest(part) == chunked.digest(part)
@@ -0,0 +1,49 @@
+import pytest
+import UnsplashScrapeCLI
+
+
+def crawl_args(*argv):
+    return UnsplashScrapeCLI.build_parser().parse_args(["crawl"] + list(argv))
+
+
+# the checkpoint is only kept by default for outputs a resumed crawl can append to
+def test_checkpoint_path(tmp_path, capsys):
+    assert UnsplashScrapeCLI.checkpoint_path(crawl_args(), "data/data.csv") == UnsplashScrapeCLI.CHECKPOINT
+    assert UnsplashScrapeCLI.checkpoint_path(crawl_args("--checkpoint", "c.db"), "data/data.jsonl") == "c.db"
+    assert UnsplashScrapeCLI.checkpoint_path(crawl_args("--no-checkpoint"), "data/data.csv") is None
+
+    assert UnsplashScrapeCLI.checkpoint_path(crawl_args("--format", "parquet"), "data/data.parquet") is None
+    assert "Resuming is turned off" in capsys.readouterr().out
+    with pytest.raises(UnsplashScrapeCLI.OptionError, match="--no-checkpoint"):
+        UnsplashScrapeCLI.checkpoint_path(crawl_args("--checkpoint", "c.db"), "data/data.parquet")
+
+
+# the parquet example of the docs passes validation, the crawl itself is not run
+def test_crawl_parquet_example(tmp_path, monkeypatch):
+    pytest.importorskip("selenium")
+    import UnsplashScrape
+
+    crawls = []
+    monkeypatch.setattr(UnsplashScrape.UnsplashScrape, "run", lambda self: crawls.append(self))
+    output = str(tmp_path / "data.parquet")
+    assert UnsplashScrapeCLI.main(["crawl", "--count", "500", "--backend", "http", "--format", "parquet",
+                                   "--output", output, "--timings", str(tmp_path / "timings.json")]) == 0
+    assert crawls[0].output == output and crawls[0].checkpoint is None
+    assert UnsplashScrapeCLI.main(["crawl", "--format", "parquet", "--output", output, "--checkpoint",
+                                   str(tmp_path / "c.db")]) == 2
+
+
+# the http backend requests several pages per host at once with the default single worker
+def test_http_per_host_limit(tmp_path):
+    pytest.importorskip("selenium")
+    import UnsplashScrape
+
+    def crawl(**options):
+        return UnsplashScrape.UnsplashScrape("http://localhost/", 10, output=None, checkpoint=None, run=False,
+                                             **options)
+
+    assert crawl(backend="http").max_concurrent == UnsplashScrape.UnsplashScrape.HTTP_PER_HOST
+    assert crawl(backend="http", max_concurrent=16).max_concurrent == 16
+    assert crawl(backend="http", max_concurrent=0).max_concurrent == 1
+    assert crawl(workers=2).max_concurrent == 2
+    assert crawl(workers=2, max_concurrent=16).max_concurrent == 2
@@ -0,0 +1,65 @@
+import threading
+import urllib.error
+import pytest
+import UnsplashScrapeBench
+import UnsplashScrapeStore
+
+pytest.importorskip("selenium")
+import UnsplashScrape  # noqa: E402
+
+
+@pytest.fixture
+def server():
+    server = UnsplashScrapeBench.StandInServer(UnsplashScrapeBench.make_photos(8)).start()
+    yield server
+    server.stop()
+
+
+# a crawl over http whose landing page was already scrolled by an earlier run, so no browser is needed
+def crawl(server, tmp_path):
+    return UnsplashScrape.UnsplashScrape(server.base, 8, backend="http", max_concurrent=8, rate=None, attempts=1,
+                                         output=str(tmp_path / "data.jsonl"), checkpoint=str(tmp_path / "cp.db"),
+                                         timings=None, exclude=[], run=False)
+
+
+# the crawl stops with pages 2 and 5 missing after the pages around them finished, the resumed crawl only
+# fetches those two and the output ends up in landing page order
+def test_resumed_crawl_keeps_landing_page_order(server, tmp_path):
+    output = str(tmp_path / "data.jsonl")
+    pages = [(pos, server.base + "photos/photo" + str(pos), "photo " + str(pos)) for pos in range(8)]
+    checkpoint = UnsplashScrapeStore.Checkpoint(str(tmp_path / "cp.db"), server.base, output)
+    checkpoint.set_frontier(pages)
+    checkpoint.close()
+
+    # pages 2 and 5 fail once every other page has reached the writer
+    first = crawl(server, tmp_path)
+    get_raw, add_row = first.http.get_raw, first.add_row
+    added, others_added = [], threading.Event()
+
+    def get_raw_failing(url):
+        if url.endswith(("photo2", "photo5")):
+            others_added.wait(10)
+            raise urllib.error.HTTPError(url, 404, "Not Found", None, None)
+        return get_raw(url)
+
+    def add_row_counted(*args):
+        add_row(*args)
+        added.append(args[0])
+        if len(added) == 6:
+            others_added.set()
+
+    first.http.get_raw = get_raw_failing
+    first.add_row = add_row_counted
+    with pytest.raises(urllib.error.HTTPError):
+        first.run()
+    assert [row["img_page"] for row in UnsplashScrapeStore.iter_rows(output)] == [page[1] for page in pages[:2]]
+
+    second = crawl(server, tmp_path)
+    fetched = []
+    get_raw = second.http.get_raw
+    second.http.get_raw = lambda url: fetched.append(url) or get_raw(url)
+    second.run()
+    assert sorted(fetched) == [pages[2][1], pages[5][1]]
+    rows = list(UnsplashScrapeStore.iter_rows(output))
+    assert [row["img_page"] for row in rows] == [page[1] for page in pages]
+    assert [row["img_hvr_txt"] for row in rows] == [page[2] for page in pages]
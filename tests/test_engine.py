@@ -0,0 +1,49 @@
+import urllib.error
+import pytest
+import UnsplashScrapeBench
+import UnsplashScrapeEngine
+import UnsplashScrapeExtract
+import UnsplashScrapeStore
+
+
+@pytest.fixture
+def server():
+    server = UnsplashScrapeBench.StandInServer(UnsplashScrapeBench.make_photos(6)).start()
+    yield server
+    server.stop()
+
+
+# a page that is gone stops a crawl without on_error, with it the page is reported and the others are emitted
+def test_crawler_carries_on_past_a_missing_page(server):
+    urls = [server.base + "photos/photo" + str(i) for i in [0, 1, 99, 2, 3]]
+    http = UnsplashScrapeExtract.HttpBackend()
+
+    with pytest.raises(urllib.error.HTTPError):
+        UnsplashScrapeEngine.AsyncCrawler(UnsplashScrapeEngine.TokenBucket(None), per_host=2).crawl(
+            urls, http.get_metrics)
+
+    failed, emitted = [], {}
+    crawler = UnsplashScrapeEngine.AsyncCrawler(UnsplashScrapeEngine.TokenBucket(None), per_host=2,
+                                                on_error=lambda pos, url, e: failed.append((pos, e.code)))
+    crawler.crawl(urls, http.get_metrics, emit=lambda pos, metrics: emitted.setdefault(pos, metrics))
+    assert failed == [(2, 404)]
+    assert sorted(emitted) == [0, 1, 3, 4]
+    assert crawler.timer.snapshot()["counters"]['pages{outcome="failed"}'] == 1
+
+
+# a refresh writes the metrics of the photos that are still there and updates the index
+def test_refresh_skips_deleted_photos(server, tmp_path):
+    pytest.importorskip("selenium")
+    import UnsplashScrape
+    import UnsplashScrapeIndex
+
+    data, history, index = str(tmp_path / "data.csv"), str(tmp_path / "history.csv"), str(tmp_path / "index.db")
+    with UnsplashScrapeStore.CsvSink(data) as sink:
+        for i in [0, 99, 1]:
+            sink.write(UnsplashScrapeStore.PhotoRow(img_page=server.base + "photos/photo" + str(i), photographer="a",
+                                                    views=1, downloads=1, count=1))
+    assert UnsplashScrape.refresh(server.base, data=data, history=history, rate=None, index=index) == 3
+    assert [row["img_page"][-6:] for row in UnsplashScrapeStore.iter_rows(history)] in [["photo0", "photo1"],
+                                                                                        ["photo1", "photo0"]]
+    with UnsplashScrapeIndex.AnalyticsIndex(index) as analytics:
+        assert analytics.counts()["photos"] == 3
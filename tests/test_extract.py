@@ -0,0 +1,92 @@
+import pytest
+import UnsplashScrapeBench
+import UnsplashScrapeExtract
+
+
+PHOTOS = UnsplashScrapeBench.make_photos(5)
+
+
+# the avatar and "Available for hire" links come before the name on the stand-in's pages, only the link with
+# the name is the photographer
+def test_parser_skips_avatar_and_hire_links():
+    for photo in PHOTOS:
+        html = UnsplashScrapeBench.photo_page(photo)
+        assert html.index("Available for hire") < html.index(">" + photo["photographer"] + "<")
+        raw = UnsplashScrapeExtract.parse_photo_page(html, "http://localhost/photos/" + photo["id"])
+        assert raw["photographer"] == "http://localhost/@" + photo["photographer"]
+        assert raw["fallbacks"] == []
+        assert UnsplashScrapeExtract.parse_photographer(raw["photographer"]) == photo["photographer"]
+        assert raw["img_url"].startswith("http://localhost/images/" + photo["id"] + ".jpg")
+
+
+# the http parser understands every selector the browser is given
+def test_parser_supports_every_selector():
+    for field in UnsplashScrapeExtract.FIELDS:
+        for selector in field.selectors:
+            if "css" in selector:
+                assert UnsplashScrapeExtract.parse_css(selector["css"])
+            else:
+                assert UnsplashScrapeExtract.parse_xpath(selector["xpath"])
+
+
+# a page laid out differently than usual is read by the fallback selectors, like it is in the browser
+FALLBACK_PAGE = """<html><head><meta property="og:image" content="https://images.unsplash.com/photo-1.jpg">
+</head><body><div itemprop="author"><a href="https://unsplash.com/@ann">Ann</a></div>
+<a href="/s/photos/tokyo">Tokyo, Japan</a><p>Related collections</p><p>A summary</p>
+<dl><div><dt> Views </dt><dd>1,234</dd></div><div><dt>\n Downloads</dt><dd>56</dd><dd>7</dd></div>
+<div><dt>Camera Make</dt><dd>Canon</dd></div><div><dt>ISO</dt><dd>--</dd></div></dl></body></html>"""
+
+
+def test_parser_uses_fallback_selectors():
+    raw = UnsplashScrapeExtract.parse_photo_page(FALLBACK_PAGE, "https://unsplash.com/photos/1")
+    assert raw["photographer"] == "https://unsplash.com/@ann"
+    assert raw["img_url"] == "https://images.unsplash.com/photo-1.jpg"
+    assert (raw["location"], raw["summary"]) == ("Tokyo, Japan", "A summary")
+    assert (raw["views"], raw["downloads"], raw["camera_make"], raw["iso"]) == ("1,234", "56", "Canon", "--")
+    assert raw["camera_model"] is None
+    assert raw["fallbacks"] == ["photographer", "img_url", "location", "views", "downloads"]
+
+    stats = UnsplashScrapeExtract.FieldStats()
+    row = UnsplashScrapeExtract.parse_info(raw, stats)
+    assert (row["photographer"], row["views"], row["downloads"], row["iso"]) == ("ann", 1234, 56, None)
+    assert stats.summary()["views"]["fallback"] == 1
+    assert UnsplashScrapeExtract.parse_photo_page(FALLBACK_PAGE, "https://unsplash.com/photos/1",
+                                                  UnsplashScrapeExtract.METRIC_FIELDS) == {
+        "fallbacks": ["views", "downloads"], "views": "1,234", "downloads": "56"}
+
+
+# element of a page for collect_raw_elements, with the text and attributes a browser would give
+class Element:
+    def __init__(self, text, **attributes):
+        self.text = text
+        self.attributes = attributes
+
+    def get_attribute(self, name):
+        return self.attributes.get(name)
+
+
+class Driver:
+    def __init__(self, elements):
+        self.elements = elements
+
+    def find_elements_by_css_selector(self, css):
+        return self.elements.get(css, [])
+
+    def find_elements_by_xpath(self, xpath):
+        return []
+
+
+# the browser skips the links by their text as well, even though the value it reads is the href
+def test_browser_skips_links_by_text():
+    pytest.importorskip("selenium")
+    import UnsplashScrape
+
+    css = UnsplashScrapeExtract.FIELDS_BY_NAME["photographer"].selectors[0]["css"]
+    links = [Element("", href="https://unsplash.com/@ann"),
+             Element("Available for hire", href="https://unsplash.com/@ann/hire"),
+             Element("Ann", href="https://unsplash.com/@ann")]
+    raw = UnsplashScrape.collect_raw_elements(Driver({css: links}))
+    assert raw["photographer"] == "https://unsplash.com/@ann"
+    assert "photographer" not in raw["fallbacks"]
+    raw = UnsplashScrape.collect_raw_elements(Driver({css: links[:2]}))
+    assert raw["photographer"] is None
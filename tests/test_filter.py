@@ -0,0 +1,91 @@
+import re
+from html.parser import HTMLParser
+import pytest
+import UnsplashScrapeBench
+import UnsplashScrapeFilter
+
+
+# the cards of a landing page as the discovery script sees them: [photo link, title, author link, text of every
+# element of the card]
+class Cards(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.cards = []
+        self.in_card = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "figure":
+            self.cards.append([None, None, None, []])
+            self.in_card = True
+        elif tag == "a" and attrs.get("itemprop") == "contentUrl":
+            self.cards[-1][0:2] = [attrs["href"], attrs.get("title")]
+        elif tag == "a" and attrs.get("href", "").startswith("/@"):
+            self.cards[-1][2] = attrs["href"]
+
+    def handle_data(self, data):
+        if self.in_card:
+            self.cards[-1][3].append(data.strip())
+
+    def handle_endtag(self, tag):
+        if tag == "figure":
+            self.in_card = False
+
+
+# the links the discovery script hands back for a landing page, with its own test for sponsored cards
+def discovered_links(html):
+    pytest.importorskip("selenium")
+    import UnsplashScrape
+
+    pattern = re.search(r"return /(.*?)/\.test\(node\.textContent\.trim\(\)\)", UnsplashScrape.DISCOVERY_JS)
+    sponsored = re.compile(pattern.group(1))
+    cards = Cards()
+    cards.feed(html)
+    return [[href, title, author[2:], any(sponsored.search(text) for text in texts)]
+            for href, title, author, texts in cards.cards]
+
+
+# sponsored cards of the landing page are told apart by the discovery script and dropped by the filter
+def test_sponsored_cards_are_dropped():
+    photos = UnsplashScrapeBench.make_photos(6, sponsored=[1, 4])
+    links = discovered_links(UnsplashScrapeBench.landing_page(photos))
+    assert [link[3] for link in links] == [False, True, False, False, True, False]
+
+    page_filter = UnsplashScrapeFilter.PageFilter(accounts=[])
+    kept = page_filter.keep(links)
+    assert [link[0] for link in kept] == ["/photos/photo" + str(i) for i in [0, 2, 3, 5]]
+    assert page_filter.counts["sponsored"] == 2
+    assert len(UnsplashScrapeFilter.PageFilter(accounts=[], sponsored=False).keep(links)) == 6
+
+
+# a photo is recorded once whichever of its urls it was found under, and stays recorded once the set is reopened
+def test_seen_set_dedups_photo_urls(tmp_path):
+    path = str(tmp_path / "seen.db")
+    with UnsplashScrapeFilter.SeenSet(path) as seen:
+        seen.add(["https://unsplash.com/photos/yeq7XzeJaiM", "https://unsplash.com/photos/leafless-tree-yeq7XzeJaiM",
+                  "https://unsplash.com/photos/yeq7XzeJaiM/"])
+        assert len(seen) == 1
+    with UnsplashScrapeFilter.SeenSet(path) as seen:
+        assert "https://unsplash.com/photos/another-slug-yeq7XzeJaiM" in seen
+        assert "https://unsplash.com/photos/Wl2Vd2GbXkE" not in seen
+        assert seen.contains(["yeq7XzeJaiM", "Wl2Vd2GbXkE", "yeq7XzeJaiM"]) == {"yeq7XzeJaiM"}
+
+
+# photos scraped before, found twice in the crawl or by an excluded account are skipped, in that order
+def test_page_filter_skips_seen_duplicate_and_excluded(tmp_path):
+    with UnsplashScrapeFilter.SeenSet(str(tmp_path / "seen.db")) as seen:
+        seen.add(["https://unsplash.com/photos/aaaaaaaaaaa"])
+        page_filter = UnsplashScrapeFilter.PageFilter(seen=seen, skip=["/photos/bbbbbbbbbbb"],
+                                                      accounts=["Spammer"])
+        links = [["/photos/old-aaaaaaaaaaa", "", "someone", False],
+                 ["/photos/bbbbbbbbbbb", "", "someone", False],
+                 ["/photos/ccccccccccc", "", "someone", False],
+                 ["/photos/new-ccccccccccc", "", "someone", False],
+                 ["/photos/ddddddddddd", "", "spammer", False],
+                 ["/photos/eeeeeeeeeee", "", None, False]]
+        assert [link[0] for link in page_filter.keep(links)] == ["/photos/ccccccccccc", "/photos/eeeeeeeeeee"]
+        assert page_filter.counts == {"seen": 2, "duplicate": 1, "sponsored": 0, "excluded": 1}
+
+        # photos kept earlier in the crawl count as duplicates in the next batch of links
+        assert page_filter.keep([["/photos/eeeeeeeeeee", "", None, False]]) == []
+        assert page_filter.counts["duplicate"] == 2
@@ -0,0 +1,82 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import UnsplashScrapeImages
+
+
+# the files an ImageCache holds, without its index
+def image_files(folder):
+    return sorted(name for _, _, names in os.walk(folder) for name in names if not name.startswith("index.db"))
+
+
+# urls that return the same bytes share one file, counted once towards the size of the cache
+def test_image_cache_stores_content_once(tmp_path):
+    folder = str(tmp_path / "images")
+    cache = UnsplashScrapeImages.ImageCache(folder)
+    first = cache.put("https://images.unsplash.com/a?w=100", b"same image", ".jpg")
+    second = cache.put("https://images.unsplash.com/b?w=100", b"same image", ".jpg")
+    other = cache.put("https://images.unsplash.com/a?w=200", b"other image", ".jpg")
+    assert first == second != other
+    assert cache.get("https://images.unsplash.com/b?w=100") == first
+    assert cache.get("https://images.unsplash.com/c?w=100") is None
+    assert len(image_files(folder)) == 2
+    assert cache.size == len(b"same image") + len(b"other image")
+    cache.close()
+
+    # the index is kept on disk, a new cache knows the images and their size
+    cache = UnsplashScrapeImages.ImageCache(folder)
+    assert cache.get("https://images.unsplash.com/a?w=100") == first
+    assert cache.size == len(b"same image") + len(b"other image")
+    cache.close()
+
+
+# once the images outgrow the cache the least recently used one goes, along with every url that pointed at it
+def test_image_cache_evicts_least_recently_used(tmp_path):
+    cache = UnsplashScrapeImages.ImageCache(str(tmp_path / "images"), max_bytes=20)
+    cache.put("old", b"0123456789")
+    cache.put("old copy", b"0123456789")
+    cache.put("new", b"abcdefghij")
+    cache.get("old")
+    cache.put("newest", b"ABCDEFGHIJ")
+    assert cache.get("new") is None
+    assert cache.get("old") is not None and cache.get("old copy") is not None
+    assert cache.size == 20
+    cache.close()
+
+
+# serves the same image under every path and counts the requests
+class ImageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        body = b"\xff\xd8 jpeg bytes"
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# every url is downloaded once, urls returning the same image end up at the same file
+def test_downloader_dedups_images(tmp_path):
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), ImageHandler)
+    httpd.requests = []
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    base = "http://127.0.0.1:" + str(httpd.server_address[1]) + "/"
+    try:
+        folder = str(tmp_path / "images")
+        urls = [base + "a", base + "b", base + "a", None]
+        with UnsplashScrapeImages.ImageDownloader(folder, width=400) as downloader:
+            paths = downloader.download(urls)
+            assert paths[0] == paths[1] == paths[2] and paths[0].endswith(".jpg") and paths[3] is None
+            assert sorted(httpd.requests) == ["/a?w=400", "/b?w=400"]
+            assert downloader.download([base + "b"]) == [paths[0]]
+            assert len(httpd.requests) == 2
+            assert downloader.counts == {"downloaded": 2, "cached": 1, "failed": 0,
+                                         "bytes": 2 * len(b"\xff\xd8 jpeg bytes")}
+        assert image_files(folder) == [os.path.basename(paths[0])]
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
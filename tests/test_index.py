@@ -0,0 +1,150 @@
+import os
+import time
+import pytest
+import UnsplashScrapeIndex
+import UnsplashScrapeStore
+
+DAY = 86400
+
+
+# a dataset written by a crawl `age` days ago
+def write_crawl(path, rows, age):
+    with UnsplashScrapeStore.CsvSink(path) as sink:
+        for row in rows:
+            sink.write(UnsplashScrapeStore.PhotoRow(count=1, **row))
+    written = time.time() - age * DAY
+    os.utime(path, (written, written))
+
+
+# what UnsplashScrape.refresh writes: the metrics of the known photos stamped with the time of the refresh,
+# then the photos found on the landing page appended to the dataset
+def write_refresh(data, history, metrics, new_rows, age=0):
+    scraped_at = UnsplashScrapeIndex.timestamp(time.time() - age * DAY)
+    with UnsplashScrapeStore.CsvSink(history, append=True, columns=UnsplashScrapeStore.HISTORY_COLUMNS) as sink:
+        for page, views, downloads in metrics:
+            sink.write(UnsplashScrapeStore.MetricRow(img_page=page, scraped_at=scraped_at, views=views,
+                                                     downloads=downloads))
+    with UnsplashScrapeStore.CsvSink(data, append=True) as sink:
+        for row in new_rows:
+            sink.write(UnsplashScrapeStore.PhotoRow(count=1, **row))
+
+
+@pytest.fixture
+def files(tmp_path):
+    return str(tmp_path / "data.csv"), str(tmp_path / "history.csv"), str(tmp_path / "index.db")
+
+
+CRAWL = [{"img_page": "p1", "photographer": "ann", "camera_make": "Canon", "camera_model": "R", "views": 100,
+          "downloads": 1},
+         {"img_page": "p2", "photographer": "ann", "camera_make": "Canon", "camera_model": "R", "views": 200,
+          "downloads": 2}]
+NEW = [{"img_page": "p3", "photographer": "bob", "camera_make": "SONY", "camera_model": "A7", "views": 7,
+        "downloads": 0}]
+
+
+def photo(index, page):
+    return index.query("SELECT * FROM photos WHERE img_page = ?", (page,))[0]
+
+
+# the first index run happens after the refresh, the dataset was written after the history then
+def test_refresh_then_index(files):
+    data, history, path = files
+    write_crawl(data, CRAWL, age=10)
+    write_refresh(data, history, [("p1", 5000, 50), ("p2", 6000, 60)], NEW, age=1)
+
+    with UnsplashScrapeIndex.AnalyticsIndex(path) as index:
+        index.update(data, history)
+        p1 = photo(index, "p1")
+        assert (p1["views"], p1["downloads"], p1["prev_views"]) == (5000, 50, 100)
+        assert p1["views_trend"] is None or p1["views_trend"] > 0
+        assert index.top_photographers(exclude=[]) == [
+            {"photographer": "ann", "views": 11000, "downloads": 110, "count": 2},
+            {"photographer": "bob", "views": 7, "downloads": 0, "count": 1}]
+
+        # reading the files again, or a dataset touched afterwards, changes nothing
+        os.utime(data)
+        index.update(data, history)
+        assert photo(index, "p1")["views"] == 5000
+        assert index.top_cameras()[0]["views"] == 11000
+
+
+# indexed after the crawl and again after the refresh, the trend runs from the crawl to the refresh
+def test_index_refresh_index(files):
+    data, history, path = files
+    write_crawl(data, CRAWL, age=10)
+    with UnsplashScrapeIndex.AnalyticsIndex(path) as index:
+        index.update(data, history)
+        assert photo(index, "p1")["views"] == 100
+
+        write_refresh(data, history, [("p1", 1000, 10), ("p2", 200, 2)], NEW, age=1)
+        index.update(data, history)
+        p1 = photo(index, "p1")
+        assert (p1["views"], p1["prev_views"]) == (1000, 100)
+        assert p1["views_trend"] == pytest.approx(100, rel=0.01)
+        assert index.trending(1, exclude=[])[0]["img_page"] == "p1"
+        assert index.top_photographers(exclude=[])[0] == {"photographer": "ann", "views": 1200, "downloads": 12,
+                                                           "count": 2}
+
+        # a later refresh moves the older one to previous
+        write_refresh(data, history, [("p1", 1200, 12)], [])
+        index.update(data, history)
+        p1 = photo(index, "p1")
+        assert (p1["views"], p1["prev_views"]) == (1200, 1000)
+        assert p1["views_trend"] == pytest.approx(200, rel=0.01)
+
+
+# an index written with an older layout is built again from the files
+def test_old_index_is_rebuilt(files):
+    data, history, path = files
+    write_crawl(data, CRAWL, age=1)
+    import sqlite3
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE photos (img_page TEXT PRIMARY KEY, photographer TEXT)")
+    conn.commit()
+    conn.close()
+    with UnsplashScrapeIndex.AnalyticsIndex(path) as index:
+        assert index.update(data, history) == 2
+        assert index.counts()["photos"] == 2
+
+
+# excluded accounts are matched whatever their case, in the rankings of both the index and the aggregates
+def test_excluded_accounts_ignore_case(files, tmp_path):
+    import UnsplashScrapeAnalysis
+    data, history, path = files
+    excluded = tmp_path / "excluded.txt"
+    excluded.write_text("# brands\nAnn\n", encoding="utf-8")
+    assert UnsplashScrapeAnalysis.excluded_accounts(str(excluded)) == ["ann"]
+
+    rows = CRAWL + [dict(NEW[0], photographer="BallparkBrand", views=9000)]
+    write_crawl(data, rows, age=10)
+    write_refresh(data, history, [("p1", 5000, 50), ("p3", 9500, 0)], [], age=1)
+    with UnsplashScrapeIndex.AnalyticsIndex(path) as index:
+        index.update(data, history)
+        assert [row["photographer"] for row in index.top_photographers()] == ["ann"]
+        assert [row["photographer"] for row in index.top_photographers(exclude=["ANN"])] == ["BallparkBrand"]
+        assert [row["img_page"] for row in index.trending()] == ["p1"]
+        assert index.trending(exclude=["ballparkbrand", "ann"]) == []
+
+    aggregates = UnsplashScrapeAnalysis.aggregate_file(data)
+    assert aggregates.top_photographers()["photographer"].tolist() == ["ann"]
+    assert aggregates.top_photographers(exclude=["aNN"])["photographer"].tolist() == ["BallparkBrand"]
+
+
+# a crawl that replaces the dataset with other rows is read from the start, rows appended afterwards only once
+def test_replaced_dataset_is_read_again(files):
+    data, history, path = files
+    old = [dict(CRAWL[0], img_page="old" + str(i), views=i) for i in range(300)]
+    new = [dict(NEW[0], img_page="new" + str(i), views=1000 + i) for i in range(400)]
+    write_crawl(data, old, age=2)
+    with UnsplashScrapeIndex.AnalyticsIndex(path) as index:
+        assert index.update(data, history) == 300
+
+        write_crawl(data, new, age=1)
+        assert index.update(data, history) == 400
+        assert index.query("SELECT COUNT(*) AS n FROM photos WHERE img_page LIKE 'new%'")[0]["n"] == 400
+        assert photo(index, "new399")["views"] == 1399
+
+        with UnsplashScrapeStore.CsvSink(data, append=True) as sink:
+            sink.write(UnsplashScrapeStore.PhotoRow(count=1, **dict(NEW[0], img_page="new400")))
+        assert index.update(data, history) == 1
+        assert index.update(data, history) == 0
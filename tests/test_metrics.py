@@ -0,0 +1,55 @@
+import urllib.request
+import urllib.error
+import pytest
+import UnsplashScrapeMetrics
+
+
+# a timer after a short crawl: two pages done, one failed, a retry and a skipped photo
+def crawled_timer():
+    timer = UnsplashScrapeMetrics.StepTimer()
+    for url in ["p1", "p2"]:
+        with timer.page(url):
+            pass
+    with pytest.raises(ValueError):
+        with timer.page("p3"):
+            raise ValueError("no info")
+    timer.retried("p3", ValueError("no info"), 0)
+    timer.count("skipped", reason='a "quoted" reason')
+    timer.gauge("queue_depth", 4)
+    timer.observe("open", 0.0015)
+    timer.observe("open", 5000.0)
+    return timer
+
+
+# /metrics serves every counter, gauge and step histogram in the Prometheus text format
+def test_metrics_endpoint_exposition():
+    with UnsplashScrapeMetrics.MetricsServer(crawled_timer(), port=0) as server:
+        with urllib.request.urlopen(server.url) as response:
+            assert response.headers["Content-Type"] == UnsplashScrapeMetrics.EXPOSITION_TYPE
+            text = response.read().decode()
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(server.url.replace("/metrics", "/other"))
+        assert error.value.code == 404
+
+    lines = text.splitlines()
+    assert "# TYPE unsplash_scrape_pages_total counter" in lines
+    assert 'unsplash_scrape_pages_total{outcome="done"} 2' in lines
+    assert 'unsplash_scrape_pages_total{outcome="failed"} 1' in lines
+    assert "unsplash_scrape_retries_total 1" in lines
+    assert 'unsplash_scrape_skipped_total{reason="a \\"quoted\\" reason"} 1' in lines
+    assert "# TYPE unsplash_scrape_queue_depth gauge" in lines
+    assert "unsplash_scrape_queue_depth 4" in lines
+    assert "unsplash_scrape_in_flight 0" in lines
+    # metrics nothing was recorded for are left out
+    assert not any("rows_written_total" in line for line in lines)
+
+    # the buckets of a histogram are cumulative and end with +Inf, which holds every observation
+    assert "# TYPE unsplash_scrape_step_seconds histogram" in lines
+    buckets = [line for line in lines if line.startswith('unsplash_scrape_step_seconds_bucket{step="open"')]
+    counts = [int(line.split()[-1]) for line in buckets]
+    assert len(buckets) == len(UnsplashScrapeMetrics.BUCKETS) + 1
+    assert counts == sorted(counts) and counts[0] == 0 and counts[-2] == 1 and counts[-1] == 2
+    assert buckets[-1].startswith('unsplash_scrape_step_seconds_bucket{step="open",le="+Inf"}')
+    assert 'unsplash_scrape_step_seconds_count{step="open"} 2' in lines
+    assert 'unsplash_scrape_step_seconds_sum{step="open"} 5000.0015' in lines
+    assert 'unsplash_scrape_step_seconds_count{step="page"} 3' in lines
@@ -0,0 +1,39 @@
+import pandas as pd
+import UnsplashScrapeBench
+import UnsplashScrapeStore
+import UnsplashScrapeExtract
+import UnsplashScrapeNormalize
+
+
+# raw strings of the stand-in photos, with the odd ones a crawl runs into: missing fields, "--", strings the
+# column parsers leave to the field's parser, ones no parser accepts and values out of bounds
+def odd_raws():
+    raws = UnsplashScrapeBench.make_raw(40)
+    odd = {0: {"views": None, "camera_make": None}, 1: {"views": "12k", "iso": "--"},
+           2: {"focal_len": " 35mm", "aperture": "f/2"}, 3: {"shutter_speed": "1/0s", "aperture": "ƒ/99"},
+           4: {"downloads": "-5", "iso": "ISO 100"}, 5: {"shutter_speed": "0.5s", "location": None},
+           6: {"img_resolution": "6000 × 4000", "fallbacks": ["views", "downloads"]}}
+    for i, fields in odd.items():
+        raws[i].update(fields)
+    return raws
+
+
+# a whole column at a time gives the same rows and counts the same problems as parse_info one row at a time
+def test_normalize_matches_parse_info():
+    raws = odd_raws()
+    row_stats = UnsplashScrapeExtract.FieldStats()
+    by_row = [UnsplashScrapeStore.PhotoRow(img_page=raw["img_page"], img_hvr_txt=raw["img_hvr_txt"],
+                                           **UnsplashScrapeExtract.parse_info(raw, row_stats)).as_list()
+              for raw in raws]
+
+    column_stats = UnsplashScrapeExtract.FieldStats()
+    frame = pd.DataFrame.from_records(raws, columns=UnsplashScrapeStore.RAW_COLUMNS)
+    normalized = UnsplashScrapeNormalize.normalize_frame(frame, column_stats)
+    by_column = [row.as_list() for row in UnsplashScrapeStore.frame_rows(normalized)]
+
+    assert by_column == by_row
+    summary = row_stats.summary()
+    assert summary == column_stats.summary()
+    assert {field: counts for field, counts in summary.items() if field in ["views", "shutter_speed"]} == {
+        "views": {"missing": 1, "invalid": 1, "suspect": 0, "fallback": 2},
+        "shutter_speed": {"missing": 0, "invalid": 1, "suspect": 0, "fallback": 0}}
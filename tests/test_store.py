@@ -0,0 +1,86 @@
+import time
+import UnsplashScrapeStore
+
+
+PAGES = [(0, "p0", "a"), (1, "p1", "b"), (2, "p2", "c")]
+
+
+# a worker opens the queue without settings and uses the ones the coordinator stored, even when it opened the
+# queue before the coordinator did
+def test_work_queue_settings_are_shared(tmp_path):
+    path = str(tmp_path / "queue.db")
+    worker = UnsplashScrapeStore.WorkQueue(path)
+    assert (worker.lease, worker.attempts) == (UnsplashScrapeStore.LEASE, UnsplashScrapeStore.ATTEMPTS)
+
+    coordinator = UnsplashScrapeStore.WorkQueue(path, lease=0.05, attempts=1)
+    coordinator.publish(PAGES)
+    assert [task[0] for task in worker.claim("w1")] == [0]
+    assert (worker.lease, worker.attempts) == (0.05, 1)
+    assert (UnsplashScrapeStore.WorkQueue(path).lease, UnsplashScrapeStore.WorkQueue(path).attempts) == (0.05, 1)
+    worker.close()
+    coordinator.close()
+
+
+# a task whose lease runs out is handed out again until it used up its attempts, then it is given up on
+def test_work_queue_expired_leases_count_as_attempts(tmp_path):
+    path = str(tmp_path / "queue.db")
+    coordinator = UnsplashScrapeStore.WorkQueue(path, lease=0.05, attempts=2)
+    coordinator.publish(PAGES[:1])
+    worker = UnsplashScrapeStore.WorkQueue(path)
+
+    assert [task[0] for task in worker.claim("w1")] == [0]
+    time.sleep(0.1)
+    assert [task[0] for task in worker.claim("w2")] == [0]
+    time.sleep(0.1)
+    assert worker.claim("w3") == []
+    assert worker.counts() == {"todo": 0, "leased": 0, "done": 0, "failed": 1}
+    assert not coordinator.pending()
+    worker.close()
+    coordinator.close()
+
+
+# a failed task goes back to the queue until its last attempt
+def test_work_queue_fail(tmp_path):
+    queue = UnsplashScrapeStore.WorkQueue(str(tmp_path / "queue.db"), attempts=2)
+    queue.publish(PAGES[:1])
+    queue.claim("w1")
+    queue.fail("w1", 0)
+    assert queue.counts()["todo"] == 1
+    queue.claim("w1")
+    queue.fail("w1", 0)
+    assert queue.counts()["failed"] == 1
+    queue.close()
+
+
+# what a crawl hands its writer, the raw strings of the page at pos
+def raw_row(pos):
+    return UnsplashScrapeStore.RawRow(img_page="p" + str(pos), img_hvr_txt=str(pos), views=str(pos))
+
+
+# without a checkpoint the rows that finished early are written rather than lost
+def test_ordered_writer_close_writes_waiting_rows():
+    written = []
+    writer = UnsplashScrapeStore.OrderedWriter(None, on_write=lambda row: written.append(row.img_page))
+    for pos in [0, 2, 3]:
+        writer.put(pos, raw_row(pos))
+    writer.close()
+    assert written == ["p0", "p2", "p3"]
+
+
+# a task whose lease ran out is reclaimed by another worker, the first worker giving up on it late changes
+# nothing and of two workers finishing it the first row is kept
+def test_work_queue_reclaims_expired_lease(tmp_path):
+    queue = UnsplashScrapeStore.WorkQueue(str(tmp_path / "queue.db"), lease=0.05, attempts=3)
+    queue.publish(PAGES[:2])
+    assert [task[0] for task in queue.claim("w1")] == [0]
+    assert [task[0] for task in queue.claim("w2")] == [1]
+    time.sleep(0.1)
+
+    assert [task[0] for task in queue.claim("w3")] == [0]
+    queue.fail("w1", 0)
+    assert queue.counts() == {"todo": 0, "leased": 2, "done": 0, "failed": 0}
+    queue.complete(0, raw_row(0))
+    queue.complete(0, UnsplashScrapeStore.RawRow(img_page="p0", img_hvr_txt="late"))
+    assert [row["img_hvr_txt"] for row in queue.rows()] == ["0"]
+    assert queue.counts() == {"todo": 0, "leased": 1, "done": 1, "failed": 0}
+    queue.close()